@@ -1,13 +1,8 @@
 # app.py
 import streamlit as st
 from config import PAGE_CONFIG
-from utils.database import test_connection
-from utils.queries import (
-    get_total_patients, 
-    get_total_appointments, 
-    get_total_doctors,
-    get_today_appointments
-)
+from utils.database import test_connection, get_pool_stats
+from utils.queries import get_kpi_snapshot
 import os
 
 # 页面配置
@@ -46,10 +41,16 @@ else:
 # 关键指标卡片
 st.subheader("Key Metrics Overview")
 
+# 一次查询取回全部关键指标
+kpis = get_kpi_snapshot()
+if kpis is None:
+    st.error("Failed to load key metrics")
+    st.stop()
+
 col1, col2, col3, col4 = st.columns(4)
 
 with col1:
-    total_patients = get_total_patients()
+    total_patients = kpis.total_patients
     st.metric(
         label="👥 Total Patients",
         value=f"{total_patients:,}",
@@ -57,7 +58,7 @@ with col1:
     )
 
 with col2:
-    today_appointments = get_today_appointments()
+    today_appointments = kpis.today_appointments
     st.metric(
         label="Today's Appointments",
         value=f"{today_appointments}",
@@ -65,7 +66,7 @@ with col2:
     )
 
 with col3:
-    total_doctors = get_total_doctors()
+    total_doctors = kpis.total_doctors
     st.metric(
         label="Total Doctors",
         value=f"{total_doctors}",
@@ -73,7 +74,7 @@ with col3:
     )
 
 with col4:
-    total_appointments = get_total_appointments()
+    total_appointments = kpis.total_appointments
     st.metric(
         label="Total Appointments",
         value=f"{total_appointments:,}",
@@ -110,6 +111,18 @@ with st.expander("ℹ️ System Information"):
     st.write("**Version:** 1.0.0")
     st.write("**Last Updated:** 2024")
 
+    # 连接池指标
+    pool_stats = get_pool_stats()
+    st.write(
+        f"**Connection Pool:** {pool_stats['in_use']} in use / {pool_stats['idle']} idle "
+        f"(size {pool_stats['pool_size']})"
+    )
+    st.write(
+        f"**Pool Checkouts:** {pool_stats['checkouts']:,} · "
+        f"waits {pool_stats['waits']:,} · timeouts {pool_stats['timeouts']:,} · "
+        f"reconnects {pool_stats['reconnects']:,}"
+    )
+
 # 侧边栏
 with st.sidebar:
     st.image(r"D:\NU\DS5110\final project\dashboard\images\icon.png", width=300)
@@ -0,0 +1,73 @@
+# benchmarks/bench_hospital_grouping.py
+#
+# Compares the old per-hospital boolean-mask split of the revenue frame
+# with the single-pass partition used by hospital_revenue_prediction.
+#
+# Usage (from the project root):
+#     python -m benchmarks.bench_hospital_grouping [--months 24] [--repeat 3]
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils.predictions import _iter_hospital_series
+
+HOSPITAL_COUNTS = [10, 100, 1000, 10000]
+
+
+def make_revenue(n_hospitals, n_months, seed=0):
+    """Synthetic get_hospital_revenue_history() output, rows shuffled."""
+    rng = np.random.default_rng(seed)
+    months = pd.period_range('2015-01', periods=n_months, freq='M').strftime('%Y-%m')
+    df = pd.DataFrame({
+        'hospital_id': np.repeat(np.arange(1, n_hospitals + 1), n_months),
+        'year_month': np.tile(months, n_hospitals),
+        'amount': rng.gamma(5, 20000, n_hospitals * n_months)
+    })
+    return df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def mask_loop(revenue):
+    """The original O(H*N) split: one boolean scan and copy per hospital."""
+    out = []
+    for hospital_id in revenue['hospital_id'].unique():
+        hospital_revenue = revenue[revenue['hospital_id'] == hospital_id].copy()
+        hospital_revenue = hospital_revenue.sort_values('year_month')
+        hospital_revenue['month_num'] = range(len(hospital_revenue))
+        out.append(len(hospital_revenue))
+    return out
+
+
+def single_pass(revenue):
+    return [len(hospital_revenue) for _, hospital_revenue in _iter_hospital_series(revenue)]
+
+
+def best_of(func, revenue, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(revenue)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-hospital revenue grouping")
+    parser.add_argument('--months', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'hospitals':>10} {'rows':>10} {'mask loop (s)':>14} {'single pass (s)':>16} {'speedup':>8}")
+    for n_hospitals in HOSPITAL_COUNTS:
+        revenue = make_revenue(n_hospitals, args.months)
+        assert sorted(mask_loop(revenue)) == sorted(single_pass(revenue))
+
+        t_mask = best_of(mask_loop, revenue, args.repeat)
+        t_pass = best_of(single_pass, revenue, args.repeat)
+        print(f"{n_hospitals:>10} {len(revenue):>10} {t_mask:>14.4f} {t_pass:>16.4f} {t_mask / t_pass:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,114 @@ DB_CONFIG = {
     'port': 3306
 }
 
+# 连接池配置（进程级，所有 Streamlit 会话共享）
+DB_POOL_CONFIG = {
+    'pool_size': int(os.getenv("DB_POOL_SIZE", "8")),   # 最大连接数
+    'timeout': 10,       # 等待空闲连接的最长秒数
+    'recycle': 1800,     # 空闲超过该秒数的连接取出时强制重连
+    'pre_ping': True     # 取出连接时做健康检查
+}
+
+# 首页关键指标快照的缓存时间（秒）
+KPI_CACHE_TTL = 60
+
+# run_query 的查询结果缓存（utils/query_cache.py）
+QUERY_CACHE_CONFIG = {
+    'backend': os.getenv("QUERY_CACHE_BACKEND", "memory"),   # memory: 进程内；file: 目录（多副本共享或测试用，可放在 /dev/shm）；redis: 多副本共享
+    'ttl': 300,                       # 未指定 ttl 的查询结果缓存秒数
+    'max_entries': 1000,              # memory / file 后端最多保留的条目数（LRU 淘汰）
+    'max_bytes': 256 * 1024 * 1024,   # memory / file 后端的总大小上限
+    'dir': os.getenv("QUERY_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'queries')),
+    'redis_url': os.getenv("QUERY_CACHE_REDIS_URL", "redis://localhost:6379/0"),  # 需要安装 redis 包
+    'prefix': 'hospital:query:'       # redis 键前缀
+}
+
+# 访问量汇总表（utils/aggregates.py）：`refresh --watch` 的刷新间隔，也是页面重新检查汇总表是否可用的间隔（秒）
+AGGREGATE_REFRESH_INTERVAL = 60
+# 汇总表超过该秒数未刷新时页面改查基础表（None 表示不限制）
+AGGREGATE_MAX_STALENESS = 15 * 60
+# 每次刷新重新统计的最近 appointment_id 个数，覆盖晚于更大 id 提交的事务
+AGGREGATE_LAG_ROWS = 1000
+
+# 患者搜索（utils/search.py）
+SEARCH_CONFIG = {
+    'min_length': 2,     # 少于该长度的输入不发起查询
+    'limit': 20,         # 单次返回的最大结果数
+    'cache_ttl': 60      # 相同搜索词的结果缓存秒数
+}
+
+# 患者时间线缓存（utils/patient_timeline.py）
+PATIENT_TIMELINE_CONFIG = {
+    'max_patients': 50,      # 进程内最多缓存的患者数（LRU）
+    'recheck_interval': 30,  # 该秒数内再次打开同一患者时不检查数据是否变化
+    'max_age': 600           # 缓存超过该秒数后无论是否变化都重新加载
+}
+
+# 患者化验时间序列降采样（utils/downsample.py）
+DOWNSAMPLE_CONFIG = {
+    'method': os.getenv("DOWNSAMPLE_METHOD", "lttb"),  # 'lttb' 保留曲线形状，'minmax' 保留每个时间桶的最高/最低点
+    'max_points': 500,       # 每条曲线最多绘制的点数，约等于图表宽度的像素数
+    'keep_extremes': True    # 始终保留整条序列的最大值和最小值
+}
+
+# 医院收入预测（utils/predictions.py）
+PREDICTION_CONFIG = {
+    'n_jobs': int(os.getenv("PREDICTION_WORKERS", str(os.cpu_count() or 1))),  # 并行拟合的进程数，1 为串行
+    'timeout': 120,      # 单个医院拟合的最长秒数（串行且不在主线程时改用单个子进程拟合以保证超时生效）
+    'warm_start': True,  # 从上次选出的 ARIMA 阶数开始搜索
+    'search_budget': 10,  # 每个医院 ARIMA 阶数搜索的时间预算（秒，热启动与冷启动搜索都适用），None 为不限制
+    'max_refits': 3       # 连续只重拟合上次阶数的最多次数，之后重新搜索阶数
+}
+
+# ARIMA 预测结果的磁盘缓存（utils/forecast_cache.py）
+FORECAST_CACHE_CONFIG = {
+    'dir': os.getenv("FORECAST_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'forecasts')),
+    'max_entries': 5000,              # 最多保留的条目数
+    'max_bytes': 200 * 1024 * 1024    # 缓存目录总大小上限
+}
+
+# 后台预测调度（utils/forecast_scheduler.py）
+SCHEDULER_CONFIG = {
+    'in_process': True,    # True: 由 Streamlit 进程启动后台线程；False: 单独运行 python -m utils.forecast_scheduler
+    'interval': 6 * 3600,  # 即使数据不变，也每隔该秒数重新拟合一次
+    'poll_interval': 300,  # 检查是否有新账单数据的间隔（秒）
+    'store_path': os.path.join(os.path.dirname(FORECAST_CACHE_CONFIG['dir']), 'latest_forecasts.pkl')
+}
+
+# 体征 / 化验分布的服务端分箱与散点抽样（utils/distributions.py）
+DISTRIBUTION_CONFIG = {
+    'bins': 20,              # 未指定分箱边界时，在数据最小值与最大值之间等宽分箱的个数
+    'edges': {               # 各指标的默认分箱边界（左闭右开），未列出的指标按 bins 自动分箱
+        'bmi': [10, 15, 18.5, 20, 22.5, 25, 27.5, 30, 35, 40, 50]
+    },
+    'sample_size': 5000,     # 散点图蓄水池抽样的最大点数
+    'chunksize': 50000       # 抽样时每次从数据库读取的行数
+}
+
+# 分析用 Parquet 快照（utils/snapshots.py，需要 pyarrow；SQL 查询另需 duckdb）
+SNAPSHOT_CONFIG = {
+    'dir': os.getenv("SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'snapshots')),
+    'interval': 3600,         # python -m utils.snapshots export --watch 两次导出之间的秒数
+    'chunksize': 50000,       # 导出时每次从数据库读取的行数
+    'compression': 'zstd',    # Parquet 压缩算法
+    'keep': 2,                # 每张表保留的快照版本数（旧版本可能仍被正在读取的进程使用）
+    'serve_analytics': os.getenv("SNAPSHOT_ANALYTICS", "0") == "1"  # 为 True 且快照存在时，部分分析查询改读快照
+}
+
+# 图表后端（utils/plotting.py 的 show_chart）
+PLOT_CONFIG = {
+    'backend': os.getenv("PLOT_BACKEND", "matplotlib"),  # 'matplotlib'：服务端渲染为图片；'plotly'：浏览器端渲染
+    'webgl_threshold': 1000,  # Plotly 后端中点数超过该值的散点使用 WebGL（Scattergl），箱线图改为发送预先计算的统计量
+    'max_categories': 30      # barplot(top_n='auto') 超过该类别数时只画前 N 个，其余合并为 "Other"
+}
+
+# 图表渲染缓存（utils/plotting.py 的 render_cached）
+PLOT_CACHE_CONFIG = {
+    'max_entries': 256,              # 最多缓存的图片数
+    'max_bytes': 64 * 1024 * 1024,   # 缓存图片总大小上限
+    'dpi': 100                       # 渲染分辨率
+}
+
 # Streamlit 页面配置
 PAGE_CONFIG = {
     'page_title': 'Hospital Management System',
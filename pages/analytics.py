@@ -4,7 +4,7 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
-from utils.plotting import barplot, pieplot, donutplot, boxplot_by_category, heatmap
+from utils.plotting import barplot, pieplot, donutplot, boxplot_from_stats, heatmap, show_chart, get_default_backend, BACKENDS
 
 from utils.queries import (
     get_most_visited_hospitals,
@@ -12,16 +12,15 @@ from utils.queries import (
     get_department_patient_doctor_ratio,
     get_patient_age_gender_distribution,
     get_monthly_appointment_trend,
-    get_appointment_status_ratio,
     get_patient_age_groups,
     get_hospital_avg_rating,
-    get_patient_age_by_hospital_for_boxplot,
-    get_total_patients,
-    get_total_appointments,
-    get_total_doctors
+    get_patient_age_stats_by_hospital,
+    get_kpi_snapshot,
+    run_queries
 )
 
-from utils.database import run_query
+from utils.sections import lazy_section
+from utils.query_cache import clear_query_cache
 
 # 页面配置
 st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
@@ -29,19 +28,33 @@ st.set_page_config(page_title="Analytics", page_icon="📊", layout="wide")
 st.title("Hospital Analytics Dashboard")
 st.markdown("---")
 
+# 图表后端：matplotlib 在服务端渲染为图片，plotly 由浏览器渲染；可在侧边栏按会话切换
+chart_backend = st.session_state.get('chart_backend', get_default_backend())
+
+# 各区块只在展开并加载后才执行自己的查询（见 utils/sections.py），
+# 区块内部的查询仍然并发执行
 # ==================== Hospital Analytics ====================
-with st.expander("Hospital and Departmental Analytics", expanded=True):
+def render_hospital_analytics(timer):
+    data = run_queries({
+        'hospitals': get_most_visited_hospitals,
+        'departments': get_most_visited_departments,
+        'ratio': get_department_patient_doctor_ratio,
+        'rating': get_hospital_avg_rating
+    })
+    timer.mark('queries')
     
     # Most Frequently Visited Hospitals
     st.subheader("Most Frequently Visited Hospitals")
-    df_hospitals = get_most_visited_hospitals()
+    df_hospitals = data['hospitals']
     
     if df_hospitals is not None and not df_hospitals.empty:
         # 准备数据字典
         hospital_freq = dict(zip(df_hospitals['hospital_name'], df_hospitals['visit_count']))
         
         # 使用你的自定义 barplot
-        fig, ax = barplot(
+        show_chart(
+            barplot,
+            backend=chart_backend,
             data=hospital_freq,
             title='Most Frequently Visited Hospitals',
             xlabel='Hospital Name',
@@ -50,11 +63,10 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
             show_values=True,
             color=True,
             sort_values=True,
+            top_n='auto',
             figsize=(12, 8)
         )
         
-        st.pyplot(fig)
-        
         # 显示数据表
         if st.checkbox("View Most Frequently Visited Hospitals Table"):
             st.dataframe(df_hospitals, use_container_width=True)
@@ -65,7 +77,7 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
 
     # Most Frequently Visited Departments
     st.subheader("Most Frequently Visited Departments")
-    df_departments = get_most_visited_departments()
+    df_departments = data['departments']
     
     if df_departments is not None and not df_departments.empty:
         # 准备数据字典
@@ -75,7 +87,9 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
         department_freq = dict(zip(df_departments['full_name'], df_departments['frequency']))
         
         # 使用你的自定义 barplot
-        fig, ax = barplot(
+        show_chart(
+            barplot,
+            backend=chart_backend,
             data=department_freq,
             title='Most Frequently Visited Departments',
             xlabel='Department Name',
@@ -84,11 +98,10 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
             show_values=True,
             color=True,
             sort_values=True,
+            top_n='auto',
             figsize=(12, 8)
         )
         
-        st.pyplot(fig)
-        
         # 显示数据表
         if st.checkbox("View Most Frequently Visited Departments Table"):
             st.dataframe(df_departments, use_container_width=True)
@@ -99,13 +112,15 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
     
     # Department Patient-Doctor Ratio
     st.subheader("Departments with Highest Patient-Doctor Ratios")
-    df_ratio = get_department_patient_doctor_ratio()
+    df_ratio = data['ratio']
     
     if df_ratio is not None and not df_ratio.empty:
         # 合并医院和科室名称
         df_ratio['full_name'] = df_ratio['hospital_name'] + ' - ' + df_ratio['department_name']
         
-        fig, ax = barplot(
+        show_chart(
+            barplot,
+            backend=chart_backend,
             data=None,
             x=df_ratio['full_name'].values,
             y=df_ratio['patient_doctor_ratio'].values,
@@ -119,8 +134,6 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
             figsize=(12, 8)
         )
         
-        st.pyplot(fig)
-        
         if st.checkbox("View Detailed Statistics"):
             st.dataframe(df_ratio[['department_name', 'doctor_count', 'patient_count', 'patient_doctor_ratio']], 
                         use_container_width=True)
@@ -131,10 +144,12 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
     
     # Hospital Average Rating
     st.subheader("Hospital Average Ratings")
-    df_rating = get_hospital_avg_rating()
+    df_rating = data['rating']
     
     if df_rating is not None and not df_rating.empty:
-        fig, ax = barplot(
+        show_chart(
+            barplot,
+            backend=chart_backend,
             data=None,
             x=df_rating['hospital_name'].values,
             y=df_rating['avg_rating'].values,
@@ -148,20 +163,25 @@ with st.expander("Hospital and Departmental Analytics", expanded=True):
             ascending=False,
             figsize=(12, 8)
         )
-        
-        st.pyplot(fig)
     else:
         st.warning("No rating data available")
 
 # ==================== Appointment Analytics ====================
-with st.expander("Appointment Analytics", expanded=False):
+def render_appointment_analytics(timer):
+    data = run_queries({
+        'monthly': get_monthly_appointment_trend,
+        'kpi': get_kpi_snapshot
+    })
+    timer.mark('queries')
     
     # Monthly Appointment Trend
     st.subheader("Monthly Appointment Trends")
-    df_monthly = get_monthly_appointment_trend()
+    df_monthly = data['monthly']
     
     if df_monthly is not None and not df_monthly.empty:
-        fig, ax = barplot(
+        show_chart(
+            barplot,
+            backend=chart_backend,
             data=None,
             x=df_monthly['month'].values,
             y=df_monthly['appointment_num'].values,
@@ -172,8 +192,6 @@ with st.expander("Appointment Analytics", expanded=False):
             sort_values=False,
             figsize=(12, 6)
         )
-        
-        st.pyplot(fig)
     else:
         st.warning("No monthly trend data available")
     
@@ -181,20 +199,16 @@ with st.expander("Appointment Analytics", expanded=False):
     
     # Appointment Status Overview
     st.subheader("Appointment Status Overview")
-    df_status = get_appointment_status_ratio()
+    kpis = data['kpi']
     
-    if df_status is not None and not df_status.empty:
-        # 转换为字典
-        status_dict = df_status.iloc[0].to_dict()
+    if kpis is not None and kpis.total_appointments > 0:
+        # 状态计数与总数来自同一条 KPI 查询
+        total_appointments = kpis.total_appointments
+        status_counts = kpis.status_counts()
         
-        total_appointments = get_total_appointments()
-        status_counts = {
-            'Scheduled': status_dict['scheduled'] * total_appointments,
-            'Cancelled': status_dict['cancelled'] * total_appointments,
-            'Completed': status_dict['completed'] * total_appointments
-        }
-        
-        fig, ax = donutplot(
+        show_chart(
+            donutplot,
+            backend=chart_backend,
             data=status_counts,
             title='Appointment Status Overview',
             palette='pastel',
@@ -202,31 +216,35 @@ with st.expander("Appointment Analytics", expanded=False):
             legend=True,
             figsize=(10, 8)
         )
-        
-        st.pyplot(fig)
     else:
         st.warning("No appointment status data available")
 
 # ==================== Patient Demographics ====================
-with st.expander("Patient Demographics", expanded=False):
+def render_patient_demographics(timer):
+    data = run_queries({
+        'age': get_patient_age_groups,
+        'gender': get_patient_age_gender_distribution,
+        'age_hospital': get_patient_age_stats_by_hospital
+    })
+    timer.mark('queries')
     
     # Patient Age Distribution
     st.subheader("Patient Age Distribution")
-    df_age = get_patient_age_groups()
+    df_age = data['age']
     
     if df_age is not None and not df_age.empty:
         # 转换为 Series
         age_series = pd.Series(df_age['count'].values, index=df_age['age_group'].values)
         
-        fig, ax = pieplot(
+        show_chart(
+            pieplot,
+            backend=chart_backend,
             data=age_series,
             title="Patient Age Distribution",
             palette="rocket",
             textcolor='white',
             figsize=(10, 8)
         )
-        
-        st.pyplot(fig)
     else:
         st.warning("No age distribution data available")
     
@@ -234,12 +252,14 @@ with st.expander("Patient Demographics", expanded=False):
     
     # Gender Distribution
     st.subheader("Patient Gender Distribution")
-    df_gender = get_patient_age_gender_distribution()
+    df_gender = data['gender']
     
     if df_gender is not None and not df_gender.empty:
         gender_counts = df_gender.groupby('gender')['count'].sum().reset_index()
         
-        fig, ax = pieplot(
+        show_chart(
+            pieplot,
+            backend=chart_backend,
             data=None,
             x=gender_counts['gender'].values,
             y=gender_counts['count'].values,
@@ -247,8 +267,6 @@ with st.expander("Patient Demographics", expanded=False):
             palette='Set2',
             figsize=(8, 8)
         )
-        
-        st.pyplot(fig)
     else:
         st.warning("No gender distribution data available")
     
@@ -256,13 +274,14 @@ with st.expander("Patient Demographics", expanded=False):
     
     # Patient Age by Hospital (Box Plot)
     st.subheader("Patient Age Distribution by Hospital")
-    df_age_hospital = get_patient_age_by_hospital_for_boxplot()
+    # 每家医院的统计量在数据库聚合后计算，不再传输每条预约的年龄
+    age_stats = data['age_hospital']
     
-    if df_age_hospital is not None and not df_age_hospital.empty:
-        fig, ax = boxplot_by_category(
-            data=df_age_hospital,
-            x_col='hospital_name',
-            y_col='age',
+    if age_stats is not None and not age_stats.empty:
+        show_chart(
+            boxplot_from_stats,
+            backend=chart_backend,
+            stats=age_stats,
             title='Patient Age Distribution by Hospital',
             xlabel='Hospital Name',
             ylabel='Age (years)',
@@ -272,23 +291,20 @@ with st.expander("Patient Demographics", expanded=False):
             figsize=(14, 8)
         )
         
-        st.pyplot(fig)
-        
         # 显示统计信息
         if st.checkbox("View Statistical Summary"):
-            stats = df_age_hospital.groupby('hospital_name')['age'].agg([
-                ('count', 'count'),
-                ('mean', 'mean'),
-                ('median', 'median'),
-                ('std', 'std'),
-                ('min', 'min'),
-                ('max', 'max')
-            ]).round(2)
-            st.dataframe(stats, use_container_width=True)
+            summary = age_stats[['count', 'mean', 'median', 'std', 'min', 'q1', 'q3', 'max']].astype(float).round(2)
+            st.dataframe(summary, use_container_width=True)
     else:
         st.warning("No age by hospital data available")
 
 
+lazy_section("Hospital and Departmental Analytics", render_hospital_analytics,
+             key='hospitals', expanded=True, autoload=True)
+lazy_section("Appointment Analytics", render_appointment_analytics, key='appointments')
+lazy_section("Patient Demographics", render_patient_demographics, key='demographics')
+
+
 # 侧边栏
 with st.sidebar:
     st.title("Analytics Controls")
@@ -303,11 +319,20 @@ with st.sidebar:
     
     st.markdown("---")
     
-    # 导入必要的函数
-    from utils.queries import get_total_appointments
+    st.radio(
+        "Chart Renderer",
+        BACKENDS,
+        index=BACKENDS.index(get_default_backend()),
+        key='chart_backend',
+        format_func=lambda backend: {'matplotlib': 'Static images (matplotlib)', 'plotly': 'Interactive (Plotly)'}[backend],
+        horizontal=True
+    )
+    
+    st.markdown("---")
     
     if st.button("Refresh Data", use_container_width=True):
-        st.cache_data.clear()
+        # 只清空查询结果缓存，预测等其他缓存不受影响
+        clear_query_cache()
         st.success("Data refreshed!")
         st.rerun()
     
@@ -4,13 +4,12 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
-from utils.queries import (
-    search_patients,
-    get_patient_blood_chemistry,
-    get_patient_vitamin_levels
-)
+from utils.patient_timeline import get_patient_timeline
+from utils.downsample import downsample_column
 
 from utils.database import run_query
+from utils.search import normalize_search_term, PatientSearchResults
+from config import SEARCH_CONFIG, DOWNSAMPLE_CONFIG
 
 # ==================== Individual Patient Tracking ====================
 
@@ -18,27 +17,46 @@ with st.expander("Individual Patient Tracking", expanded=True):
     
     st.subheader("Search for a Patient")
     
-    search_term = st.text_input(
-        "Enter patient name or email:", 
-        placeholder="e.g., John Smith or john@email.com"
-    )
+    # 去抖：输入放在表单里，只有回车或点击 Search 提交时才发起查询；
+    # 其它控件触发的重跑沿用上次提交的搜索词和结果
+    with st.form('patient_search_form', border=False):
+        typed_term = st.text_input(
+            "Enter patient name or email:", 
+            placeholder="e.g., John Smith or john@email.com"
+        )
+        if st.form_submit_button("Search"):
+            st.session_state['patient_search_term'] = normalize_search_term(typed_term)
+    
+    # 输入过短时不查询
+    search_term = st.session_state.get('patient_search_term', '')
+    if len(search_term) < SEARCH_CONFIG['min_length']:
+        search_term = ''
     
     if search_term:
-        df_patients = search_patients(search_term)
+        # 每个搜索词只建一次按 patient_id 索引的结果，下拉框标签和患者信息都按 id 直接查找
+        results = st.session_state.get('patient_search')
+        if results is None or results.search_term != search_term or results.failed:
+            results = PatientSearchResults(search_term)
+            st.session_state['patient_search'] = results
         
-        if df_patients is not None and not df_patients.empty:
-            st.write(f"Found {len(df_patients)} patient(s):")
+        if len(results) > 0:
+            st.write(f"Found {len(results)}{'+' if results.has_more else ''} patient(s):")
             
             selected_patient = st.selectbox(
                 "Select a patient:",
-                options=df_patients['patient_id'].tolist(),
-                format_func=lambda x: df_patients[df_patients['patient_id'] == x]['full_name'].values[0]
+                options=results.ids,
+                format_func=results.label
             )
+            
+            # 按需加载下一页（键集分页，见 utils/search.py）
+            if results.has_more and st.button("Load more results"):
+                results.load_more()
+                st.rerun()
 
             if selected_patient:
                 selected_patient = int(selected_patient)
                 
-                patient_info = df_patients[df_patients['patient_id'] == selected_patient].iloc[0]
+                patient_info = results[selected_patient]
                 
                 # 显示患者基本信息
                 col1, col2, col3, col4 = st.columns(4)
@@ -53,9 +71,27 @@ with st.expander("Individual Patient Tracking", expanded=True):
                 
                 st.markdown("---")
                 
+                # 一次查询取得该患者全部化验和体征数据，最近查看过的患者直接命中缓存
+                timeline = get_patient_timeline(selected_patient)
+
+                # 记录较多时按日期范围查看：范围内点数超过 max_points 的曲线会被降采样，
+                # 缩小范围直到不超过 max_points 即显示完整分辨率
+                date_range = None
+                if timeline is not None and len(timeline.labs) > DOWNSAMPLE_CONFIG['max_points']:
+                    visit_dates = pd.to_datetime(timeline.labs['date_of_visit']).dt.date
+                    first_visit, last_visit = visit_dates.min(), visit_dates.max()
+                    if first_visit < last_visit:
+                        date_range = st.slider(
+                            "Visit date range:",
+                            min_value=first_visit,
+                            max_value=last_visit,
+                            value=(first_visit, last_visit),
+                            key=f"lab_date_range_{selected_patient}"
+                        )
+                
                 # Blood Chemistry Panel
                 st.subheader("Blood Chemistry Panel Over Time")
-                df_blood = get_patient_blood_chemistry(selected_patient)
+                df_blood = timeline.blood_chemistry() if timeline is not None else None
 
                 if df_blood is not None and not df_blood.empty:
                     # 检查是否有任何非空的血液化学数据
@@ -72,13 +108,16 @@ with st.expander("Individual Patient Tracking", expanded=True):
                         
                         if metrics:
                             fig = go.Figure()
+                            n_shown, n_total = 0, 0
                             
                             for metric in metrics:
                                 # 只绘制有数据的指标
                                 if metric in df_blood.columns and df_blood[metric].notna().any():
+                                    x, y, n_points = downsample_column(df_blood, 'date_of_visit', metric, date_range)
+                                    n_shown, n_total = n_shown + len(y), n_total + n_points
                                     fig.add_trace(go.Scatter(
-                                        x=df_blood['date_of_visit'],
-                                        y=df_blood[metric],
+                                        x=x,
+                                        y=y,
                                         mode='lines+markers',
                                         name=metric.replace('_', ' ').title()
                                     ))
@@ -92,6 +131,9 @@ with st.expander("Individual Patient Tracking", expanded=True):
                                     hovermode='x unified'
                                 )
                                 st.plotly_chart(fig, use_container_width=True)
+                                if n_shown < n_total:
+                                    st.caption(f"Showing {n_shown:,} of {n_total:,} points ({DOWNSAMPLE_CONFIG['method']} downsampling). "
+                                               "Narrow the date range to see every measurement.")
                             else:
                                 st.warning("Selected metrics have no data for this patient")
                         else:
@@ -105,7 +147,7 @@ with st.expander("Individual Patient Tracking", expanded=True):
                 
                 # Vitamin D Levels
                 st.subheader("Vitamin D Levels Over Time")
-                df_vitamins = get_patient_vitamin_levels(selected_patient)
+                df_vitamins = timeline.vitamin_levels() if timeline is not None else None
 
                 if df_vitamins is not None and not df_vitamins.empty:
                     # 检查是否有任何维生素D数据
@@ -113,12 +155,15 @@ with st.expander("Individual Patient Tracking", expanded=True):
                     
                     if has_vitamin_data:
                         fig = go.Figure()
+                        n_shown, n_total = 0, 0
                         
                         for col in ['vitamin_d2', 'vitamin_d3', 'vitamin_d_total']:
                             if col in df_vitamins.columns and df_vitamins[col].notna().any():
+                                x, y, n_points = downsample_column(df_vitamins, 'date_of_visit', col, date_range)
+                                n_shown, n_total = n_shown + len(y), n_total + n_points
                                 fig.add_trace(go.Scatter(
-                                    x=df_vitamins['date_of_visit'],
-                                    y=df_vitamins[col],
+                                    x=x,
+                                    y=y,
                                     mode='lines+markers',
                                     name=col.replace('_', ' ').title()
                                 ))
@@ -132,6 +177,9 @@ with st.expander("Individual Patient Tracking", expanded=True):
                         )
                         
                         st.plotly_chart(fig, use_container_width=True)
+                        if n_shown < n_total:
+                            st.caption(f"Showing {n_shown:,} of {n_total:,} points ({DOWNSAMPLE_CONFIG['method']} downsampling). "
+                                       "Narrow the date range to see every measurement.")
                     else:
                         st.warning("No vitamin D data available for this patient")
                 else:
@@ -139,4 +187,4 @@ with st.expander("Individual Patient Tracking", expanded=True):
         else:
             st.info("No patients found matching your search")
     else:
-        st.info("Enter a search term to find patients")
\ No newline at end of file
+        st.info(f"Enter at least {SEARCH_CONFIG['min_length']} characters to find patients")
\ No newline at end of file
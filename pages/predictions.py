@@ -5,15 +5,32 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import pandas as pd
 import numpy as np
-from utils.predictions import hospital_revenue_prediction
+from datetime import datetime
+from utils.forecast_scheduler import ensure_scheduler_started, load_forecasts
 
 st.set_page_config(page_title="ARIMA Predictions", layout="wide")
 
 st.title("Hospital Revenue Predictions - ARIMA vs Linear Regression")
 
 
+# 预测由后台调度器拟合（utils/forecast_scheduler.py），本页只读取最近一次发布的结果
+ensure_scheduler_started()
+published = load_forecasts()
 
-arima_predictions_dict, predictions_dict = hospital_revenue_prediction()
+if published is None:
+    st.info("Forecasts are being computed in the background and will appear here once the first run finishes.")
+    if st.button("Check Again"):
+        st.rerun()
+    st.stop()
+
+arima_predictions_dict, predictions_dict = published['arima'], published['linear']
+
+age_minutes = int((datetime.now() - published['computed_at']).total_seconds() // 60)
+age_text = f"{age_minutes // 60}h {age_minutes % 60}m" if age_minutes >= 60 else f"{age_minutes}m"
+st.caption(
+    f"Forecasts computed {published['computed_at']:%Y-%m-%d %H:%M} ({age_text} ago) "
+    f"in {published['duration']:.1f}s · refreshed automatically when new billing data arrives"
+)
 
 # ==================== 侧边栏控制 ====================
 with st.sidebar:
@@ -231,6 +248,18 @@ else:
                 st.write(f"**Hospital {hospital_id}**")
                 st.write(f"ARIMA Order: {arima_predictions_dict[hospital_id]['optimal_order']}")
                 st.write(f"AIC: {arima_predictions_dict[hospital_id]['aic']:.2f}")
+                if arima_predictions_dict[hospital_id].get('cached'):
+                    st.caption(
+                        f"Reused cached fit (order from a {arima_predictions_dict[hospital_id]['search_mode']} search); "
+                        "no model was fitted for this run"
+                    )
+                elif 'search_mode' in arima_predictions_dict[hospital_id]:
+                    st.caption(
+                        f"Order search: {arima_predictions_dict[hospital_id]['search_mode']}, "
+                        f"{arima_predictions_dict[hospital_id]['n_candidates']} candidates, "
+                        f"{arima_predictions_dict[hospital_id]['fit_seconds']:.2f}s"
+                        f"{' (stopped at the time budget)' if arima_predictions_dict[hospital_id].get('truncated') else ''}"
+                    )
             
             with col2:
                 pred_df = pd.DataFrame({
@@ -0,0 +1,36 @@
+-- sql/001_query_indexes.sql
+--
+-- Indexes backing the queries in utils/queries.py.
+-- Apply once:  mysql -u root -p myhospitaldb < sql/001_query_indexes.sql
+-- Check the result with:  python -m utils.index_advisor
+--
+-- MySQL has no CREATE INDEX IF NOT EXISTS; re-running this file reports
+-- "Duplicate key name" for indexes that already exist, which is harmless.
+
+-- get_today_appointments / get_kpi_snapshot: range on the raw column.
+-- get_monthly_appointment_trend groups by MONTH(appointment_date); that can
+-- never be a range, but with this index it is answered from the index alone.
+CREATE INDEX idx_appointments_date ON appointments (appointment_date);
+
+-- appointments -> doctors joins (rankings, patient-doctor ratio, revenue)
+CREATE INDEX idx_appointments_doctor ON appointments (doctor_id);
+
+-- get_patient_age_by_hospital_for_boxplot: patients -> appointments
+CREATE INDEX idx_appointments_patient ON appointments (patient_id);
+
+-- doctors -> departments / hospitals
+CREATE INDEX idx_doctors_department ON doctors (department_id);
+CREATE INDEX idx_doctors_hospital ON doctors (hospital_id);
+
+-- get_hospital_revenue_history: WHERE payment_status = 'Paid' becomes an
+-- index range; treatment_id and amount make the index covering.
+CREATE INDEX idx_billing_status_date ON billing (payment_status, bill_date, treatment_id, amount);
+
+-- billing -> treatments -> appointments
+CREATE INDEX idx_treatments_appointment ON treatments (appointment_id);
+
+-- per-patient lab time series (blood chemistry, vitamin D), already sorted
+CREATE INDEX idx_patient_labs_patient_date ON patient_labs (patient_id, date_of_visit);
+
+-- patient_vitals -> patients
+CREATE INDEX idx_patient_vitals_patient ON patient_vitals (patient_id);
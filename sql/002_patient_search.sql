@@ -0,0 +1,14 @@
+-- sql/002_patient_search.sql
+--
+-- Indexes for utils/search.py (patient search).
+-- Apply once:  mysql -u root -p myhospitaldb < sql/002_patient_search.sql
+
+-- ranked name / e-mail word-prefix search: MATCH(...) AGAINST ('+jo* +smi*' IN BOOLEAN MODE)
+ALTER TABLE patients ADD FULLTEXT INDEX ft_patients_name_email (first_name, last_name, email);
+
+-- e-mail prefix search and the LIKE 'term%' fallback used before the
+-- FULLTEXT index exists (the default collation is case-insensitive, so no
+-- LOWER() is needed and these stay index ranges)
+CREATE INDEX idx_patients_email ON patients (email);
+CREATE INDEX idx_patients_last_first ON patients (last_name, first_name);
+CREATE INDEX idx_patients_first ON patients (first_name);
@@ -0,0 +1,38 @@
+-- sql/003_visit_summaries.sql
+--
+-- Summary tables for the visit rankings (utils/aggregates.py).
+-- Apply once:  mysql -u root -p myhospitaldb < sql/003_visit_summaries.sql
+-- (or run:     python -m utils.aggregates setup)
+-- then fill them:  python -m utils.aggregates rebuild
+-- and keep them fresh:  python -m utils.aggregates refresh --watch  (or cron)
+-- After upgrading, rebuild once so the no-department bucket (department_id 0)
+-- is counted.
+--
+-- Tables created before recent_count existed need:
+--   ALTER TABLE agg_hospital_visits ADD COLUMN recent_count BIGINT NOT NULL DEFAULT 0;
+--   ALTER TABLE agg_department_visits ADD COLUMN recent_count BIGINT NOT NULL DEFAULT 0;
+-- (`python -m utils.aggregates setup` adds the column when it is missing.)
+
+-- visit_count is the total; recent_count is the part coming from the
+-- trailing id window that each refresh recounts
+CREATE TABLE IF NOT EXISTS agg_hospital_visits (
+    hospital_id INT NOT NULL PRIMARY KEY,
+    visit_count BIGINT NOT NULL DEFAULT 0,
+    recent_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- department_id 0 counts appointments without a department
+CREATE TABLE IF NOT EXISTS agg_department_visits (
+    department_id INT NOT NULL PRIMARY KEY,
+    visit_count BIGINT NOT NULL DEFAULT 0,
+    recent_count BIGINT NOT NULL DEFAULT 0
+);
+
+-- last_appointment_id: settled boundary; counts at or below it are final
+CREATE TABLE IF NOT EXISTS agg_watermarks (
+    name VARCHAR(64) NOT NULL PRIMARY KEY,
+    last_appointment_id BIGINT NOT NULL DEFAULT 0,
+    refreshed_at DATETIME NULL
+);
+
+INSERT IGNORE INTO agg_watermarks (name, last_appointment_id) VALUES ('appointments', 0);
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# run from any directory: the app imports `config` and `utils` from the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
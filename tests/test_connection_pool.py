@@ -0,0 +1,117 @@
+import threading
+
+import pytest
+
+from utils import database
+from utils.database import ConnectionPool, PoolTimeout
+
+
+class FakeConnection:
+    def __init__(self):
+        self.connected = True
+        self.in_transaction = False
+        self.closed = False
+        self.rollbacks = 0
+        self.reconnects = 0
+
+    def is_connected(self):
+        return self.connected
+
+    def reconnect(self, attempts=1, delay=0):
+        self.reconnects += 1
+        self.connected = True
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.in_transaction = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def created(monkeypatch):
+    connections = []
+
+    def connect(**config):
+        conn = FakeConnection()
+        connections.append(conn)
+        return conn
+
+    monkeypatch.setattr(database.mysql.connector, 'connect', connect)
+    return connections
+
+
+def test_released_connection_is_reused(created):
+    pool = ConnectionPool({}, pool_size=2)
+    conn = pool.checkout()
+    pool.release(conn)
+    assert pool.checkout() is conn
+    assert len(created) == 1
+
+
+def test_checkout_times_out_when_pool_is_full(created):
+    pool = ConnectionPool({}, pool_size=1, timeout=0.05)
+    pool.checkout()
+    with pytest.raises(PoolTimeout):
+        pool.checkout()
+    stats = pool.stats()
+    assert stats['timeouts'] == 1
+    assert stats['in_use'] == 1
+
+
+def test_waiting_checkout_gets_released_connection(created):
+    pool = ConnectionPool({}, pool_size=1, timeout=5)
+    conn = pool.checkout()
+    timer = threading.Timer(0.05, pool.release, args=(conn,))
+    timer.start()
+    assert pool.checkout() is conn
+    timer.join()
+    assert pool.stats()['waits'] == 1
+
+
+def test_release_rolls_back_open_transaction(created):
+    pool = ConnectionPool({}, pool_size=1)
+    conn = pool.checkout()
+    conn.in_transaction = True
+    pool.release(conn)
+    assert conn.rollbacks == 1
+    assert pool.stats()['idle'] == 1
+
+
+def test_discarded_connection_is_closed_and_frees_its_slot(created):
+    pool = ConnectionPool({}, pool_size=1, timeout=0.05)
+    conn = pool.checkout()
+    pool.release(conn, discard=True)
+    assert conn.closed
+    assert pool.checkout() is not conn
+    assert pool.stats()['discarded'] == 1
+
+
+def test_dead_idle_connection_is_reconnected(created):
+    pool = ConnectionPool({}, pool_size=1, pre_ping=True)
+    conn = pool.checkout()
+    pool.release(conn)
+    conn.connected = False
+    assert pool.checkout() is conn
+    assert conn.reconnects == 1
+
+
+def test_connection_context_releases_on_error(created):
+    pool = ConnectionPool({}, pool_size=1, timeout=0.05)
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError
+    assert pool.stats()['in_use'] == 0
+    with pool.connection() as conn:
+        assert conn is created[0]
+
+
+def test_closed_pool_refuses_checkout(created):
+    pool = ConnectionPool({}, pool_size=1)
+    conn = pool.checkout()
+    pool.release(conn)
+    pool.close()
+    assert conn.closed
+    with pytest.raises(RuntimeError):
+        pool.checkout()
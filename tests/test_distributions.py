@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from utils.distributions import reservoir_sample
+
+
+def _chunks(n, size):
+    for start in range(0, n, size):
+        yield pd.DataFrame({'row': np.arange(start, min(start + size, n))})
+
+
+def test_small_input_is_returned_whole():
+    sample = reservoir_sample(_chunks(30, 7), 50, seed=0)
+    assert sorted(sample['row']) == list(range(30))
+
+
+def test_sample_has_n_distinct_rows():
+    sample = reservoir_sample(_chunks(10000, 333), 100, seed=0)
+    assert len(sample) == 100
+    assert sample['row'].is_unique
+    assert sample['row'].between(0, 9999).all()
+
+
+def test_same_seed_same_sample():
+    first = reservoir_sample(_chunks(5000, 100), 50, seed=3)
+    second = reservoir_sample(_chunks(5000, 100), 50, seed=3)
+    assert first['row'].tolist() == second['row'].tolist()
+
+
+def test_every_row_equally_likely():
+    hits = np.zeros(200)
+    for seed in range(400):
+        sample = reservoir_sample(_chunks(200, 30), 20, seed=seed)
+        hits[sample['row'].to_numpy()] += 1
+    # each row is kept with probability 20 / 200 = 0.1, i.e. 40 of 400 times
+    assert abs(hits.mean() - 40) < 1e-9
+    assert hits.min() > 15 and hits.max() < 70
+
+
+def test_empty_input():
+    assert reservoir_sample(iter([]), 10).empty
@@ -0,0 +1,34 @@
+import numpy as np
+
+from utils.downsample import downsample_series, lttb_indices
+
+
+def test_lttb_keeps_endpoints_and_requested_count():
+    x = np.arange(1000, dtype=float)
+    y = np.sin(x / 50)
+    indices = lttb_indices(x, y, 100)
+    assert len(indices) == 100
+    assert indices[0] == 0
+    assert indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    x = np.arange(500, dtype=float)
+    y = np.zeros(500)
+    y[321] = 10.0
+    assert 321 in lttb_indices(x, y, 50)
+
+
+def test_lttb_returns_everything_when_short():
+    x = np.arange(10, dtype=float)
+    assert list(lttb_indices(x, x, 20)) == list(range(10))
+
+
+def test_downsample_series_keeps_extremes():
+    x = np.arange(2000)
+    y = np.random.default_rng(0).normal(size=2000)
+    kept_x, kept_y = downsample_series(x, y, max_points=100, method='minmax', keep_extremes=True)
+    assert len(kept_x) <= 102
+    assert kept_y.max() == y.max()
+    assert kept_y.min() == y.min()
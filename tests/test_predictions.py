@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.predictions import batch_linear_forecast
+
+
+def _revenue():
+    rng = np.random.default_rng(0)
+    rows = []
+    for hospital_id, n_months in [(1, 12), (2, 7), (3, 24)]:
+        for month in range(n_months):
+            rows.append({
+                'hospital_id': hospital_id,
+                'year_month': f"{2020 + month // 12}-{month % 12 + 1:02d}",
+                'amount': 1000 + 50 * hospital_id * month + rng.normal(scale=100)
+            })
+    # shuffled, as the function must not rely on input order
+    return pd.DataFrame(rows).sample(frac=1, random_state=0)
+
+
+def test_matches_polyfit_per_hospital():
+    revenue = _revenue()
+    result = batch_linear_forecast(revenue, horizon=3)
+
+    for hospital_id, group in revenue.groupby('hospital_id'):
+        y = group.sort_values('year_month')['amount'].to_numpy()
+        x = np.arange(len(y))
+        slope, intercept = np.polyfit(x, y, 1)
+        fitted = intercept + slope * x
+        r2 = 1 - ((y - fitted) ** 2).sum() / ((y - y.mean()) ** 2).sum()
+
+        row = result.loc[hospital_id]
+        assert row['n_obs'] == len(y)
+        assert row['slope'] == pytest.approx(slope)
+        assert row['intercept'] == pytest.approx(intercept)
+        assert row['r2_score'] == pytest.approx(r2)
+        future = intercept + slope * np.arange(len(y), len(y) + 3)
+        assert row[['forecast_1', 'forecast_2', 'forecast_3']].to_numpy(dtype=float) == pytest.approx(future)
+
+
+def test_constant_series_has_perfect_fit():
+    revenue = pd.DataFrame({'hospital_id': [1] * 5, 'year_month': [f"2021-0{m}" for m in range(1, 6)],
+                            'amount': [10.0] * 5})
+    row = batch_linear_forecast(revenue).loc[1]
+    assert row['slope'] == pytest.approx(0)
+    assert row['r2_score'] == 1.0
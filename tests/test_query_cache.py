@@ -0,0 +1,56 @@
+import pytest
+
+from utils.query_cache import MemoryBackend, QueryCache, read_tables, written_tables
+
+
+@pytest.mark.parametrize('query, tables', [
+    ("SELECT * FROM patients", {'patients'}),
+    ("SELECT a.x FROM appointments a JOIN doctors d ON a.doctor_id = d.doctor_id", {'appointments', 'doctors'}),
+    ("SELECT * FROM `billing` b LEFT JOIN treatments t ON b.treatment_id = t.treatment_id", {'billing', 'treatments'}),
+    ("SELECT EXTRACT(YEAR FROM bill_date) FROM billing", {'billing'}),
+    ("SELECT * FROM hospitals WHERE hospital_id IN (SELECT hospital_id FROM departments)", {'hospitals', 'departments'}),
+    ("SELECT 'from patients' AS label FROM doctors", {'doctors'}),
+])
+def test_read_tables(query, tables):
+    assert read_tables(query) == tables
+
+
+@pytest.mark.parametrize('statement, tables', [
+    ("INSERT INTO patients (first_name) VALUES (%s)", {'patients'}),
+    ("INSERT IGNORE INTO agg_watermarks (name) VALUES (%s)", {'agg_watermarks'}),
+    ("UPDATE patient_labs SET hdl = %s WHERE patient_id = %s", {'patient_labs'}),
+    ("UPDATE appointments a JOIN doctors d ON a.doctor_id = d.doctor_id SET a.status = 'x'", {'appointments', 'doctors'}),
+    ("DELETE FROM billing WHERE bill_id = %s", {'billing'}),
+    ("DELETE a FROM appointments a JOIN doctors d ON a.doctor_id = d.doctor_id", {'appointments', 'doctors'}),
+    ("INSERT INTO agg_hospital_visits SELECT * FROM x ON DUPLICATE KEY UPDATE visit_count = 1", {'agg_hospital_visits'}),
+    ("SELECT last_appointment_id FROM agg_watermarks FOR UPDATE", set()),
+    ("INSERT INTO notes (body) VALUES ('delete from patients')", {'notes'}),
+])
+def test_written_tables(statement, tables):
+    assert written_tables(statement) == tables
+
+
+def test_invalidation_drops_only_dependent_results():
+    cache = QueryCache(MemoryBackend(), ttl=60)
+    loads = []
+
+    def load(query, params):
+        loads.append(query)
+        return len(loads)
+
+    patients = "SELECT * FROM patients"
+    doctors = "SELECT * FROM doctors"
+    assert cache.get_or_load(patients, None, load) == 1
+    assert cache.get_or_load(doctors, None, load) == 2
+    assert cache.get_or_load(patients, None, load) == 1
+
+    cache.invalidate(['patients'])
+    assert cache.get_or_load(patients, None, load) == 3
+    assert cache.get_or_load(doctors, None, load) == 2
+
+
+def test_failed_loads_are_not_cached():
+    cache = QueryCache(MemoryBackend(), ttl=60)
+    results = iter([None, 'ok'])
+    assert cache.get_or_load("SELECT 1 FROM patients", None, lambda q, p: next(results)) is None
+    assert cache.get_or_load("SELECT 1 FROM patients", None, lambda q, p: next(results)) == 'ok'
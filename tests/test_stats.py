@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.stats import merge_value_counts, summarize_value_counts
+
+
+def test_matches_pandas_on_expanded_data():
+    rng = np.random.default_rng(0)
+    raw = pd.DataFrame({
+        'hospital': rng.choice(['a', 'b'], size=500),
+        'age': rng.integers(0, 90, size=500)
+    })
+    counts = raw.groupby(['hospital', 'age']).size().rename('n').reset_index()
+
+    stats = summarize_value_counts(counts, 'hospital', 'age')
+
+    for hospital, ages in raw.groupby('hospital')['age']:
+        row = stats.loc[hospital]
+        assert row['count'] == len(ages)
+        assert row['mean'] == pytest.approx(ages.mean())
+        assert row['std'] == pytest.approx(ages.std())
+        assert row['q1'] == pytest.approx(ages.quantile(0.25))
+        assert row['median'] == pytest.approx(ages.median())
+        assert row['q3'] == pytest.approx(ages.quantile(0.75))
+        assert row['min'] == ages.min()
+        assert row['max'] == ages.max()
+
+
+def test_whiskers_and_fliers():
+    counts = pd.DataFrame({'g': ['x'] * 5, 'v': [1, 2, 3, 4, 100], 'n': [1, 1, 1, 1, 1]})
+    row = summarize_value_counts(counts, 'g', 'v').loc['x']
+    assert row['whishi'] == 4
+    assert row['whislo'] == 1
+    assert row['fliers'] == [100.0]
+
+
+def test_merge_value_counts_adds_chunks():
+    chunks = [
+        pd.DataFrame({'g': ['x', 'x'], 'v': [1, 2]}),
+        pd.DataFrame({'g': ['x', 'y'], 'v': [1, 5]})
+    ]
+    merged = merge_value_counts(chunks, 'g', 'v').set_index(['g', 'v'])['n']
+    assert merged.to_dict() == {('x', 1): 2, ('x', 2): 1, ('y', 5): 1}
@@ -0,0 +1,324 @@
+# utils/aggregates.py
+#
+# Summary tables for the hospital / department visit rankings.
+#
+# Instead of joining the whole appointments table on every cache miss, the
+# per-hospital and per-department appointment counts are kept in two small
+# tables, so the pages only read a handful of rows.
+#
+# Auto-increment ids are handed out at INSERT time but become visible at
+# COMMIT, so an appointment can appear below ids that were already counted.
+# Each refresh therefore recounts a trailing window of AGGREGATE_LAG_ROWS
+# ids: the watermark marks the "settled" boundary high - lag, counts below
+# it are final, and the counts of the window above it are kept separately
+# in recent_count and replaced on every refresh.
+#
+# Appointments without a department (no matching doctor, or a doctor with
+# no department_id) are counted under department_id NULL_DEPARTMENT, the
+# NULL group of the original GROUP BY query.
+#
+# The pages only read the summaries: they never refresh them or run DDL, and
+# fall back to the base tables while the summaries are missing or older than
+# AGGREGATE_MAX_STALENESS. Refreshing is done by this CLI, either as a
+# long-running worker or from cron:
+#     python -m utils.aggregates refresh --watch            # every AGGREGATE_REFRESH_INTERVAL s
+#     * * * * *  cd /path/to/app && python -m utils.aggregates refresh
+#
+# UPDATEs (status changes, doctor reassignments) and DELETEs of settled
+# appointments are not tracked incrementally; a periodic rebuild corrects
+# them. Run it from cron, e.g. nightly:
+#     0 3 * * *  cd /path/to/app && python -m utils.aggregates rebuild
+#
+# The tables are created by sql/003_visit_summaries.sql or
+# `python -m utils.aggregates setup`.
+#
+# Usage:
+#     python -m utils.aggregates setup             # create the tables
+#     python -m utils.aggregates refresh [--watch] # incremental refresh
+#     python -m utils.aggregates rebuild           # recount everything from scratch
+#     python -m utils.aggregates verify            # compare settled counts to base tables
+
+import sys
+import threading
+import time
+
+import pandas as pd
+
+from config import AGGREGATE_LAG_ROWS, AGGREGATE_MAX_STALENESS, AGGREGATE_REFRESH_INTERVAL
+from .database import read_dataframe, transaction
+
+WATERMARK_NAME = 'appointments'
+
+SUMMARY_TABLES = ['agg_hospital_visits', 'agg_department_visits']
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS agg_hospital_visits (
+        hospital_id INT NOT NULL PRIMARY KEY,
+        visit_count BIGINT NOT NULL DEFAULT 0,
+        recent_count BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agg_department_visits (
+        department_id INT NOT NULL PRIMARY KEY,
+        visit_count BIGINT NOT NULL DEFAULT 0,
+        recent_count BIGINT NOT NULL DEFAULT 0
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agg_watermarks (
+        name VARCHAR(64) NOT NULL PRIMARY KEY,
+        last_appointment_id BIGINT NOT NULL DEFAULT 0,
+        refreshed_at DATETIME NULL
+    )
+    """
+]
+
+# appointment -> doctor -> department -> hospital, restricted to an id range
+HOSPITAL_DELTA = """
+    SELECT dp.hospital_id, COUNT(*) AS cnt
+    FROM appointments a
+    JOIN doctors d ON a.doctor_id = d.doctor_id
+    JOIN departments dp ON d.department_id = dp.department_id
+    WHERE a.appointment_id > %s AND a.appointment_id <= %s
+    GROUP BY dp.hospital_id
+"""
+
+# department_id under which appointments without a department are counted
+NULL_DEPARTMENT = 0
+
+DEPARTMENT_DELTA = f"""
+    SELECT COALESCE(d.department_id, {NULL_DEPARTMENT}) AS department_id, COUNT(*) AS cnt
+    FROM appointments a
+    LEFT JOIN doctors d ON a.doctor_id = d.doctor_id
+    WHERE a.appointment_id > %s AND a.appointment_id <= %s
+    GROUP BY COALESCE(d.department_id, {NULL_DEPARTMENT})
+"""
+
+_last_check = 0.0
+_available = False
+_check_lock = threading.Lock()
+
+
+def ensure_tables():
+    """Create the summary and watermark tables (setup / CLI only, never from the pages)."""
+    # DDL commits implicitly in MySQL, so keep it out of the refresh transaction
+    with transaction() as cursor:
+        for ddl in CREATE_TABLES:
+            cursor.execute(ddl)
+        # tables created before recent_count existed
+        for table in SUMMARY_TABLES:
+            cursor.execute("""
+                SELECT COUNT(*) FROM information_schema.columns
+                WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'recent_count'
+            """, (table,))
+            if not cursor.fetchone()[0]:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN recent_count BIGINT NOT NULL DEFAULT 0")
+        cursor.execute(
+            "INSERT IGNORE INTO agg_watermarks (name, last_appointment_id) VALUES (%s, 0)",
+            (WATERMARK_NAME,)
+        )
+
+
+def _apply_range(cursor, low, high, recent=False):
+    """Add the counts of appointments with low < appointment_id <= high (also to recent_count if recent)."""
+    recent_update = ", recent_count = recent_count + delta.cnt" if recent else ""
+    for table, key, delta in (('agg_hospital_visits', 'hospital_id', HOSPITAL_DELTA),
+                              ('agg_department_visits', 'department_id', DEPARTMENT_DELTA)):
+        cursor.execute(f"""
+            INSERT INTO {table} ({key}, visit_count, recent_count)
+            SELECT {key}, cnt, {'cnt' if recent else '0'} FROM ({delta}) AS delta
+            ON DUPLICATE KEY UPDATE visit_count = visit_count + delta.cnt{recent_update}
+        """, (low, high))
+
+
+def _recount(cursor, settled, high, lag):
+    """
+    Settle ids up to high - lag and recount the window above them.
+
+    Returns the new settled watermark.
+    """
+    new_settled = max(settled, high - lag)
+    # drop the previous window's counts; what remains covers ids <= settled
+    for table in SUMMARY_TABLES:
+        cursor.execute(f"""
+            UPDATE {table}
+            SET visit_count = visit_count - recent_count, recent_count = 0
+            WHERE recent_count <> 0
+        """)
+    if new_settled > settled:
+        _apply_range(cursor, settled, new_settled)
+    if high > new_settled:
+        _apply_range(cursor, new_settled, high, recent=True)
+    cursor.execute("""
+        UPDATE agg_watermarks
+        SET last_appointment_id = %s, refreshed_at = NOW()
+        WHERE name = %s
+    """, (new_settled, WATERMARK_NAME))
+    return new_settled
+
+
+def _lock_watermark(cursor):
+    """Lock the watermark row so concurrent refreshers run one at a time."""
+    cursor.execute(
+        "SELECT last_appointment_id FROM agg_watermarks WHERE name = %s FOR UPDATE",
+        (WATERMARK_NAME,)
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise RuntimeError("Visit summary tables are not set up; run python -m utils.aggregates setup")
+    return int(row[0])
+
+
+def refresh(lag=AGGREGATE_LAG_ROWS):
+    """
+    Fold new appointments into the summary tables and recount the last lag ids.
+
+    Returns:
+    --------
+    (settled, high): the settled watermark before the refresh and the
+    highest appointment_id counted
+    """
+    with transaction() as cursor:
+        settled = _lock_watermark(cursor)
+        cursor.execute("SELECT COALESCE(MAX(appointment_id), 0) FROM appointments")
+        high = int(cursor.fetchone()[0])
+        _recount(cursor, settled, high, lag)
+    return settled, high
+
+
+def rebuild(lag=AGGREGATE_LAG_ROWS):
+    """Recount both summary tables from the base tables in one transaction."""
+    with transaction() as cursor:
+        _lock_watermark(cursor)
+        cursor.execute("SELECT COALESCE(MAX(appointment_id), 0) FROM appointments")
+        high = int(cursor.fetchone()[0])
+        for table in SUMMARY_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        _recount(cursor, 0, high, lag)
+    return high
+
+
+def summaries_available(max_age=AGGREGATE_REFRESH_INTERVAL):
+    """
+    Whether the pages can read the summary tables instead of the base tables.
+
+    Read-only: checks that the tables exist and were refreshed within
+    AGGREGATE_MAX_STALENESS seconds, and never refreshes them. The answer is
+    rechecked at most every max_age seconds.
+    """
+    global _last_check, _available
+    if _last_check and time.monotonic() - _last_check < max_age:
+        return _available
+
+    with _check_lock:
+        if _last_check and time.monotonic() - _last_check < max_age:
+            return _available
+        try:
+            watermark = read_dataframe(
+                "SELECT TIMESTAMPDIFF(SECOND, refreshed_at, NOW()) AS age FROM agg_watermarks WHERE name = %s",
+                params=(WATERMARK_NAME,),
+                raise_errors=True
+            )
+            age = None if watermark.empty else watermark['age'].iloc[0]
+            if age is None or pd.isna(age):
+                reason = "never refreshed"
+            elif AGGREGATE_MAX_STALENESS is not None and age > AGGREGATE_MAX_STALENESS:
+                reason = f"last refreshed {int(age)}s ago"
+            else:
+                reason = None
+        except Exception as e:
+            reason = str(e)
+        if reason is not None and (_available or not _last_check):
+            print(f"Visit summaries not used, querying base tables: {reason}")
+        _available = reason is None
+        _last_check = time.monotonic()
+        return _available
+
+
+def watch(interval=AGGREGATE_REFRESH_INTERVAL):
+    """Refresh the summaries every interval seconds until interrupted."""
+    while True:
+        try:
+            settled, high = refresh()
+            print(f"{time.strftime('%H:%M:%S')} counted appointments up to {high}")
+        except Exception as e:
+            print(f"Visit summary refresh failed: {e}")
+        time.sleep(interval)
+
+
+def verify():
+    """
+    Compare the settled summary counts with counts computed from the base tables.
+
+    Only appointments up to the settled watermark are compared (the recount
+    window is replaced on every refresh), so rows inserted after the last
+    refresh do not show up as mismatches.
+
+    Returns:
+    --------
+    dict {'hospitals': DataFrame, 'departments': DataFrame} of mismatching
+    rows (empty DataFrames when everything matches)
+    """
+    watermark = read_dataframe(
+        "SELECT last_appointment_id FROM agg_watermarks WHERE name = %s",
+        params=(WATERMARK_NAME,)
+    )
+    high = int(watermark['last_appointment_id'].iloc[0])
+
+    checks = {
+        'hospitals': ('hospital_id', HOSPITAL_DELTA, 'agg_hospital_visits'),
+        'departments': ('department_id', DEPARTMENT_DELTA, 'agg_department_visits')
+    }
+
+    mismatches = {}
+    for name, (key, delta_query, table) in checks.items():
+        expected = read_dataframe(delta_query, params=(0, high))
+        actual = read_dataframe(f"SELECT {key}, visit_count - recent_count AS visit_count FROM {table}")
+
+        merged = expected.merge(actual, on=key, how='outer').fillna(0)
+        merged = merged.rename(columns={'cnt': 'expected', 'visit_count': 'actual'})
+        # groups whose count dropped to zero are equivalent to a missing row
+        merged = merged[merged['expected'] != merged['actual']]
+        mismatches[name] = merged.astype({'expected': 'int64', 'actual': 'int64'}).reset_index(drop=True)
+
+    return mismatches
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else 'refresh'
+
+    if command in ('setup', 'refresh', 'rebuild', 'verify'):
+        ensure_tables()
+
+    if command == 'setup':
+        print("Visit summary tables are ready")
+    elif command == 'refresh' and '--watch' in argv[1:]:
+        watch()
+    elif command == 'refresh':
+        settled, high = refresh()
+        print(f"Counted appointments up to {high} (settled through {max(settled, high - AGGREGATE_LAG_ROWS)})")
+    elif command == 'rebuild':
+        high = rebuild()
+        print(f"Rebuilt summaries up to appointment_id {high}")
+    elif command == 'verify':
+        mismatches = verify()
+        ok = True
+        for name, df in mismatches.items():
+            if df.empty:
+                print(f"{name}: OK")
+            else:
+                ok = False
+                print(f"{name}: {len(df)} mismatching rows")
+                print(df.to_string(index=False))
+        return 0 if ok else 1
+    else:
+        print("usage: python -m utils.aggregates [setup|refresh [--watch]|rebuild|verify]")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,10 +1,196 @@
+import atexit
+import decimal
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
 import mysql.connector
 import pandas as pd
 import streamlit as st
-from config import DB_CONFIG
+from config import DB_CONFIG, DB_POOL_CONFIG
+from .query_cache import get_query_cache, invalidate_tables, written_tables
+
+
+class PoolTimeout(Exception):
+    """等待空闲连接超时"""
+
+
+class ConnectionPool:
+    """进程级数据库连接池（基于 DB_CONFIG，所有 Streamlit 会话共享）"""
+
+    def __init__(self, db_config, pool_size=8, timeout=10, recycle=1800, pre_ping=True):
+        self.db_config = dict(db_config)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+
+        # 空闲连接 (conn, 归还时间)，后进先出以便闲置连接自然老化
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._lock = threading.Lock()
+        self._closed = False
+        self._in_use = 0
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'wait_seconds': 0.0,
+            'created': 0,
+            'reconnects': 0,
+            'discarded': 0
+        }
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _create(self):
+        conn = mysql.connector.connect(**self.db_config)
+        self._count('created')
+        return conn
+
+    def _ensure_alive(self, conn, idle_since):
+        """取出时的健康检查：断开或闲置过久的连接先重连"""
+        stale = self.recycle is not None and time.monotonic() - idle_since > self.recycle
+        if not stale and not self.pre_ping:
+            return conn
+        try:
+            if stale:
+                conn.reconnect(attempts=1, delay=0)
+                self._count('reconnects')
+            elif not conn.is_connected():
+                conn.reconnect(attempts=1, delay=0)
+                self._count('reconnects')
+            return conn
+        except Exception:
+            self._close_quietly(conn)
+            self._count('discarded')
+            return self._create()
+
+    def checkout(self):
+        """取出一个连接；池满时最多等待 timeout 秒"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        if not self._slots.acquire(blocking=False):
+            self._count('waits')
+            started = time.monotonic()
+            acquired = self._slots.acquire(timeout=self.timeout)
+            self._count('wait_seconds', time.monotonic() - started)
+            if not acquired:
+                self._count('timeouts')
+                raise PoolTimeout(f"No free connection within {self.timeout}s (pool size {self.pool_size})")
+
+        try:
+            try:
+                conn, idle_since = self._idle.get_nowait()
+                conn = self._ensure_alive(conn, idle_since)
+            except queue.Empty:
+                conn = self._create()
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            self._in_use += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """归还连接；未结束的事务会被回滚，异常连接直接丢弃"""
+        try:
+            if not discard and not self._closed:
+                try:
+                    if conn.in_transaction:
+                        conn.rollback()
+                except Exception:
+                    discard = True
+            if discard or self._closed:
+                self._close_quietly(conn)
+                self._count('discarded')
+            else:
+                self._idle.put((conn, time.monotonic()))
+        finally:
+            with self._lock:
+                self._in_use -= 1
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        """with pool.connection() as conn: ... 用完自动归还"""
+        conn = self.checkout()
+        try:
+            yield conn
+        except mysql.connector.Error:
+            # 驱动层错误后连接状态不可信，不再放回池中
+            self.release(conn, discard=True)
+            raise
+        except BaseException:
+            self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self):
+        """关闭池：空闲连接立即关闭，使用中的连接在归还时关闭"""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
+
+    def stats(self):
+        """连接池指标快照"""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['in_use'] = self._in_use
+        snapshot['idle'] = self._idle.qsize()
+        snapshot['pool_size'] = self.pool_size
+        return snapshot
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """获取进程级连接池（首次调用时创建）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_CONFIG, **DB_POOL_CONFIG)
+                atexit.register(_pool.close)
+    return _pool
+
+
+def get_pool_stats():
+    """返回连接池指标（checkouts / waits / timeouts 等）"""
+    return get_pool().stats()
+
+
+def close_pool():
+    """关闭并丢弃当前连接池"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
 
 def get_connection():
-    """创建数据库连接（缓存以提高性能）"""
+    """创建一个独立的数据库连接（不经过连接池）"""
     try:
         conn = mysql.connector.connect(**DB_CONFIG)
         return conn
@@ -12,46 +198,190 @@ def get_connection():
         st.error(f"Database connection failed: {e}")
         return None
 
-@st.cache_data(ttl=300)  # 缓存5分钟
-def run_query(query, params=None):
-    """执行查询并返回 DataFrame"""
-    conn = get_connection()
-    if conn is None:
-        return None
-    
-    try:
-        df = pd.read_sql(query, conn, params=params)
+def to_float(df, columns):
+    """把 columns 一次性转换为 float64（非数值文本回退为逐列 to_numeric 强制转换），原地修改并返回 df"""
+    columns = [col for col in columns if col in df.columns]
+    if not columns:
         return df
+    try:
+        df[columns] = df[columns].astype('float64')
+    except (TypeError, ValueError):
+        df[columns] = df[columns].apply(pd.to_numeric, errors='coerce')
+    return df
+
+def decimal_columns(df):
+    """驱动以 decimal.Decimal 返回的 DECIMAL 列（object 类型）"""
+    columns = []
+    for col in df.columns[df.dtypes == object]:
+        values = df[col].dropna()
+        if not values.empty and isinstance(values.iloc[0], decimal.Decimal):
+            columns.append(col)
+    return columns
+
+def read_dataframe(query, params=None, raise_errors=False):
+    """
+    执行查询并返回 DataFrame（不缓存，供需要自定义缓存策略的调用方使用）
+
+    查询失败时在页面上显示错误并返回 None；raise_errors=True 时改为抛出异常，
+    供没有 Streamlit 脚本上下文的后台线程 / 命令行使用
+    """
+    try:
+        with get_pool().connection() as conn:
+            return pd.read_sql(query, conn, params=params)
     except Exception as e:
+        if raise_errors:
+            raise
         st.error(f"Query execution failed: {e}")
         return None
+
+def run_query(query, params=None, ttl=None, tags=None):
+    """
+    执行查询并返回 DataFrame，结果经 utils/query_cache 缓存
+
+    Parameters:
+    -----------
+    query : str
+    params : tuple, optional
+    ttl : float, optional
+        结果缓存秒数，默认 QUERY_CACHE_CONFIG['ttl']
+    tags : iterable of str, optional
+        结果依赖的表，默认取 SQL 中 FROM / JOIN 的表；这些表经 execute_query
+        或 transaction() 写入后缓存结果失效
+
+    Returns:
+    --------
+    DataFrame，查询失败时为 None（失败结果不缓存）
+    """
+    return get_query_cache().get_or_load(query, params, read_dataframe, ttl=ttl, tags=tags)
+
+def stream_query(query, params=None, chunksize=50000, as_arrow=False):
+    """
+    分块流式读取查询结果，内存占用与 chunksize 成正比而不是与结果行数成正比
+
+    使用非缓冲（服务端）游标，每次 fetchmany(chunksize) 行。迭代期间占用一个
+    连接池连接；提前停止迭代时该连接会被丢弃（剩余结果未读完，无法复用）。
+
+    Parameters:
+    -----------
+    query : str
+    params : tuple, optional
+    chunksize : int
+        每块行数
+    as_arrow : bool
+        True 时逐块返回 pyarrow.RecordBatch（需要安装 pyarrow）
+
+    Yields:
+    -------
+    pandas.DataFrame（或 pyarrow.RecordBatch），列与查询结果一致
+    """
+    if as_arrow:
+        import pyarrow as pa
+
+    pool = get_pool()
+    conn = pool.checkout()
+    finished = False
+    cursor = None
+    try:
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(query, params)
+        columns = cursor.column_names
+        while True:
+            rows = cursor.fetchmany(chunksize)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            yield pa.RecordBatch.from_pandas(chunk, preserve_index=False) if as_arrow else chunk
+        finished = True
     finally:
-        if conn.is_connected():
-            conn.close()
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Exception:
+                finished = False
+        pool.release(conn, discard=not finished)
+
+_write_listeners = []
+
+def add_write_listener(callback):
+    """注册写入回调：execute_query / transaction() 提交后以写过的表名（小写 frozenset）调用 callback(tables)"""
+    _write_listeners.append(callback)
+
+def _tables_written(tables):
+    """提交之后：让依赖这些表的缓存结果失效，并通知写入回调"""
+    if not tables:
+        return
+    invalidate_tables(*tables)
+    tables = frozenset(tables)
+    for callback in list(_write_listeners):
+        try:
+            callback(tables)
+        except Exception as e:
+            print(f"Write listener {callback.__qualname__} failed: {e}")
 
 def execute_query(query, params=None):
     """执行非查询语句（INSERT, UPDATE, DELETE）"""
-    conn = get_connection()
-    if conn is None:
-        return False
-    
     try:
-        cursor = conn.cursor()
-        cursor.execute(query, params)
-        conn.commit()
-        cursor.close()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params)
+                conn.commit()
+            finally:
+                cursor.close()
+        _tables_written(written_tables(query))
         return True
     except Exception as e:
         st.error(f"Query execution failed: {e}")
-        conn.rollback()
         return False
-    finally:
-        if conn.is_connected():
-            conn.close()
+
+class _TrackingCursor:
+    """记录事务中写过的表，提交后让依赖这些表的缓存结果失效"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self.tables = set()
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self.tables.update(written_tables(operation))
+        return self._cursor.execute(operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        self.tables.update(written_tables(operation))
+        return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+@contextmanager
+def transaction():
+    """在同一个连接上执行多条语句：正常结束提交，出现异常回滚
+
+    with transaction() as cursor:
+        cursor.execute(...)
+    """
+    with get_pool().connection() as conn:
+        cursor = _TrackingCursor(conn.cursor())
+        try:
+            yield cursor
+            conn.commit()
+        except BaseException:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+            raise
+        finally:
+            cursor.close()
+    _tables_written(cursor.tables)
 
 def test_connection():
     """测试数据库连接"""
-    conn = get_connection()
-    if conn and conn.is_connected():
-        return True
-    return False
\ No newline at end of file
+    try:
+        with get_pool().connection() as conn:
+            return conn.is_connected()
+    except Exception as e:
+        st.error(f"Database connection failed: {e}")
+        return False
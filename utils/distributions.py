@@ -0,0 +1,225 @@
+# utils/distributions.py
+#
+# Server-side binning and bounded sampling of vitals / lab measurements.
+#
+# Histograms and 2D bins are counted in MySQL with INTERVAL(value, e1, ..., ek),
+# which returns the index of the half-open bin [e_i, e_i+1) a value falls in
+# (0 below e1, k at or above ek), so only one row per (gender, bin) is
+# transferred however large patient_vitals / patient_labs get. Scatter plots
+# use a reservoir sample of at most N rows drawn while streaming the table.
+#
+# Bin edges come from the caller, DISTRIBUTION_CONFIG['edges'] or, failing
+# that, DISTRIBUTION_CONFIG['bins'] equal-width bins between the measure's
+# minimum and maximum.
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from config import DISTRIBUTION_CONFIG
+from .database import run_query, stream_query
+from .query_cache import get_query_cache
+
+SOURCES = {
+    'vitals': "patient_vitals pv JOIN patients p ON pv.patient_id = p.patient_id",
+    'labs': "patient_labs pl JOIN patients p ON pl.patient_id = p.patient_id"
+}
+
+# measure name -> (SQL expression, source, extra WHERE condition); only these
+# names are ever interpolated into SQL
+MEASURES = {
+    'weight': ("pv.weight", 'vitals', None),
+    'height': ("pv.height", 'vitals', None),
+    'bmi': ("ROUND(pv.weight / ((pv.height/100) * (pv.height/100)), 2)", 'vitals', "pv.height > 0"),
+    'tsh': ("pl.tsh", 'labs', None),
+    't3': ("pl.t3", 'labs', None),
+    'hemoglobin': ("pl.hemoglobin", 'labs', None)
+}
+
+
+def _measure(name):
+    try:
+        return MEASURES[name]
+    except KeyError:
+        raise ValueError(f"Unknown measure {name!r}, expected one of {sorted(MEASURES)}") from None
+
+
+def _where(*names):
+    conditions = []
+    for name in names:
+        expr, _, extra = _measure(name)
+        conditions.append(f"{expr} IS NOT NULL")
+        if extra:
+            conditions.append(extra)
+    return " AND ".join(conditions)
+
+
+def _source(*names):
+    sources = {_measure(name)[1] for name in names}
+    if len(sources) != 1:
+        raise ValueError(f"Measures {names} come from different tables and cannot be binned together")
+    return SOURCES[sources.pop()]
+
+
+def resolve_edges(measure, edges=None):
+    """
+    Bin edges for a measure as a list of floats.
+
+    edges may be a sequence of increasing edges, a number of equal-width bins
+    between the measure's minimum and maximum, or None for the configured
+    default. Returns None when the measure has no data.
+    """
+    if edges is None:
+        edges = DISTRIBUTION_CONFIG['edges'].get(measure, DISTRIBUTION_CONFIG['bins'])
+
+    if isinstance(edges, (int, np.integer)):
+        expr = _measure(measure)[0]
+        bounds = run_query(f"SELECT MIN({expr}) AS lo, MAX({expr}) AS hi FROM {_source(measure)} WHERE {_where(measure)}")
+        if bounds is None or bounds.empty or pd.isna(bounds['lo'].iloc[0]):
+            return None
+        lo, hi = float(bounds['lo'].iloc[0]), float(bounds['hi'].iloc[0])
+        if hi <= lo:
+            hi = lo + 1.0
+        edges = np.linspace(lo, hi, int(edges) + 1)
+        # make the last bin closed so the maximum is counted in it
+        edges[-1] = np.nextafter(hi, np.inf)
+
+    edges = [float(e) for e in edges]
+    if len(edges) < 2 or any(b <= a for a, b in zip(edges, edges[1:])):
+        raise ValueError(f"Bin edges must be at least two strictly increasing values, got {edges}")
+    return edges
+
+
+def _bin_bounds(edges, bins):
+    """(left, right) edges of INTERVAL() bin indexes; 0 and len(edges) are open-ended."""
+    lefts = np.array([-np.inf] + list(edges))
+    rights = np.array(list(edges) + [np.inf])
+    bins = np.asarray(bins, dtype=int)
+    return lefts[bins], rights[bins]
+
+
+def histogram_by_gender(measure, edges=None):
+    """
+    Binned counts of one measure per gender.
+
+    Returns a DataFrame with gender, bin_left, bin_right and count for every
+    bin in edges (zero-filled), plus open-ended under/overflow bins when any
+    value falls outside the edges; None on query failure.
+    """
+    edges = resolve_edges(measure, edges)
+    if edges is None:
+        return pd.DataFrame(columns=['gender', 'bin_left', 'bin_right', 'count'])
+
+    expr = _measure(measure)[0]
+    placeholders = ", ".join(["%s"] * len(edges))
+    query = f"""
+    SELECT
+        p.gender,
+        INTERVAL({expr}, {placeholders}) as bin,
+        COUNT(*) as n
+    FROM {_source(measure)}
+    WHERE {_where(measure)}
+    GROUP BY p.gender, bin
+    """
+    counts = run_query(query, tuple(edges))
+    if counts is None:
+        return None
+
+    counts = counts.set_index(['gender', 'bin'])['n']
+    present = set(counts.index.get_level_values('bin')) if len(counts) else set()
+    bins = [b for b in range(len(edges) + 1) if 0 < b < len(edges) or b in present]
+    full = pd.MultiIndex.from_product([counts.index.unique('gender'), bins], names=['gender', 'bin'])
+    counts = counts.reindex(full, fill_value=0).astype(int).reset_index()
+
+    counts['bin_left'], counts['bin_right'] = _bin_bounds(edges, counts['bin'])
+    return counts.rename(columns={'n': 'count'})[['gender', 'bin_left', 'bin_right', 'count']]
+
+
+def histogram2d_by_gender(x, y, x_edges=None, y_edges=None):
+    """
+    Binned counts of two measures from the same table per gender.
+
+    Returns a DataFrame with gender, x_left, x_right, y_left, y_right and count
+    for the non-empty cells only (pivot it for a heatmap); None on query failure.
+    """
+    x_edges = resolve_edges(x, x_edges)
+    y_edges = resolve_edges(y, y_edges)
+    columns = ['gender', 'x_left', 'x_right', 'y_left', 'y_right', 'count']
+    if x_edges is None or y_edges is None:
+        return pd.DataFrame(columns=columns)
+
+    query = f"""
+    SELECT
+        p.gender,
+        INTERVAL({_measure(x)[0]}, {", ".join(["%s"] * len(x_edges))}) as x_bin,
+        INTERVAL({_measure(y)[0]}, {", ".join(["%s"] * len(y_edges))}) as y_bin,
+        COUNT(*) as n
+    FROM {_source(x, y)}
+    WHERE {_where(x, y)}
+    GROUP BY p.gender, x_bin, y_bin
+    ORDER BY p.gender, x_bin, y_bin
+    """
+    counts = run_query(query, tuple(x_edges) + tuple(y_edges))
+    if counts is None:
+        return None
+
+    counts['x_left'], counts['x_right'] = _bin_bounds(x_edges, counts['x_bin'])
+    counts['y_left'], counts['y_right'] = _bin_bounds(y_edges, counts['y_bin'])
+    return counts.rename(columns={'n': 'count'})[columns]
+
+
+def reservoir_sample(chunks, n, seed=None):
+    """
+    Uniform random sample of at most n rows from an iterable of DataFrames.
+
+    Algorithm R applied a chunk at a time: memory is bounded by n plus one
+    chunk, and every row seen has the same n / total chance of being kept.
+    """
+    rng = np.random.default_rng(seed)
+    reservoir = None
+    seen = 0
+    for chunk in chunks:
+        chunk = chunk.reset_index(drop=True)
+        m = len(chunk)
+        if m == 0:
+            continue
+
+        filled = 0 if reservoir is None else len(reservoir)
+        fill = min(n - filled, m)
+        if fill > 0:
+            head = chunk.iloc[:fill]
+            reservoir = head.copy() if reservoir is None else pd.concat([reservoir, head], ignore_index=True)
+
+        if fill < m:
+            positions = np.arange(fill, m)
+            # row number t (1-based, over all chunks) replaces slot j if j < n, j uniform in [0, t)
+            slots = rng.integers(0, seen + positions + 1)
+            keep = slots < n
+            # later rows win when several land on the same slot, as in the sequential algorithm
+            replace = pd.Series(positions[keep], index=slots[keep])
+            replace = replace[~replace.index.duplicated(keep='last')]
+            for k in range(chunk.shape[1]):
+                reservoir.iloc[replace.index.to_numpy(), k] = chunk.iloc[replace.to_numpy(), k].to_numpy()
+
+        seen += m
+
+    return reservoir if reservoir is not None else pd.DataFrame()
+
+
+def sample_query(query, n=None, params=None, seed=0):
+    """
+    Stream a query and keep a reservoir sample of at most n rows (default DISTRIBUTION_CONFIG['sample_size']).
+
+    Samples are kept in the query cache for 5 minutes, tagged with the tables
+    the query reads.
+    """
+    n = n or DISTRIBUTION_CONFIG['sample_size']
+
+    def load(query, key):
+        try:
+            return reservoir_sample(stream_query(query, params, chunksize=DISTRIBUTION_CONFIG['chunksize']), n, seed)
+        except Exception as e:
+            st.error(f"Query execution failed: {e}")
+            return None
+
+    return get_query_cache().get_or_load(query, ('sample', params, n, seed), load, ttl=300)
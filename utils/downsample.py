@@ -0,0 +1,141 @@
+# utils/downsample.py
+#
+# Time-series downsampling before plotting.
+#
+# A chart only has a few hundred pixels across, so sending thousands of
+# points to the browser costs payload and rendering time without showing
+# more. Two methods are available, both returning a subset of the original
+# points (never interpolated values):
+#
+#   lttb    Largest-Triangle-Three-Buckets: keeps the points that preserve
+#           the visual shape of the line
+#   minmax  per time bucket keep the lowest and highest point, so every
+#           spike survives
+#
+# With keep_extremes the global minimum and maximum are always kept as well.
+# Defaults come from DOWNSAMPLE_CONFIG.
+
+import numpy as np
+import pandas as pd
+
+from config import DOWNSAMPLE_CONFIG
+
+METHODS = ('lttb', 'minmax')
+
+
+def _numeric(x):
+    """x as float64 (datetimes as nanoseconds) for distance and area computations."""
+    x = pd.Series(x)
+    if not pd.api.types.is_numeric_dtype(x):
+        x = pd.to_datetime(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.astype('int64').to_numpy(dtype='float64')
+    return x.to_numpy(dtype='float64')
+
+
+def lttb_indices(x, y, n_out):
+    """Indices of the n_out points Largest-Triangle-Three-Buckets keeps (x sorted ascending)."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    # first and last point are always kept; the rest is split into n_out - 2 buckets
+    every = (n - 2) / (n_out - 2)
+    indices = np.empty(n_out, dtype=np.int64)
+    indices[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        # average of the next bucket (the last point for the final bucket)
+        avg_x = x[end:next_end].mean() if next_end > end else x[n - 1]
+        avg_y = y[end:next_end].mean() if next_end > end else y[n - 1]
+
+        areas = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(areas))
+        indices[i + 1] = a
+    indices[-1] = n - 1
+    return indices
+
+
+def minmax_indices(x, y, n_out):
+    """Indices of the lowest and highest point in each of n_out / 2 equal-width x buckets."""
+    n = len(x)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+
+    n_buckets = (n_out - 2) // 2
+    edges = np.linspace(x[0], x[-1], n_buckets + 1)
+    buckets = np.clip(np.searchsorted(edges, x, side='right') - 1, 0, n_buckets - 1)
+    grouped = pd.Series(y).groupby(buckets)
+    indices = np.concatenate([[0, n - 1], grouped.idxmin().to_numpy(), grouped.idxmax().to_numpy()])
+    return np.unique(indices)
+
+
+def downsample_series(x, y, max_points=None, method=None, keep_extremes=None):
+    """
+    Reduce one (x, y) series to at most about max_points points for plotting.
+
+    Missing y values are dropped first and the points are sorted by x.
+
+    Parameters:
+    -----------
+    x : array-like of numbers or dates
+    y : array-like of numbers
+    max_points : int, optional
+        target number of points, defaults to DOWNSAMPLE_CONFIG['max_points']
+    method : str, optional
+        'lttb' or 'minmax', defaults to DOWNSAMPLE_CONFIG['method']
+    keep_extremes : bool, optional
+        also keep the global min and max, defaults to DOWNSAMPLE_CONFIG['keep_extremes']
+
+    Returns:
+    --------
+    (x, y) as pandas Series holding the kept points
+    """
+    max_points = max_points or DOWNSAMPLE_CONFIG['max_points']
+    method = method or DOWNSAMPLE_CONFIG['method']
+    if keep_extremes is None:
+        keep_extremes = DOWNSAMPLE_CONFIG['keep_extremes']
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method {method!r}, expected one of {METHODS}")
+
+    series = pd.DataFrame({'x': pd.Series(x).to_numpy(), 'y': pd.to_numeric(pd.Series(y).to_numpy(), errors='coerce')})
+    series = series.dropna(subset=['y']).sort_values('x', kind='stable').reset_index(drop=True)
+    if len(series) <= max_points:
+        return series['x'], series['y']
+
+    x_num = _numeric(series['x'])
+    y_num = series['y'].to_numpy(dtype='float64')
+    if method == 'lttb':
+        indices = lttb_indices(x_num, y_num, max_points)
+    else:
+        indices = minmax_indices(x_num, y_num, max_points)
+    if keep_extremes:
+        indices = np.union1d(indices, [np.argmin(y_num), np.argmax(y_num)])
+
+    kept = series.iloc[indices]
+    return kept['x'], kept['y']
+
+
+def downsample_column(df, x_col, y_col, x_range=None, max_points=None, method=None, keep_extremes=None):
+    """
+    Points of one column of a time-series frame, limited to x_range and downsampled.
+
+    Narrowing x_range until the range holds at most max_points points shows
+    the series at full resolution.
+
+    Returns:
+    --------
+    (x, y, n_total) where n_total is the number of non-missing points in range
+    """
+    x = df[x_col]
+    y = df[y_col]
+    if x_range is not None:
+        dates = pd.to_datetime(x)
+        in_range = dates.between(pd.Timestamp(x_range[0]), pd.Timestamp(x_range[1]) + pd.Timedelta(days=1), inclusive='left')
+        x, y = x[in_range], y[in_range]
+    n_total = int(pd.to_numeric(y, errors='coerce').notna().sum())
+    x, y = downsample_series(x, y, max_points, method, keep_extremes)
+    return x, y, n_total
@@ -0,0 +1,173 @@
+# utils/forecast_cache.py
+#
+# On-disk cache of per-hospital ARIMA results.
+#
+# Each entry holds the fitted order, AIC, forecast and confidence interval
+# for one hospital and is keyed by a hash of that hospital's revenue series
+# plus the model parameters, so a hospital is only refitted when its data
+# (or the model settings) actually change. Entries are pickled one per file,
+# written atomically, and evicted least-recently-used once the directory
+# exceeds its entry or size bound. The cache survives process restarts.
+
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from config import FORECAST_CACHE_CONFIG
+
+# bump when the stored entry layout changes
+CACHE_VERSION = 2
+
+SUFFIX = '.pkl'
+
+
+def series_key(hospital_revenue, params):
+    """Hash of one hospital's (year_month, amount) series and the model parameters."""
+    digest = hashlib.sha256()
+    digest.update(f"v{CACHE_VERSION}".encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    digest.update('\x1f'.join(map(str, hospital_revenue['year_month'])).encode())
+    digest.update(np.ascontiguousarray(hospital_revenue['amount'].to_numpy(dtype='float64')).tobytes())
+    return digest.hexdigest()
+
+
+def latest_key(hospital_id):
+    """Key of the pointer entry holding a hospital's most recent fit."""
+    return f"hospital-{hospital_id}"
+
+
+class ForecastCache:
+    """Size-bounded, process-restart-safe store of forecast entries."""
+
+    def __init__(self, directory, max_entries=5000, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._memory = {}
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        """Return the cached entry for key, or None."""
+        path = self._path(key)
+        entry = self._memory.get(key)
+        if entry is None:
+            try:
+                with open(path, 'rb') as f:
+                    entry = pickle.load(f)
+            except FileNotFoundError:
+                return None
+            except Exception as e:
+                print(f"Dropping unreadable forecast cache entry {key}: {e}")
+                self._remove(key)
+                return None
+            with self._lock:
+                self._memory[key] = entry
+        try:
+            # the file mtime is the LRU clock shared by every process
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another process since it was read
+            with self._lock:
+                self._memory.pop(key, None)
+        return entry
+
+    def put(self, key, entry):
+        """Store an entry atomically and evict old ones if over the bounds."""
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        with self._lock:
+            self._memory[key] = entry
+        self.evict()
+
+    def _remove(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        """[(mtime, size, key)] for every entry file, oldest first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if not item.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, item.name[:-len(SUFFIX)]))
+        entries.sort()
+        return entries
+
+    def evict(self):
+        """Remove least-recently-used entries until both bounds hold."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        evicted = 0
+        for _, size, key in entries:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._remove(key)
+            count -= 1
+            total -= size
+            evicted += 1
+
+        # forget in-memory copies of entries other processes have evicted
+        on_disk = {key for _, _, key in entries[evicted:]}
+        with self._lock:
+            for key in list(self._memory):
+                if key not in on_disk:
+                    del self._memory[key]
+
+    def clear(self):
+        for _, _, key in self._entries():
+            self._remove(key)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+            'oldest': time.ctime(entries[0][0]) if entries else None
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_forecast_cache():
+    """Process-wide ForecastCache built from FORECAST_CACHE_CONFIG."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ForecastCache(
+                    FORECAST_CACHE_CONFIG['dir'],
+                    max_entries=FORECAST_CACHE_CONFIG['max_entries'],
+                    max_bytes=FORECAST_CACHE_CONFIG['max_bytes']
+                )
+    return _cache
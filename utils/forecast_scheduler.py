@@ -0,0 +1,179 @@
+# utils/forecast_scheduler.py
+#
+# Background refitting of the revenue forecasts.
+#
+# The Predictions page never fits models itself: it reads the last result
+# published to SCHEDULER_CONFIG['store_path']. A scheduler refits whenever
+# the paid-billing data changes (a new month or new rows) and at least every
+# SCHEDULER_CONFIG['interval'] seconds, then atomically replaces the store.
+#
+# The scheduler runs either as a daemon thread started once per Streamlit
+# process (SCHEDULER_CONFIG['in_process'] = True), or as its own worker:
+#     python -m utils.forecast_scheduler          # run forever
+#     python -m utils.forecast_scheduler --once   # refit once and exit
+
+import argparse
+import os
+import pickle
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from config import SCHEDULER_CONFIG
+from .predictions import hospital_revenue_prediction
+from .queries import get_billing_data_version, get_hospital_revenue_history
+
+
+def publish_forecasts(arima_predictions_dict, predictions_dict, data_version, duration):
+    """Atomically replace the published forecasts."""
+    payload = {
+        # fitted ARIMA objects are not needed by the page and can be large
+        'arima': {hid: {**result, 'model': None} for hid, result in arima_predictions_dict.items()},
+        'linear': predictions_dict,
+        'computed_at': datetime.now(),
+        'data_version': data_version,
+        'duration': duration
+    }
+    path = SCHEDULER_CONFIG['store_path']
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return payload
+
+
+_loaded = (None, None)  # (mtime, payload)
+
+
+def load_forecasts():
+    """
+    Return the last published forecasts, or None if nothing has been published.
+
+    The payload is a dict with 'arima' and 'linear' (the two dicts returned by
+    hospital_revenue_prediction), 'computed_at', 'data_version' and 'duration'.
+    """
+    global _loaded
+    path = SCHEDULER_CONFIG['store_path']
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _loaded[0] == mtime:
+        return _loaded[1]
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except Exception as e:
+        print(f"Could not read published forecasts: {e}")
+        return None
+    _loaded = (mtime, payload)
+    return payload
+
+
+class ForecastScheduler:
+    """Refits forecasts when billing data changes or the interval elapses."""
+
+    def __init__(self, interval=None, poll_interval=None):
+        self.interval = interval or SCHEDULER_CONFIG['interval']
+        self.poll_interval = poll_interval or SCHEDULER_CONFIG['poll_interval']
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_due(self):
+        """(due, data_version): refit if nothing is published, data changed or it is too old."""
+        data_version = get_billing_data_version()
+        published = load_forecasts()
+        if published is None:
+            return True, data_version
+        if data_version is not None and published['data_version'] != data_version:
+            return True, data_version
+        age = (datetime.now() - published['computed_at']).total_seconds()
+        return age >= self.interval, data_version
+
+    def run_once(self, force=False):
+        """
+        Refit and publish if due; returns True when new forecasts were published.
+
+        Query errors propagate, so a failed read never publishes forecasts
+        fitted on stale data; the previous forecasts stay in place.
+        """
+        due, data_version = self.is_due()
+        if not (due or force):
+            return False
+
+        started = time.monotonic()
+        revenue = get_hospital_revenue_history(fresh=True)
+        if revenue is None or revenue.empty:
+            print("No paid billing data, keeping the published forecasts")
+            return False
+        arima_predictions_dict, predictions_dict = hospital_revenue_prediction(revenue=revenue)
+        duration = time.monotonic() - started
+        publish_forecasts(arima_predictions_dict, predictions_dict, data_version, duration)
+        print(f"Published forecasts for {len(arima_predictions_dict)} hospitals in {duration:.1f}s")
+        return True
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+                print(f"Forecast refit failed: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Run the scheduler on a daemon thread."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self.run_forever, name='forecast-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def ensure_scheduler_started():
+    """Start the in-process scheduler thread once per process (if enabled)."""
+    global _scheduler
+    if not SCHEDULER_CONFIG['in_process']:
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ForecastScheduler()
+        return _scheduler.start()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Refit and publish revenue forecasts")
+    parser.add_argument('--once', action='store_true', help="refit once (even if not due) and exit")
+    args = parser.parse_args(argv)
+
+    scheduler = ForecastScheduler()
+    if args.once:
+        scheduler.run_once(force=True)
+    else:
+        scheduler.run_forever()
+
+
+if __name__ == '__main__':
+    main()
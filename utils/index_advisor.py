@@ -0,0 +1,246 @@
+# utils/index_advisor.py
+#
+# Runs EXPLAIN on the SQL issued by every query function in utils/queries.py
+# and flags plans that scan whole tables.
+#
+# Usage:
+#     python -m utils.index_advisor [--min-rows 1000]
+
+import argparse
+import inspect
+import sys
+from contextlib import contextmanager
+
+import pandas as pd
+
+from . import aggregates, database, queries, query_cache
+from .database import read_dataframe
+from .patient_timeline import clear_patient_timelines
+
+# sample arguments for query functions that take parameters
+SAMPLE_ARGS = {
+    'patient_id': 1,
+    'search_term': 'smith'
+}
+
+# helpers in utils.queries that do not issue their own SQL
+SKIP_FUNCTIONS = {'run_queries'}
+
+
+def query_functions():
+    """Public query functions defined in utils.queries, in file order."""
+    functions = []
+    for name, func in vars(queries).items():
+        if name.startswith('_') or name in SKIP_FUNCTIONS:
+            continue
+        func = inspect.unwrap(func) if callable(func) else func
+        if inspect.isfunction(func) and func.__module__ == queries.__name__:
+            functions.append((name, func))
+    functions.sort(key=lambda item: item[1].__code__.co_firstlineno)
+    return functions
+
+
+class _RecordingCursor:
+    """DB-API cursor that records statements and returns no rows."""
+
+    description = ()
+    column_names = ()
+    rowcount = 0
+
+    def __init__(self, captured):
+        self._captured = captured
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        self._captured.append((operation, params))
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        for params in seq_params:
+            self._captured.append((operation, params))
+
+    def fetchone(self):
+        # an empty row rather than None, so callers that expect one row keep going
+        return ()
+
+    def fetchmany(self, size=None):
+        return []
+
+    def fetchall(self):
+        return []
+
+    def close(self):
+        pass
+
+
+class _RecordingConnection:
+    in_transaction = False
+
+    def __init__(self, captured):
+        self._captured = captured
+
+    def cursor(self, *args, **kwargs):
+        return _RecordingCursor(self._captured)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class _RecordingPool:
+    """Stands in for the connection pool so no statement reaches MySQL."""
+
+    def __init__(self, captured, pool_size):
+        self._captured = captured
+        self.pool_size = pool_size
+
+    def checkout(self):
+        return _RecordingConnection(self._captured)
+
+    def release(self, conn, discard=False):
+        pass
+
+    @contextmanager
+    def connection(self):
+        yield self.checkout()
+
+
+class _Uncached:
+    """Query cache stand-in that always runs the loader, so every statement is seen."""
+
+    def get_or_load(self, query, params, load, ttl=None, tags=None):
+        return load(query, params)
+
+
+@contextmanager
+def _capture_sql(captured):
+    """
+    Record the SQL issued through the connection pool instead of running it.
+
+    Every query path (run_query, read_dataframe, stream_query and the direct
+    pool users in utils.search / utils.patient_timeline) goes through
+    get_pool(), so nothing, including writes or DDL, reaches the database
+    while this is active.
+    """
+    originals = [
+        (database, '_pool', database._pool),
+        # every get_query_cache() caller (run_query, search, sampling) sees the stand-in
+        (query_cache, '_cache', query_cache._cache),
+        # take the summary-table path the pages use
+        (aggregates, 'summaries_available', aggregates.summaries_available)
+    ]
+    pool_size = database.DB_POOL_CONFIG['pool_size']
+    try:
+        database._pool = _RecordingPool(captured, pool_size)
+        query_cache._cache = _Uncached()
+        aggregates.summaries_available = lambda *args, **kwargs: True
+        yield captured
+    finally:
+        for module, name, value in originals:
+            setattr(module, name, value)
+        # drop results cached from the empty placeholder rows
+        clear_patient_timelines()
+
+
+def _is_read(query):
+    return query.lstrip().lstrip('(').lstrip()[:6].upper() in ('SELECT', 'WITH')
+
+
+def collect_statements():
+    """Call every query function and return [(function name, sql, params)]."""
+    statements = []
+    for name, func in query_functions():
+        args = []
+        for param in inspect.signature(func).parameters.values():
+            if param.default is not inspect.Parameter.empty:
+                break
+            if param.name not in SAMPLE_ARGS:
+                print(f"Skipping {name}: no sample value for '{param.name}'")
+                args = None
+                break
+            args.append(SAMPLE_ARGS[param.name])
+        if args is None:
+            continue
+
+        captured = []
+        with _capture_sql(captured):
+            try:
+                func(*args)
+            except Exception:
+                # the empty placeholder result may not satisfy post-processing
+                pass
+        statements.extend((name, query, params) for query, params in captured if _is_read(query))
+    return statements
+
+
+def explain(query, params=None):
+    """EXPLAIN one statement and return the plan as a DataFrame."""
+    return read_dataframe(f"EXPLAIN {query}", params=params)
+
+
+def advise(min_rows=1000):
+    """
+    EXPLAIN every query function and flag full scans.
+
+    A plan row is flagged when it reads a whole table (type ALL) or a whole
+    index (type index) with at least min_rows estimated rows, or when it
+    needs a temporary table / filesort over that many rows.
+
+    Returns:
+    --------
+    pandas.DataFrame with one row per plan step and a 'warning' column
+    """
+    reports = []
+    for name, query, params in collect_statements():
+        plan = explain(query, params)
+        if plan is None or plan.empty:
+            continue
+        plan = plan.copy()
+        plan.insert(0, 'function', name)
+        reports.append(plan)
+
+    if not reports:
+        return pd.DataFrame()
+
+    report = pd.concat(reports, ignore_index=True)
+    rows = pd.to_numeric(report.get('rows'), errors='coerce').fillna(0)
+    extra = report.get('Extra', pd.Series('', index=report.index)).fillna('')
+    big = rows >= min_rows
+
+    warnings = pd.Series('', index=report.index)
+    warnings[big & (report['type'] == 'ALL')] = 'full table scan'
+    warnings[big & (report['type'] == 'index')] = 'full index scan'
+    sorting = big & extra.str.contains('Using temporary|Using filesort')
+    warnings[sorting & (warnings == '')] = 'temporary table / filesort'
+    report['warning'] = warnings
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag full scans in utils/queries.py")
+    parser.add_argument('--min-rows', type=int, default=1000,
+                        help="ignore plan steps estimated below this many rows")
+    args = parser.parse_args(argv)
+
+    report = advise(min_rows=args.min_rows)
+    if report.empty:
+        print("No statements could be explained")
+        return 1
+
+    columns = [c for c in ['function', 'table', 'type', 'key', 'rows', 'Extra', 'warning'] if c in report.columns]
+    print(report[columns].to_string(index=False))
+
+    flagged = report[report['warning'] != '']
+    print()
+    print(f"{flagged['function'].nunique()} of {report['function'].nunique()} query functions have flagged steps")
+    return 1 if not flagged.empty else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# utils/patient_timeline.py
+#
+# Everything the patient page shows for one patient, loaded in one go.
+#
+# All lab columns come from a single query on the (patient_id, date_of_visit)
+# index. Numeric columns are converted to float64 in one block instead of
+# column by column. Loaded timelines are kept in a process-wide LRU cache
+# scoped per patient, so switching back to a recently viewed patient does not
+# hit the database.
+#
+# A cached timeline is dropped when its records change:
+#   - writes through utils.database (execute_query / transaction()) that touch
+#     patient_labs clear the cached timelines via a write listener
+#   - before reuse, a cheap index-only fingerprint query (row count and latest
+#     visit date) catches rows inserted by other processes
+#   - in-place edits made outside this process are picked up after max_age
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import pandas as pd
+import streamlit as st
+
+from config import PATIENT_TIMELINE_CONFIG
+from .database import add_write_listener, get_pool, to_float
+
+BLOOD_CHEMISTRY_COLUMNS = ['total_cholesterol', 'ldl', 'hdl', 'triglycerides',
+                           'hemoglobin', 'wbc', 'rbc', 'platelets']
+VITAMIN_COLUMNS = ['vitamin_d2', 'vitamin_d3', 'vitamin_d_total']
+LAB_COLUMNS = BLOOD_CHEMISTRY_COLUMNS + VITAMIN_COLUMNS
+
+LABS_QUERY = f"""
+SELECT
+    date_of_visit,
+    {', '.join(LAB_COLUMNS)}
+FROM patient_labs
+WHERE patient_id = %s
+ORDER BY date_of_visit
+"""
+
+# served from idx_patient_labs_patient_date alone
+FINGERPRINT_QUERY = """
+SELECT COUNT(*) AS lab_rows, MAX(date_of_visit) AS last_visit
+FROM patient_labs
+WHERE patient_id = %s
+"""
+
+# tables whose writes invalidate cached timelines
+TIMELINE_TABLES = frozenset({'patient_labs'})
+
+
+@dataclass
+class PatientTimeline:
+    """One patient's lab history; treat the frame as read-only."""
+
+    patient_id: int
+    labs: pd.DataFrame
+    fingerprint: tuple
+    loaded_at: float = field(default_factory=time.monotonic)
+    checked_at: float = field(default_factory=time.monotonic)
+
+    def blood_chemistry(self):
+        return self.labs[['date_of_visit'] + BLOOD_CHEMISTRY_COLUMNS]
+
+    def vitamin_levels(self):
+        return self.labs[['date_of_visit'] + VITAMIN_COLUMNS]
+
+
+def _fingerprint(conn, patient_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(FINGERPRINT_QUERY, (patient_id,))
+        return tuple(cursor.fetchone())
+    finally:
+        cursor.close()
+
+
+def _load(conn, patient_id, fingerprint):
+    labs = pd.read_sql(LABS_QUERY, conn, params=(patient_id,))
+    labs = to_float(labs, LAB_COLUMNS)
+    return PatientTimeline(patient_id, labs, fingerprint)
+
+
+class PatientTimelineCache:
+    """LRU of PatientTimeline objects, validated against each patient's fingerprint."""
+
+    def __init__(self, max_patients=50, recheck_interval=30, max_age=600):
+        self.max_patients = max_patients
+        self.recheck_interval = recheck_interval
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, patient_id):
+        with self._lock:
+            timeline = self._entries.get(patient_id)
+            if timeline is not None:
+                self._entries.move_to_end(patient_id)
+            return timeline
+
+    def _store(self, timeline):
+        with self._lock:
+            self._entries[timeline.patient_id] = timeline
+            self._entries.move_to_end(timeline.patient_id)
+            while len(self._entries) > self.max_patients:
+                self._entries.popitem(last=False)
+
+    def get(self, patient_id):
+        """Return the patient's timeline, reloading it only if their records changed."""
+        timeline = self._cached(patient_id)
+        now = time.monotonic()
+        if timeline is not None:
+            if now - timeline.loaded_at > self.max_age:
+                timeline = None
+            elif now - timeline.checked_at < self.recheck_interval:
+                return timeline
+
+        with get_pool().connection() as conn:
+            fingerprint = _fingerprint(conn, patient_id)
+            if timeline is not None and timeline.fingerprint == fingerprint:
+                timeline.checked_at = now
+                return timeline
+            timeline = _load(conn, patient_id, fingerprint)
+        self._store(timeline)
+        return timeline
+
+    def invalidate(self, patient_id):
+        with self._lock:
+            self._entries.pop(patient_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'patients': len(self._entries), 'max_patients': self.max_patients}
+
+
+_cache = PatientTimelineCache(
+    max_patients=PATIENT_TIMELINE_CONFIG['max_patients'],
+    recheck_interval=PATIENT_TIMELINE_CONFIG['recheck_interval'],
+    max_age=PATIENT_TIMELINE_CONFIG['max_age']
+)
+
+
+def get_patient_timeline(patient_id):
+    """A patient's lab timeline (cached per patient); None if the query failed."""
+    try:
+        return _cache.get(int(patient_id))
+    except Exception as e:
+        st.error(f"Query execution failed: {e}")
+        return None
+
+
+def invalidate_patient(patient_id):
+    """Drop one patient's cached timeline (for writers that bypass utils.database)."""
+    _cache.invalidate(int(patient_id))
+
+
+def clear_patient_timelines():
+    _cache.clear()
+
+
+def _on_tables_written(tables):
+    # the written patient ids are not known from the statement, so drop every
+    # cached timeline; each reload is one indexed query per viewed patient
+    if tables & TIMELINE_TABLES:
+        _cache.clear()
+
+
+add_write_listener(_on_tables_written)
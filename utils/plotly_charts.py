@@ -0,0 +1,325 @@
+# utils/plotly_charts.py
+#
+# Plotly versions of the charts in utils/plotting.py.
+#
+# Every function takes the same arguments as its matplotlib namesake and
+# returns a plotly.graph_objects.Figure, so the browser renders the chart and
+# the server only serialises the data. Pick the backend per call with
+# plotting.show_chart(..., backend='plotly') or globally with
+# PLOT_CONFIG['backend'] / plotting.set_default_backend.
+#
+# Series with more than PLOT_CONFIG['webgl_threshold'] points are drawn with
+# WebGL (Scattergl) traces, and large box plots send precomputed quartiles
+# instead of every observation.
+
+import re
+
+import matplotlib as mpl
+import numpy as np
+import plotly.graph_objects as go
+import seaborn as sns
+
+from config import PLOT_CONFIG
+from .plotting import _bar_frame, _donut_values, _pie_values
+from .stats import summarize_value_counts
+
+# matplotlib figsize is in inches; Streamlit stretches Plotly charts to the
+# container width, so only the height is taken from figsize
+PIXELS_PER_INCH = 60
+
+TEMPLATES = {
+    'whitegrid': 'plotly_white',
+    'darkgrid': 'seaborn',
+    'white': 'simple_white',
+    'ticks': 'simple_white',
+    'dark': 'plotly_dark'
+}
+
+
+def _colors(palette, n):
+    return sns.color_palette(palette, n_colors=n).as_hex()
+
+
+def _colorscale(cmap, n=11):
+    colormap = mpl.colormaps[cmap]
+    return [[i / (n - 1), mpl.colors.to_hex(colormap(i / (n - 1)))] for i in range(n)]
+
+
+def _scatter(n_points, **kwargs):
+    """Scatter trace, WebGL when there are many points."""
+    trace = go.Scattergl if n_points > PLOT_CONFIG['webgl_threshold'] else go.Scatter
+    return trace(**kwargs)
+
+
+def _layout(fig, title, figsize, style='whitegrid', xlabel=None, ylabel=None):
+    fig.update_layout(
+        title={'text': f'<b>{title}</b>', 'x': 0.5, 'xanchor': 'center', 'font': {'size': 18}},
+        template=TEMPLATES.get(style, 'plotly_white'),
+        height=int(figsize[1] * PIXELS_PER_INCH),
+        margin={'t': 70, 'l': 10, 'r': 10, 'b': 10},
+        xaxis_title=xlabel,
+        yaxis_title=ylabel
+    )
+    return fig
+
+
+def barplot(
+    data,
+    x=None,
+    y=None,
+    labels=None,
+    title="Bar Plot",
+    xlabel=None,
+    ylabel=None,
+    color=True,
+    palette='husl',
+    figsize=(12, 8),
+    horizontal=False,
+    grid=True,
+    grid_axis='y',
+    grid_alpha=0.3,
+    show_values=False,
+    value_format='.2f',
+    rotation=0,
+    sort_values=False,
+    ascending=True,
+    legend_title=None,
+    style='whitegrid',
+    top_n=None,
+    other_label='Other',
+    other_agg='sum'
+):
+    """Plotly 版 plotting.barplot"""
+    df = _bar_frame(data, x, y, labels, sort_values, ascending, top_n, other_label, other_agg)
+    categories = df['category'].astype(str)
+    colors = ['steelblue'] * len(df) if color else _colors(palette, len(df))
+    text_kwargs = {}
+    if show_values:
+        axis = 'x' if horizontal else 'y'
+        text_kwargs = {'texttemplate': f'%{{{axis}:{value_format}}}', 'textposition': 'outside'}
+
+    def bar(cat, val, marker_color, **extra):
+        if horizontal:
+            return go.Bar(x=val, y=cat, orientation='h', marker_color=marker_color,
+                          marker_line={'color': 'black', 'width': 0.5}, **text_kwargs, **extra)
+        return go.Bar(x=cat, y=val, marker_color=marker_color,
+                      marker_line={'color': 'black', 'width': 0.5}, **text_kwargs, **extra)
+
+    fig = go.Figure()
+    if legend_title is not None:
+        # one trace per category so each gets a legend entry, as in the matplotlib version
+        for cat, val, marker_color in zip(categories, df['value'], colors):
+            fig.add_trace(bar([cat], [val], marker_color, name=cat))
+        fig.update_layout(legend_title_text=legend_title, barmode='overlay')
+    else:
+        fig.add_trace(bar(categories, df['value'], colors, showlegend=False))
+
+    if horizontal:
+        _layout(fig, title, figsize, style, xlabel=ylabel if ylabel else 'Value', ylabel=xlabel if xlabel else '')
+        # seaborn draws the first category at the top
+        fig.update_yaxes(autorange='reversed')
+        grid_axis = 'x'
+    else:
+        _layout(fig, title, figsize, style, xlabel=xlabel if xlabel else '', ylabel=ylabel if ylabel else 'Value')
+        if rotation:
+            fig.update_xaxes(tickangle=-rotation)
+
+    grid_color = f'rgba(0,0,0,{grid_alpha})'
+    fig.update_xaxes(showgrid=grid and grid_axis in ('x', 'both'), gridcolor=grid_color, griddash='dash')
+    fig.update_yaxes(showgrid=grid and grid_axis in ('y', 'both'), gridcolor=grid_color, griddash='dash')
+    return fig
+
+
+def _pie_text(show_values, autopct):
+    if not show_values or not autopct:
+        return 'none', None
+    match = re.search(r'\.(\d+)f', autopct)
+    decimals = int(match.group(1)) if match else 1
+    return 'percent', f'%{{percent:.{decimals}%}}'
+
+
+def pieplot(
+    data,
+    x=None,
+    y=None,
+    labels=None,
+    title="Pie Chart",
+    palette='pastel',
+    figsize=(10, 8),
+    textfontsize=12,
+    textcolor='black',
+    show_values=True,
+    autopct='%1.1f%%',
+    startangle=90,
+    explode=None,
+    legend=True,
+    legend_title=None,
+    style='whitegrid'
+):
+    """Plotly 版 plotting.pieplot"""
+    labels, values = _pie_values(data, x, y, labels)
+    textinfo, texttemplate = _pie_text(show_values, autopct)
+
+    fig = go.Figure(go.Pie(
+        labels=[str(label) for label in labels],
+        values=values,
+        sort=False,
+        direction='counterclockwise',
+        rotation=startangle,
+        pull=explode,
+        marker={'colors': _colors(palette, len(values)), 'line': {'color': 'white', 'width': 2}},
+        textinfo=textinfo,
+        texttemplate=texttemplate,
+        textfont={'size': textfontsize, 'color': textcolor}
+    ))
+    _layout(fig, title, figsize, style)
+    fig.update_layout(showlegend=legend, legend_title_text=legend_title)
+    return fig
+
+
+def donutplot(
+    data,
+    labels=None,
+    title="Donut Chart",
+    palette='Set2',
+    figsize=(10, 8),
+    textfontsize=12,
+    show_values=True,
+    startangle=90,
+    explode=None,
+    legend=True,
+    legend_title=None,
+    center_text=None
+):
+    """Plotly 版 plotting.donutplot"""
+    labels, values = _donut_values(data, labels)
+    if center_text is None:
+        center_text = f'Total\n{values.sum():.0f}'
+
+    fig = go.Figure(go.Pie(
+        labels=[str(label) for label in labels],
+        values=values,
+        hole=0.5,
+        sort=False,
+        direction='counterclockwise',
+        rotation=startangle,
+        pull=explode,
+        marker={'colors': _colors(palette, len(values)), 'line': {'color': 'white', 'width': 3}},
+        textinfo='percent' if show_values else 'none',
+        texttemplate='%{percent:.1%}' if show_values else None,
+        textfont={'size': textfontsize - 1, 'color': 'white'}
+    ))
+    _layout(fig, title, figsize, 'white')
+    fig.update_layout(
+        showlegend=legend,
+        legend_title_text=legend_title,
+        annotations=[{'text': f"<b>{center_text.replace(chr(10), '<br>')}</b>", 'x': 0.5, 'y': 0.5,
+                      'showarrow': False, 'font': {'size': 20, 'color': '#333333'}}]
+    )
+    return fig
+
+
+def _boxes_from_stats(fig, stats, palette, show_mean):
+    """Add one precomputed box per row of a summarize_value_counts-style frame."""
+    colors = _colors(palette, len(stats))
+    flier_x, flier_y = [], []
+    for (label, row), box_color in zip(stats.iterrows(), colors):
+        label = str(label)
+        box = dict(
+            x=[label], name=label,
+            q1=[row['q1']], median=[row['median']], q3=[row['q3']],
+            lowerfence=[row['whislo']], upperfence=[row['whishi']],
+            marker_color=box_color, line={'width': 1.5}, boxpoints=False, showlegend=False
+        )
+        if show_mean and 'mean' in stats.columns:
+            box['mean'] = [row['mean']]
+        fig.add_trace(go.Box(**box))
+        if 'fliers' in stats.columns:
+            flier_x.extend([label] * len(row['fliers']))
+            flier_y.extend(row['fliers'])
+
+    if flier_y:
+        fig.add_trace(_scatter(
+            len(flier_y), x=flier_x, y=flier_y, mode='markers', name='Outliers',
+            marker={'color': 'rgba(0,0,0,0.5)', 'size': 5}, showlegend=False
+        ))
+    return fig
+
+
+def boxplot_by_category(
+    data,
+    x_col,
+    y_col,
+    title="Box Plot",
+    xlabel=None,
+    ylabel=None,
+    figsize=(14, 8),
+    palette='Set2',
+    show_mean=True,
+    rotation=45
+):
+    """Plotly 版 plotting.boxplot_by_category"""
+    fig = go.Figure()
+    data = data[[x_col, y_col]].dropna()
+    if len(data) > PLOT_CONFIG['webgl_threshold']:
+        # send five-number summaries instead of every observation
+        counts = data.groupby([x_col, y_col], sort=False).size().rename('n').reset_index()
+        stats = summarize_value_counts(counts, x_col, y_col, 'n')
+        stats = stats.reindex([c for c in data[x_col].unique() if c in stats.index])
+        _boxes_from_stats(fig, stats, palette, show_mean)
+    else:
+        categories = data[x_col].unique()
+        for category, box_color in zip(categories, _colors(palette, len(categories))):
+            fig.add_trace(go.Box(
+                y=data.loc[data[x_col] == category, y_col], name=str(category),
+                boxmean=show_mean, marker_color=box_color, line={'width': 1.5}, showlegend=False
+            ))
+
+    _layout(fig, title, figsize, 'whitegrid', xlabel=xlabel if xlabel else x_col, ylabel=ylabel if ylabel else y_col)
+    fig.update_xaxes(tickangle=-rotation)
+    return fig
+
+
+def boxplot_from_stats(
+    stats,
+    title="Box Plot",
+    xlabel=None,
+    ylabel=None,
+    figsize=(14, 8),
+    palette='Set2',
+    show_mean=True,
+    rotation=45
+):
+    """Plotly 版 plotting.boxplot_from_stats"""
+    fig = _boxes_from_stats(go.Figure(), stats, palette, show_mean)
+    _layout(fig, title, figsize, 'whitegrid', xlabel=xlabel if xlabel else (stats.index.name or ''), ylabel=ylabel or '')
+    fig.update_xaxes(tickangle=-rotation)
+    return fig
+
+
+def heatmap(
+    data,
+    title="Heatmap",
+    figsize=(14, 10),
+    cmap='YlOrRd',
+    annot=True,
+    fmt='g',
+    linewidths=1,
+    cbar_label='Value'
+):
+    """Plotly 版 plotting.heatmap"""
+    fig = go.Figure(go.Heatmap(
+        z=np.asarray(data, dtype=float),
+        x=[str(c) for c in data.columns],
+        y=[str(i) for i in data.index],
+        colorscale=_colorscale(cmap),
+        colorbar={'title': {'text': cbar_label}},
+        xgap=linewidths,
+        ygap=linewidths,
+        texttemplate=f'%{{z:{fmt}}}' if annot else None
+    ))
+    _layout(fig, title, figsize, 'white', xlabel=data.columns.name or 'X', ylabel=data.index.name or 'Y')
+    # seaborn draws the first row at the top
+    fig.update_yaxes(autorange='reversed')
+    fig.update_xaxes(tickangle=-45)
+    return fig
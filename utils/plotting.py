@@ -1,3 +1,183 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import streamlit as st
+from matplotlib.figure import Figure
+from matplotlib.patches import Circle, Rectangle
+import seaborn as sns
+import numpy as np
+import pandas as pd
+
+from config import PLOT_CACHE_CONFIG, PLOT_CONFIG
+
+# 所有函数都创建独立的 matplotlib.figure.Figure（不经过 pyplot），
+# 不会被 pyplot 的全局图形列表引用，用完后由 render_figure 释放或被垃圾回收
+#
+# 样式不修改进程全局 rcParams（不调用 sns.set_style / set_context，也不进入
+# rc_context）：_new_figure 把 seaborn 样式 / 上下文的取值直接设置到新建的
+# Figure 与 Axes 上，之后生成的刻度、网格线沿用这些设置。绘图和渲染都不需要
+# 全局锁，多个会话线程（以及 render_many 的线程池）可以并行绘图。
+
+
+def _style_rc(style=None, context=None, font_scale=1):
+    """seaborn 样式 / 上下文对应的 rcParams 字典（不修改全局设置）"""
+    rc = {}
+    if style is not None:
+        rc.update(sns.axes_style(style))
+    if context is not None:
+        rc.update(sns.plotting_context(context, font_scale=font_scale))
+    return rc
+
+
+def _tick_params(rc, axis):
+    """rc 中某个坐标轴的刻度设置，转换为 Axes.tick_params 的参数"""
+    keys = {
+        'labelsize': 'labelsize',
+        'color': 'colors',
+        'direction': 'direction',
+        'major.size': 'length',
+        'major.width': 'width'
+    }
+    keys.update({side: side for side in (('bottom', 'top') if axis == 'x' else ('left', 'right'))})
+    return {param: rc[f'{axis}tick.{key}'] for key, param in keys.items() if f'{axis}tick.{key}' in rc}
+
+
+def _apply_axes_style(ax, rc, frame=True):
+    """
+    把样式字典中与 Axes 相关的项设置到 ax 上
+
+    tick_params / grid 的设置对之后才生成的刻度同样生效。frame=False 时只设置
+    刻度与坐标轴标签（用于 colorbar 等自带边框的 Axes）。
+    """
+    for axis in ('x', 'y'):
+        params = _tick_params(rc, axis)
+        if params:
+            ax.tick_params(axis=axis, which='major', **params)
+    for label in (ax.xaxis.label, ax.yaxis.label):
+        if 'axes.labelsize' in rc:
+            label.set_fontsize(rc['axes.labelsize'])
+        if 'axes.labelcolor' in rc:
+            label.set_color(rc['axes.labelcolor'])
+    if not frame:
+        return
+
+    if 'axes.titlesize' in rc:
+        ax.title.set_fontsize(rc['axes.titlesize'])
+    if 'text.color' in rc:
+        ax.title.set_color(rc['text.color'])
+    if 'axes.facecolor' in rc:
+        ax.set_facecolor(rc['axes.facecolor'])
+    for side, spine in ax.spines.items():
+        if f'axes.spines.{side}' in rc:
+            spine.set_visible(rc[f'axes.spines.{side}'])
+        if 'axes.edgecolor' in rc:
+            spine.set_edgecolor(rc['axes.edgecolor'])
+        if 'axes.linewidth' in rc:
+            spine.set_linewidth(rc['axes.linewidth'])
+    if rc.get('axes.grid'):
+        grid = {key: rc[f'grid.{key}'] for key in ('color', 'linestyle', 'linewidth') if f'grid.{key}' in rc}
+        ax.grid(True, axis=rc.get('axes.grid.axis', 'both'), **grid)
+    elif 'axes.grid' in rc:
+        ax.grid(False)
+    if 'axes.axisbelow' in rc:
+        ax.set_axisbelow(rc['axes.axisbelow'])
+
+
+def _new_figure(figsize, style=None, context=None, font_scale=1):
+    """
+    新建 Figure 与单个 Axes，并按 seaborn 样式 / 上下文设置这两个对象
+
+    Returns:
+    --------
+    (fig, ax, rc)，rc 为样式字典，供之后需要字号等取值的调用使用
+    """
+    rc = _style_rc(style, context, font_scale)
+    fig = Figure(figsize=figsize, facecolor=rc.get('figure.facecolor'))
+    ax = fig.subplots()
+    _apply_axes_style(ax, rc)
+    return fig, ax, rc
+
+
+# ==================== Input Parsing ====================
+# 供 matplotlib 与 Plotly 两个后端（utils/plotly_charts.py）共用
+
+def _bar_frame(data, x=None, y=None, labels=None, sort_values=False, ascending=True,
+               top_n=None, other_label='Other', other_agg='sum'):
+    """把 barplot 的各种输入形式转换为 category / value 两列的 DataFrame"""
+    if isinstance(data, dict):
+        df = pd.DataFrame(list(data.items()), columns=['category', 'value'])
+    elif isinstance(data, pd.DataFrame):
+        df = data.copy()
+        if len(df.columns) == 2:
+            df.columns = ['category', 'value']
+    elif isinstance(data, tuple) and len(data) == 2:
+        df = pd.DataFrame({'category': data[0], 'value': data[1]})
+    elif x is not None and y is not None:
+        df = pd.DataFrame({'category': x, 'value': y})
+    else:
+        values = np.array(data)
+        if labels is None:
+            labels = list(range(len(values)))
+        df = pd.DataFrame({'category': labels, 'value': values})
+
+    # keep the top_n largest categories and fold the rest into one bar
+    if top_n == 'auto':
+        top_n = PLOT_CONFIG['max_categories'] if len(df) > PLOT_CONFIG['max_categories'] else None
+    other = None
+    if top_n is not None and len(df) > top_n:
+        keep = df['value'].nlargest(top_n).index
+        rest = df.drop(keep)
+        df = df.loc[keep.sort_values()]
+        if other_agg is not None:
+            other = pd.DataFrame({'category': [f'{other_label} ({len(rest)})'],
+                                  'value': [rest['value'].agg(other_agg)]})
+
+    # sort if requested
+    if sort_values:
+        df = df.sort_values('value', ascending=ascending)
+    if other is not None:
+        # the aggregated bar always goes last
+        df = pd.concat([df, other])
+    return df.reset_index(drop=True)
+
+
+def _pie_values(data, x=None, y=None, labels=None):
+    """pieplot 的输入转换为 (labels, values 数组)"""
+    if isinstance(data, dict):
+        labels = list(data.keys())
+        values = list(data.values())
+    elif isinstance(data, pd.Series):
+        labels = data.index.tolist()
+        values = data.values.tolist()
+    elif isinstance(data, tuple) and len(data) == 2:
+        labels, values = data
+    elif x is not None and y is not None:
+        labels = x
+        values = y
+    else:
+        values = data
+        if labels is None:
+            labels = [f'Category {i+1}' for i in range(len(values))]
+    return labels, np.array(values)
+
+
+def _donut_values(data, labels=None):
+    """donutplot 的输入转换为 (labels, values 数组)"""
+    if isinstance(data, dict):
+        labels = list(data.keys())
+        values = list(data.values())
+    elif isinstance(data, pd.Series):
+        labels = data.index.tolist()
+        values = data.values.tolist()
+    else:
+        values = data
+        if labels is None:
+            labels = [f'Category {i+1}' for i in range(len(values))]
+    return labels, np.array(values)
+
 #
 def donutplot(
     data,
@@ -14,28 +194,14 @@ def donutplot(
     center_text=None  # central letter
 ):
 
-    sns.set_style("white")
-    sns.set_context("notebook", font_scale=1.1)
-
     # parse input data
-    if isinstance(data, dict):
-        labels = list(data.keys())
-        values = list(data.values())
-    elif isinstance(data, pd.Series):
-        labels = data.index.tolist()
-        values = data.values.tolist()
-    else:
-        values = data
-        if labels is None:
-            labels = [f'Category {i+1}' for i in range(len(values))]
-
-    values = np.array(values)
+    labels, values = _donut_values(data, labels)
 
     # set colors
     colors = sns.color_palette(palette, n_colors=len(values))
 
     # create figure
-    fig, ax = plt.subplots(figsize=figsize)
+    fig, ax, rc = _new_figure(figsize, style='white', context='notebook', font_scale=1.1)
 
     # create donut chart
     wedges, texts, autotexts = ax.pie(
@@ -56,7 +222,7 @@ def donutplot(
             autotext.set_weight('bold')
 
     # add center circle for donut effect
-    centre_circle = plt.Circle((0, 0), 0.70, fc='white', linewidth=0)
+    centre_circle = Circle((0, 0), 0.70, fc='white', linewidth=0)
     ax.add_artist(centre_circle)
 
     # add center text
@@ -88,16 +254,10 @@ def donutplot(
         )
 
     ax.axis('equal')
-    plt.tight_layout()
+    fig.tight_layout()
 
     return fig, ax
 
-
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-import pandas as pd
-
 # 
 def barplot(
     data,
@@ -120,35 +280,17 @@ def barplot(
     sort_values=False,
     ascending=True,
     legend_title=None,
-    style='whitegrid'  # seaborn style: 'whitegrid', 'darkgrid', 'white', 'dark', 'ticks'
+    style='whitegrid',  # seaborn style: 'whitegrid', 'darkgrid', 'white', 'dark', 'ticks'
+    top_n=None,  # int: keep the N largest bars and fold the rest into "Other"; 'auto': only above PLOT_CONFIG['max_categories']
+    other_label='Other',
+    other_agg='sum'  # how the folded values are combined ('sum', 'mean', ...); None drops them
 ):
 
-    # set seaborn style
-    sns.set_style(style)
-
     # parse input data and convert to DataFrame
-    if isinstance(data, dict):
-        df = pd.DataFrame(list(data.items()), columns=['category', 'value'])
-    elif isinstance(data, pd.DataFrame):
-        df = data.copy()
-        if len(df.columns) == 2:
-            df.columns = ['category', 'value']
-    elif isinstance(data, tuple) and len(data) == 2:
-        df = pd.DataFrame({'category': data[0], 'value': data[1]})
-    elif x is not None and y is not None:
-        df = pd.DataFrame({'category': x, 'value': y})
-    else:
-        values = np.array(data)
-        if labels is None:
-            labels = list(range(len(values)))
-        df = pd.DataFrame({'category': labels, 'value': values})
-
-    # sort if requested
-    if sort_values:
-        df = df.sort_values('value', ascending=ascending).reset_index(drop=True)
+    df = _bar_frame(data, x, y, labels, sort_values, ascending, top_n, other_label, other_agg)
 
     # create figure
-    fig, ax = plt.subplots(figsize=figsize)
+    fig, ax, rc = _new_figure(figsize, style=style)
 
     # set color palette
     if color:
@@ -178,21 +320,6 @@ def barplot(
             ax.grid(True, axis='x', alpha=grid_alpha, linestyle='--', linewidth=0.7)
             ax.set_axisbelow(True)
 
-        # add values on bars
-        if show_values:
-            fontsize = max(8, min(12, 120 / len(df)))
-            for i, (idx, row) in enumerate(df.iterrows()):
-                val = row['value']
-                offset = val * 0.02
-                ax.text(
-                    val + offset,
-                    i,
-                    f'{val:{value_format}}',
-                    ha='left',
-                    va='center',
-                    fontweight='bold',
-                    fontsize=fontsize
-                )
     else:
         sns.barplot(
             data=df,
@@ -218,36 +345,33 @@ def barplot(
             ax.grid(True, axis=grid_axis, alpha=grid_alpha, linestyle='--', linewidth=0.7)
             ax.set_axisbelow(True)
 
-        # add values on bars
-        if show_values:
-            fontsize = max(8, min(12, 120 / len(df)))
-            for i, (idx, row) in enumerate(df.iterrows()):
-                val = row['value']
-                offset = val * 0.01
-                ax.text(
-                    i,
-                    val + offset,
-                    f'{val:{value_format}}',
-                    ha='center',
-                    va='bottom',
-                    fontweight='bold',
-                    fontsize=fontsize
-                )
+
+    # add values on bars (one bar_label call per container, formatted by matplotlib)
+    if show_values:
+        fontsize = max(8, min(12, 120 / len(df)))
+        for container in ax.containers:
+            ax.bar_label(
+                container,
+                fmt=f'{{:{value_format}}}',
+                padding=3,
+                fontweight='bold',
+                fontsize=fontsize
+            )
 
     # add title
     ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
 
     # remove spines for cleaner look
-    sns.despine(left=False, bottom=False)
+    sns.despine(ax=ax, left=False, bottom=False)
 
     # add legend if requested
     if legend_title is not None:
-        handles = [plt.Rectangle((0,0),1,1, color=c) for c in colors]
+        handles = [Rectangle((0,0),1,1, color=c) for c in colors]
         ax.legend(handles, df['category'].tolist(), title=legend_title,
-                 bbox_to_anchor=(1.05, 1), loc='upper left')
+                 bbox_to_anchor=(1.05, 1), loc='upper left', fontsize=rc.get('legend.fontsize'))
 
     # apply tight layout
-    plt.tight_layout()
+    fig.tight_layout()
 
     return fig, ax
 
@@ -271,35 +395,14 @@ def pieplot(
     style='whitegrid'
 ):
 
-    # set seaborn style
-    sns.set_style(style)
-    sns.set_context("notebook", font_scale=1.1)
-
     # parse input data
-    if isinstance(data, dict):
-        labels = list(data.keys())
-        values = list(data.values())
-    elif isinstance(data, pd.Series):
-        labels = data.index.tolist()
-        values = data.values.tolist()
-    elif isinstance(data, tuple) and len(data) == 2:
-        labels, values = data
-    elif x is not None and y is not None:
-        labels = x
-        values = y
-    else:
-        values = data
-        if labels is None:
-            labels = [f'Category {i+1}' for i in range(len(values))]
-
-    # convert to numpy arrays
-    values = np.array(values)
+    labels, values = _pie_values(data, x, y, labels)
 
     # set colors using seaborn palette
     colors = sns.color_palette(palette, n_colors=len(values))
 
     # create figure
-    fig, ax = plt.subplots(figsize=figsize)
+    fig, ax, rc = _new_figure(figsize, style=style, context='notebook', font_scale=1.1)
 
     # create wedges
     wedges, texts, autotexts = ax.pie(
@@ -337,7 +440,7 @@ def pieplot(
     ax.axis('equal')
 
     # apply tight layout
-    plt.tight_layout()
+    fig.tight_layout()
 
     return fig, ax
 
@@ -357,7 +460,7 @@ def boxplot_by_category(
     """
     创建分组箱线图
     """
-    plt.figure(figsize=figsize)
+    fig, ax, rc = _new_figure(figsize, style='whitegrid', context='notebook', font_scale=1.1)
 
     sns.boxplot(
         data=data,
@@ -365,7 +468,8 @@ def boxplot_by_category(
         y=y_col,
         palette=palette,
         width=0.6,
-        linewidth=1.5
+        linewidth=1.5,
+        ax=ax
     )
 
     if show_mean:
@@ -378,18 +482,84 @@ def boxplot_by_category(
             markers='D',
             scale=0.8,
             linestyles='none',
-            label='Mean'
+            label='Mean',
+            ax=ax
         )
 
-    plt.title(title, fontsize=16, fontweight='bold', pad=20)
-    plt.xlabel(xlabel if xlabel else x_col, fontsize=12)
-    plt.ylabel(ylabel if ylabel else y_col, fontsize=12)
-    plt.xticks(rotation=rotation, ha='right')
-    plt.grid(True, alpha=0.3, linestyle='--', axis='y')
-    plt.legend()
-    plt.tight_layout()
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel(xlabel if xlabel else x_col, fontsize=12)
+    ax.set_ylabel(ylabel if ylabel else y_col, fontsize=12)
+    ax.tick_params(axis='x', labelrotation=rotation)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.grid(True, alpha=0.3, linestyle='--', axis='y')
+    ax.legend(fontsize=rc.get('legend.fontsize'))
+    fig.tight_layout()
 
-    return plt.gcf(), plt.gca()
+    return fig, ax
+
+#
+def boxplot_from_stats(
+    stats,
+    title="Box Plot",
+    xlabel=None,
+    ylabel=None,
+    figsize=(14, 8),
+    palette='Set2',
+    show_mean=True,
+    rotation=45
+):
+    """
+    由预先计算的统计量创建分组箱线图（无需原始数据）
+
+    stats: DataFrame，每行一组，包含 q1/median/q3/whislo/whishi 列，
+    可选 mean/fliers 列（见 utils.stats.summarize_value_counts）
+    """
+    fig, ax, rc = _new_figure(figsize, style='whitegrid', context='notebook', font_scale=1.1)
+
+    boxes = []
+    for label, row in stats.iterrows():
+        box = {
+            'label': str(label),
+            'q1': row['q1'],
+            'med': row['median'],
+            'q3': row['q3'],
+            'whislo': row['whislo'],
+            'whishi': row['whishi'],
+            'fliers': row['fliers'] if 'fliers' in stats.columns else []
+        }
+        if 'mean' in stats.columns:
+            box['mean'] = row['mean']
+        boxes.append(box)
+
+    colors = sns.color_palette(palette, n_colors=len(boxes))
+    artists = ax.bxp(
+        boxes,
+        widths=0.6,
+        patch_artist=True,
+        showmeans=show_mean and 'mean' in stats.columns,
+        meanprops={'marker': 'D', 'markerfacecolor': 'red', 'markeredgecolor': 'red', 'markersize': 6},
+        medianprops={'color': '#333333', 'linewidth': 1.5},
+        boxprops={'linewidth': 1.5},
+        whiskerprops={'linewidth': 1.5},
+        capprops={'linewidth': 1.5}
+    )
+    for patch, color in zip(artists['boxes'], colors):
+        patch.set_facecolor(color)
+
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel(xlabel if xlabel else (stats.index.name or ''), fontsize=12)
+    ax.set_ylabel(ylabel if ylabel else '', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=rotation)
+    if rotation:
+        for label in ax.get_xticklabels():
+            label.set_horizontalalignment('right')
+    ax.grid(True, alpha=0.3, linestyle='--', axis='y')
+    if artists.get('means'):
+        ax.legend([artists['means'][0]], ['Mean'], fontsize=rc.get('legend.fontsize'))
+    fig.tight_layout()
+
+    return fig, ax
 
 #
 def heatmap(
@@ -405,7 +575,7 @@ def heatmap(
     """
     创建热力图
     """
-    plt.figure(figsize=figsize)
+    fig, ax, rc = _new_figure(figsize, style='white', context='notebook', font_scale=1.1)
     
     sns.heatmap(
         data,
@@ -414,14 +584,249 @@ def heatmap(
         fmt=fmt,
         cbar_kws={'label': cbar_label},
         linewidths=linewidths,
-        linecolor='white'
+        linecolor='white',
+        annot_kws={'fontsize': rc['font.size']},
+        ax=ax
     )
+    # colorbar 的 Axes 由 seaborn 创建，只设置刻度和标签
+    for cbar_ax in fig.axes[1:]:
+        _apply_axes_style(cbar_ax, rc, frame=False)
+
+    ax.set_title(title, fontsize=16, fontweight='bold', pad=20)
+    ax.set_xlabel(data.columns.name or 'X', fontsize=12)
+    ax.set_ylabel(data.index.name or 'Y', fontsize=12)
+    ax.tick_params(axis='x', labelrotation=45)
+    for label in ax.get_xticklabels():
+        label.set_horizontalalignment('right')
+    ax.tick_params(axis='y', labelrotation=0)
+    fig.tight_layout()
+
+    return fig, ax
+
+# ==================== Rendered Figure Cache ====================
+
+def render_figure(fig, fmt='png', dpi=None):
+    """
+    将 Figure 渲染为 PNG/SVG 字节并释放其中的图形对象
+
+    Parameters:
+    -----------
+    fmt : str
+        'png' 或 'svg'
+    dpi : int, optional
+        默认 PLOT_CACHE_CONFIG['dpi']
+    """
+    buffer = BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi or PLOT_CACHE_CONFIG['dpi'])
+    # 断开 Figure 与 Axes / Artist 之间的循环引用，内存可立即回收
+    fig.clear()
+    return buffer.getvalue()
+
+
+def _hash_value(digest, value):
+    """把绘图参数（含 DataFrame / ndarray）按内容写入哈希"""
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(type(value).__name__.encode())
+        if isinstance(value, pd.DataFrame):
+            digest.update(repr(list(value.columns)).encode())
+            digest.update(repr(list(map(str, value.dtypes))).encode())
+        else:
+            digest.update(repr((value.name, str(value.dtype))).encode())
+        try:
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+        except TypeError:
+            # 含列表等不可哈希的单元格（如箱线图统计量的 fliers 列）
+            digest.update(value.to_csv().encode())
+    elif isinstance(value, np.ndarray):
+        digest.update(f"ndarray{value.shape}{value.dtype}".encode())
+        if value.dtype == object:
+            digest.update(repr(value.tolist()).encode())
+        else:
+            digest.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        digest.update(b'dict{')
+        for key, item in value.items():
+            _hash_value(digest, key)
+            _hash_value(digest, item)
+        digest.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        digest.update(f"{type(value).__name__}[".encode())
+        for item in value:
+            _hash_value(digest, item)
+        digest.update(b']')
+    else:
+        digest.update(f"{type(value).__name__}:{value!r};".encode())
+
+
+class RenderCache:
+    """按 (绘图函数, 数据哈希, 参数) 缓存渲染好的图片字节，LRU 淘汰"""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            image = self._entries.get(key)
+            if image is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = image
+            self._bytes += len(image)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_render_cache = RenderCache(
+    max_entries=PLOT_CACHE_CONFIG['max_entries'],
+    max_bytes=PLOT_CACHE_CONFIG['max_bytes']
+)
+
+
+def render_cached(plot_func, *args, fmt='png', dpi=None, **kwargs):
+    """
+    调用绘图函数并返回渲染后的图片字节；数据和参数不变时直接返回缓存，不再调用 seaborn
+
+    用法：st.image(render_cached(barplot, data=..., title=...))
+
+    Parameters:
+    -----------
+    plot_func : callable
+        本模块中返回 (fig, ax) 的绘图函数
+    fmt : str
+        'png' 或 'svg'
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{plot_func.__module__}.{plot_func.__qualname__}|{fmt}|{dpi}".encode())
+    _hash_value(digest, args)
+    _hash_value(digest, sorted(kwargs.items()))
+    key = digest.hexdigest()
+
+    image = _render_cache.get(key)
+    if image is None:
+        fig, _ = plot_func(*args, **kwargs)
+        image = render_figure(fig, fmt=fmt, dpi=dpi)
+        _render_cache.put(key, image)
+    return image
+
+
+def render_many(charts, fmt='png', max_workers=None):
+    """
+    在线程池中并发渲染多张图表（与 queries.run_queries 对应）
+
+    Parameters:
+    -----------
+    charts : dict
+        {名称: (绘图函数, 关键字参数字典)}
+    max_workers : int, optional
+        并发线程数
+
+    Returns:
+    --------
+    dict {名称: 图片字节}，单张图表失败时对应值为 None
+
+    绘图不修改全局 rcParams，未命中缓存的图表也在各线程中并行绘制和渲染。
+    """
+    if not charts:
+        return {}
+
+    def render(name, plot_func, kwargs):
+        try:
+            return render_cached(plot_func, fmt=fmt, **kwargs)
+        except Exception as e:
+            print(f"Rendering chart {name} failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers or min(8, len(charts)),
+                            thread_name_prefix='render') as executor:
+        futures = {name: executor.submit(render, name, plot_func, kwargs)
+                   for name, (plot_func, kwargs) in charts.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def get_render_cache_stats():
+    """渲染缓存的条目数、字节数与命中情况"""
+    return _render_cache.stats()
+
+
+def clear_render_cache():
+    _render_cache.clear()
+
+
+# ==================== Backends ====================
+
+BACKENDS = ('matplotlib', 'plotly')
 
-    plt.title(title, fontsize=16, fontweight='bold', pad=20)
-    plt.xlabel(data.columns.name or 'X', fontsize=12)
-    plt.ylabel(data.index.name or 'Y', fontsize=12)
-    plt.xticks(rotation=45, ha='right')
-    plt.yticks(rotation=0)
-    plt.tight_layout()
 
-    return plt.gcf(), plt.gca()
\ No newline at end of file
+def _configured_backend():
+    """PLOT_CONFIG['backend']（来自环境变量 PLOT_BACKEND），无效时回退到 matplotlib"""
+    backend = str(PLOT_CONFIG['backend']).strip().lower()
+    if backend not in BACKENDS:
+        print(f"Unknown PLOT_BACKEND {PLOT_CONFIG['backend']!r}, expected one of {BACKENDS}; using 'matplotlib'")
+        return 'matplotlib'
+    return backend
+
+
+_default_backend = _configured_backend()
+
+
+def set_default_backend(backend):
+    """设置全进程默认的图表后端（'matplotlib' 或 'plotly'）"""
+    global _default_backend
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown plotting backend {backend!r}, expected one of {BACKENDS}")
+    _default_backend = backend
+
+
+def get_default_backend():
+    return _default_backend
+
+
+def show_chart(plot_func, backend=None, **kwargs):
+    """
+    用指定后端在页面上显示一张图表
+
+    Parameters:
+    -----------
+    plot_func : callable
+        本模块的绘图函数（barplot、pieplot 等），Plotly 后端使用 utils.plotly_charts 中同名、同参数的函数
+    backend : str, optional
+        'matplotlib'（服务端渲染为图片，见 render_cached）或 'plotly'（浏览器端渲染），
+        默认 get_default_backend()
+    **kwargs :
+        传给绘图函数的参数
+    """
+    backend = backend or _default_backend
+    if backend == 'plotly':
+        from . import plotly_charts
+        fig = getattr(plotly_charts, plot_func.__name__)(**kwargs)
+        st.plotly_chart(fig, use_container_width=True)
+    elif backend == 'matplotlib':
+        st.image(render_cached(plot_func, **kwargs), use_container_width=True)
+    else:
+        raise ValueError(f"Unknown plotting backend {backend!r}, expected one of {BACKENDS}")
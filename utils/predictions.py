@@ -1,5 +1,16 @@
 # utils/predictions.py
 
+import io
+import multiprocessing
+import re
+import signal
+import threading
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager, nullcontext, redirect_stdout
+
 import streamlit as st
 import plotly.graph_objects as go
 from .database import run_query
@@ -13,95 +24,573 @@ from statsmodels.tsa.stattools import adfuller
 from pmdarima.arima import ADFTest
 from pmdarima import auto_arima
 from sklearn.metrics import r2_score
-from sklearn.linear_model import LinearRegression
 
 
 from utils.queries import (
     get_hospital_revenue_history
 )
+from config import PREDICTION_CONFIG
+from utils.forecast_cache import get_forecast_cache, latest_key, series_key
 
 
-def hospital_revenue_prediction():
+def _alarm_available():
+    """Whether _time_limit can interrupt code on the calling thread."""
+    return hasattr(signal, 'SIGALRM') and threading.current_thread() is threading.main_thread()
 
-    revenue = get_hospital_revenue_history()
 
-    hospital_ids = revenue['hospital_id'].unique()
+@contextmanager
+def _time_limit(seconds):
+    """Raise TimeoutError if the block runs longer than `seconds`.
 
-    predictions_dict = {}
-    arima_predictions_dict = {}
+    Uses SIGALRM, so it only applies on POSIX in a process's main thread
+    (which is where ProcessPoolExecutor runs its tasks); elsewhere it is a
+    no-op, and hospital_revenue_prediction fits on a process pool instead.
+    """
+    if not seconds or not _alarm_available():
+        yield
+        return
 
-    for hospital_id in hospital_ids:
-        hospital_revenue = revenue[revenue['hospital_id'] == hospital_id].copy()
-        hospital_revenue = hospital_revenue.sort_values('year_month')
+    def on_alarm(signum, frame):
+        raise TimeoutError(f"fit exceeded {seconds}s")
 
-        if len(hospital_revenue) < 4:
-            print(f"No sufficient data for hospital {hospital_id} (4 data points required), skip")
-            continue
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
-        ts_data = hospital_revenue['amount'].values
 
-        hospital_revenue['month_num'] = range(len(hospital_revenue))
+# auto_arima search settings; part of the forecast cache key
+ARIMA_PARAMS = {
+    'start_p': 0,
+    'max_p': 5,          # p: autoregressive
+    'start_d': 0,
+    'max_d': 2,          # d: integrated
+    'start_q': 0,
+    'max_q': 5,          # q: moving average
+    'seasonal': False,
+    'stepwise': True
+}
 
-        # extract feature
-        X = hospital_revenue['month_num'].values.reshape(-1, 1)
-        y = hospital_revenue['amount'].values
+# forecast horizon and confidence level; also part of the cache key
+FORECAST_PARAMS = {
+    'n_periods': 3,
+    'alpha': 0.05
+}
 
+# auto_arima(trace=1) prints one line per candidate it fits, failed ones
+# included: "ARIMA(1,1,0)(0,0,0)[0] intercept   : AIC=inf, Time=0.01 sec"
+TRACE_FIT_LINE = re.compile(r':\s+AIC=')
 
-        try:
-            # find best lr parameters
-            model = LinearRegression()
-            model.fit(X, y)
 
-            future_months = np.array([[len(hospital_revenue)],
-                                    [len(hospital_revenue) + 1],
-                                    [len(hospital_revenue) + 2]])
-            future_predictions = model.predict(future_months)
+class LinearTrend:
+    """Fitted revenue = intercept + slope * month_num.
 
-            # store the results
-            predictions_dict[hospital_id] = {
-                'historical_data': hospital_revenue,
-                'model': model,
-                'future_predictions': future_predictions,
-                'r2_score': model.score(X, y)
-            }
+    Exposes the sklearn LinearRegression attributes used by callers
+    (coef_, intercept_, predict) without fitting an estimator per hospital.
+    """
 
-        except Exception as e:
-            print(f"Linear Model training failed for hospital {hospital_id}: {str(e)}")
-            continue
+    def __init__(self, slope, intercept):
+        self.coef_ = np.array([slope])
+        self.intercept_ = intercept
+
+    def predict(self, X):
+        X = np.asarray(X, dtype=float).reshape(len(X), -1)
+        return self.intercept_ + X[:, 0] * self.coef_[0]
+
+
+def _iter_hospital_series(revenue):
+    """
+    Yield (hospital_id, hospital_revenue) for every hospital in one pass.
+
+    The frame is sorted once by (hospital_id, year_month) and month_num is
+    numbered with a single groupby; each hospital is then a contiguous row
+    range, so its frame is a positional slice of the sorted data rather than
+    a boolean-mask scan of the whole table per hospital.
+    """
+    ordered = revenue.sort_values(['hospital_id', 'year_month'], kind='mergesort').reset_index(drop=True)
+    ordered['month_num'] = ordered.groupby('hospital_id', sort=False).cumcount()
+
+    ids = ordered['hospital_id'].to_numpy()
+    if len(ids) == 0:
+        return
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    stops = np.r_[starts[1:], len(ids)]
+    for start, stop in zip(starts, stops):
+        yield ids[start], ordered.iloc[start:stop]
+
+
+def batch_linear_forecast(revenue, horizon=3):
+    """
+    Least-squares linear trend for every hospital in one vectorized pass.
+
+    Each hospital's months are indexed 0..n-1 in year_month order (the same
+    month_num the per-hospital model used) and laid out as one row of a
+    hospitals x months matrix. Shorter series leave the tail of their row
+    masked, so ragged lengths need no per-hospital loop.
+
+    Parameters:
+    -----------
+    revenue : pandas.DataFrame
+        hospital_id, year_month, amount (get_hospital_revenue_history())
+    horizon : int
+        number of future months to forecast
+
+    Returns:
+    --------
+    pandas.DataFrame indexed by hospital_id with n_obs, slope, intercept,
+    r2_score and forecast_1..forecast_<horizon>
+    """
+    df = revenue.sort_values(['hospital_id', 'year_month'])
+    codes, hospitals = pd.factorize(df['hospital_id'])
+    months = df.groupby('hospital_id', sort=False).cumcount().to_numpy()
+    amounts = df['amount'].to_numpy(dtype=float)
+
+    n_hospitals = len(hospitals)
+    n_months = int(months.max()) + 1 if len(months) else 0
+
+    Y = np.zeros((n_hospitals, n_months))
+    mask = np.zeros((n_hospitals, n_months), dtype=bool)
+    Y[codes, months] = amounts
+    mask[codes, months] = True
+
+    x = np.arange(n_months, dtype=float)
+    n = mask.sum(axis=1).astype(float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = (mask * x).sum(axis=1) / n
+        y_mean = Y.sum(axis=1) / n
+
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        dy = np.where(mask, Y - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        sxy = (dx * dy).sum(axis=1)
+        syy = (dy * dy).sum(axis=1)
+
+        slope = sxy / sxx
+        intercept = y_mean - slope * x_mean
+
+        # R^2 = 1 - SS_res / SS_tot; a constant series is fitted exactly
+        ss_res = syy - slope * sxy
+        r2 = np.where(syy > 0, 1 - ss_res / syy, 1.0)
+
+    future_x = n[:, None] + np.arange(horizon)
+    forecasts = intercept[:, None] + slope[:, None] * future_x
+
+    result = pd.DataFrame({
+        'n_obs': n.astype(int),
+        'slope': slope,
+        'intercept': intercept,
+        'r2_score': r2
+    }, index=pd.Index(hospitals, name='hospital_id'))
+    for step in range(horizon):
+        result[f'forecast_{step + 1}'] = forecasts[:, step]
+    return result
+
+
+def _arima_candidate(ts_data, order):
+    """Fit one fixed ARIMA order the way auto_arima would; None if it fails."""
+    try:
+        return pm.ARIMA(
+            order=order,
+            with_intercept=order[1] < 2,   # auto_arima's 'auto' intercept rule
+            suppress_warnings=True
+        ).fit(ts_data)
+    except Exception:
+        return None
+
+
+def _local_order_search(ts_data, seed_order, budget=None):
+    """
+    Stepwise search that starts from a previously selected order.
+
+    d is kept fixed and (p, q) move to the first neighbour that lowers the
+    AIC, within ARIMA_PARAMS' max_p / max_q, until no neighbour improves or
+    the wall-clock budget (seconds) runs out.
+
+    Returns (best model or None, number of candidates fitted).
+    """
+    started = time.perf_counter()
+    d = seed_order[1]
+    fitted = {}
+
+    def fit(order):
+        if order not in fitted:
+            fitted[order] = _arima_candidate(ts_data, order)
+        return fitted[order]
+
+    best_order = tuple(seed_order)
+    best = fit(best_order)
+    if best is None:
+        return None, len(fitted)
+
+    improved = True
+    while improved:
+        improved = False
+        p, _, q = best_order
+        for dp, dq in [(-1, 0), (1, 0), (0, -1), (0, 1), (-1, -1), (1, 1)]:
+            if budget is not None and time.perf_counter() - started >= budget:
+                return best, len(fitted)
+            order = (p + dp, d, q + dq)
+            if not (0 <= order[0] <= ARIMA_PARAMS['max_p'] and 0 <= order[2] <= ARIMA_PARAMS['max_q']):
+                continue
+            if order in fitted:
+                continue
+            model = fit(order)
+            if model is not None and model.aic() < best.aic():
+                best, best_order = model, order
+                improved = True
+                break
+
+    return best, len(fitted)
+
+
+def _auto_arima_search(ts_data, budget=None):
+    """
+    Full auto_arima stepwise search, stopped early once budget seconds have passed.
+
+    The stepwise search checks its time limit between rounds, so it always
+    fits at least the initial candidates.
+
+    Returns (best model, number of candidates tried including failed fits,
+    whether the budget cut the search short).
+    """
+    log = io.StringIO()
+    limit = pm.StepwiseContext(max_dur=budget) if budget is not None else nullcontext()
+    with limit, redirect_stdout(log), warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always')
+        model = auto_arima(
+            ts_data,
+            **ARIMA_PARAMS,
+            suppress_warnings=True,
+            error_action='ignore',
+            trace=1
+        )
+    n_tried = len(TRACE_FIT_LINE.findall(log.getvalue()))
+    truncated = any('max_dur' in str(w.message) for w in caught)
+    # a constant series is fitted directly, without a search
+    return model, max(n_tried, 1), truncated
+
+
+def _fit_arima(hospital_id, ts_data, seed_order=None, mode='cold', budget=None):
+    """
+    ARIMA order selection and forecast; None if fitting failed.
+
+    mode:
+        'cold'  - full auto_arima stepwise search from scratch
+        'warm'  - local search seeded from seed_order
+        'refit' - only refit seed_order (the series grew by one month)
+    A warm or refit fit that fails falls back to a cold search. budget
+    (seconds, None for no limit) bounds the warm and cold searches together.
 
-        try:
-            # find best arima parameters
-            model = auto_arima(
-                ts_data,
-                start_p=0,
-                max_p=5,          # p: autoregressive
-                start_d=0,
-                max_d=2,          # d: integrated
-                start_q=0,
-                max_q=5,          # q: moving average
-                seasonal=False,
-                stepwise=True,
-                suppress_warnings=True,
-                error_action='ignore'
-            )
-
-            optimal_order = model.order
-
-            # Use model.predict to get forecasts and confidence intervals
-            forecast_values, forecast_ci = model.predict(n_periods=3, return_conf_int=True, alpha=0.05)
-
-            arima_predictions_dict[hospital_id] = {
-                'model': model,
-                'optimal_order': optimal_order,
-                'aic': model.aic(), # Corrected: Call aic as a method
-                'forecast': forecast_values,
-                'historical_data': hospital_revenue,
-                'conf_int': forecast_ci
-            }
-
-        except Exception as e:
-            print(f"Arima Model training failed for hospital {hospital_id}: {str(e)}")
+    The result also reports 'search_mode', 'n_candidates' (ARIMA orders
+    tried, including fits that failed), 'truncated' (the budget stopped a
+    cold search early) and 'fit_seconds'.
+    """
+    started = time.perf_counter()
+    try:
+        model = None
+        n_candidates = 0
+        truncated = False
+
+        if mode == 'refit' and seed_order is not None:
+            model = _arima_candidate(ts_data, tuple(seed_order))
+            n_candidates = 1
+        elif mode == 'warm' and seed_order is not None:
+            model, n_candidates = _local_order_search(ts_data, seed_order, budget)
+
+        if model is None:
+            mode = 'cold'
+            # find best arima parameters within what is left of the budget
+            remaining = None if budget is None else max(budget - (time.perf_counter() - started), 1e-3)
+            model, n_tried, truncated = _auto_arima_search(ts_data, remaining)
+            n_candidates += n_tried
+
+        optimal_order = model.order
+
+        # Use model.predict to get forecasts and confidence intervals
+        forecast_values, forecast_ci = model.predict(return_conf_int=True, **FORECAST_PARAMS)
+
+        return {
+            'model': model,
+            'optimal_order': optimal_order,
+            'aic': model.aic(), # Corrected: Call aic as a method
+            'forecast': forecast_values,
+            'conf_int': forecast_ci,
+            'search_mode': mode,
+            'n_candidates': n_candidates,
+            'truncated': truncated,
+            'fit_seconds': time.perf_counter() - started
+        }
+
+    except Exception as e:
+        print(f"Arima Model training failed for hospital {hospital_id}: {str(e)}")
+        return None
+
+
+def _fit_arima_job(hospital_id, job, timeout):
+    """Worker-process entry point: one hospital's ARIMA fit under a time limit."""
+    with _time_limit(timeout):
+        return _fit_arima(hospital_id, **job)
+
+
+def _new_executor(n_jobs):
+    # spawn rather than fork: the Streamlit server (and the background
+    # forecast scheduler) are multi-threaded, and forking those can deadlock
+    return ProcessPoolExecutor(max_workers=n_jobs, mp_context=multiprocessing.get_context('spawn'))
+
+
+def _fit_in_processes(jobs, n_jobs, timeout):
+    """Fit ARIMA models for {hospital_id: _fit_arima kwargs} on a process pool.
+
+    At most n_jobs fits are in flight, so a job starts as soon as it is
+    submitted and its deadline can be measured from submission. A hospital
+    that fails, crashes its worker or runs past its deadline is reported and
+    skipped without affecting the others.
+
+    Returns {hospital_id: arima_result} for completed fits.
+    """
+    results = {}
+    pending = list(jobs.items())
+    in_flight = {}     # future -> (hospital_id, deadline)
+    abandoned = set()  # timed-out futures still occupying a worker
+    # the worker enforces `timeout` itself where SIGALRM exists; the parent
+    # deadline is the fallback for platforms where it does not
+    grace = 5
+
+    executor = _new_executor(n_jobs)
+    try:
+        while pending or in_flight:
+            while pending and len(in_flight) + len(abandoned) < n_jobs:
+                hospital_id, job = pending.pop(0)
+                future = executor.submit(_fit_arima_job, hospital_id, job, timeout)
+                deadline = time.monotonic() + timeout + grace if timeout else None
+                in_flight[future] = (hospital_id, deadline)
+
+            if not in_flight:
+                # only abandoned fits are left running; wait for one to free a worker
+                done, _ = wait(abandoned, return_when=FIRST_COMPLETED)
+                abandoned -= done
+                continue
+
+            deadlines = [d for _, d in in_flight.values() if d is not None]
+            wait_for = max(0, min(deadlines) - time.monotonic()) if deadlines else None
+            done, _ = wait(list(in_flight) + list(abandoned), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+            abandoned -= done
+            broken = False
+            for future in done:
+                if future not in in_flight:
+                    continue
+                hospital_id, _ = in_flight.pop(future)
+                try:
+                    results[hospital_id] = future.result()
+                except BrokenProcessPool:
+                    broken = True
+                    print(f"Worker process died while fitting hospital {hospital_id}, skip")
+                except Exception as e:
+                    print(f"Model fitting failed for hospital {hospital_id}: {str(e)}")
+
+            now = time.monotonic()
+            for future, (hospital_id, deadline) in list(in_flight.items()):
+                if deadline is not None and now >= deadline:
+                    del in_flight[future]
+                    abandoned.add(future)
+                    print(f"Model fitting timed out for hospital {hospital_id} after {timeout}s, skip")
+
+            if broken:
+                # a crashed worker breaks the whole pool: report the rest of
+                # the in-flight hospitals and continue on a fresh pool
+                for future, (hospital_id, _) in in_flight.items():
+                    print(f"Worker pool failed while fitting hospital {hospital_id}, skip")
+                in_flight.clear()
+                abandoned.clear()
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = _new_executor(n_jobs)
+    finally:
+        executor.shutdown(wait=not abandoned, cancel_futures=True)
+
+    return results
+
+
+def _plan_fit(latest, hospital_revenue, cache_params, warm_start, search_budget, max_refits):
+    """Decide how to fit one hospital: _fit_arima keyword arguments."""
+    job = {'ts_data': hospital_revenue['amount'].values, 'budget': search_budget}
+    if latest is None or not warm_start:
+        return job
+
+    job['seed_order'] = latest['optimal_order']
+    # same history plus exactly one new month: keep the order, just refit it,
+    # unless it has been refitted max_refits times in a row or the last
+    # refit fitted worse than the search before it
+    grew_by_one = (latest.get('n_obs') == len(hospital_revenue) - 1
+                   and series_key(hospital_revenue.iloc[:-1], cache_params) == latest.get('series_key'))
+    refit_ok = latest.get('refits', 0) < max_refits and not latest.get('aic_worsened', False)
+    job['mode'] = 'refit' if grew_by_one and refit_ok else 'warm'
+    return job
+
+
+def _latest_entry(entry, latest, key):
+    """Pointer entry for a hospital's most recent fit, tracking consecutive refits."""
+    refitted = entry['search_mode'] == 'refit' and latest is not None
+    aic_worsened = False
+    if refitted and latest.get('aic') is not None and latest.get('n_obs'):
+        # AIC grows with the number of observations, so compare it per observation
+        aic_worsened = entry['aic'] / entry['n_obs'] > latest['aic'] / latest['n_obs']
+    return {
+        **entry,
+        'series_key': key,
+        'refits': latest.get('refits', 0) + 1 if refitted else 0,
+        'aic_worsened': aic_worsened
+    }
+
+
+def hospital_revenue_prediction(n_jobs=None, timeout=None, use_cache=True, revenue=None,
+                                warm_start=None, search_budget=None):
+    """
+    Fit linear-trend and ARIMA revenue forecasts for every hospital.
+
+    Parameters:
+    -----------
+    n_jobs : int, optional
+        number of worker processes; 1 fits serially (on the calling thread
+        when it is the main thread, otherwise in one worker process so the
+        timeout still applies). Defaults to PREDICTION_CONFIG['n_jobs']
+    timeout : float, optional
+        maximum seconds per hospital, defaults to PREDICTION_CONFIG['timeout']
+    use_cache : bool
+        reuse ARIMA results from the on-disk forecast cache for hospitals
+        whose revenue series has not changed (their 'model' entry is None)
+    revenue : pandas.DataFrame, optional
+        revenue history to fit; defaults to get_hospital_revenue_history()
+    warm_start : bool, optional
+        seed each hospital's order search from its last selected order, and
+        only refit that order when the series grew by exactly one month (at
+        most PREDICTION_CONFIG['max_refits'] times in a row, and not after a
+        refit whose AIC per observation got worse). Needs use_cache;
+        defaults to PREDICTION_CONFIG['warm_start']
+    search_budget : float, optional
+        wall-clock seconds per hospital for the order search (warm and cold),
+        defaults to PREDICTION_CONFIG['search_budget']; None for no limit
+
+    ARIMA results include 'search_mode' ('cold' / 'warm' / 'refit'),
+    'n_candidates', 'truncated', 'fit_seconds' and 'cached' (True when the
+    result was reused from the forecast cache and nothing was fitted in this
+    call).
+
+    Returns:
+    --------
+    (arima_predictions_dict, predictions_dict) keyed by hospital_id
+    """
+    n_jobs = PREDICTION_CONFIG['n_jobs'] if n_jobs is None else n_jobs
+    timeout = PREDICTION_CONFIG['timeout'] if timeout is None else timeout
+    warm_start = PREDICTION_CONFIG['warm_start'] if warm_start is None else warm_start
+    search_budget = PREDICTION_CONFIG['search_budget'] if search_budget is None else search_budget
+    max_refits = PREDICTION_CONFIG['max_refits']
+
+    if revenue is None:
+        revenue = get_hospital_revenue_history()
+
+    predictions_dict = {}
+    arima_predictions_dict = {}
+
+    jobs = {}
+    for hospital_id, hospital_revenue in _iter_hospital_series(revenue):
+        if len(hospital_revenue) < 4:
+            print(f"No sufficient data for hospital {hospital_id} (4 data points required), skip")
             continue
 
+        jobs[hospital_id] = hospital_revenue
+
+    # closed-form linear trends for all hospitals at once
+    horizon = FORECAST_PARAMS['n_periods']
+    trends = batch_linear_forecast(revenue, horizon=horizon)
+    forecast_cols = [f'forecast_{step + 1}' for step in range(horizon)]
+    lr_results = {}
+    for hospital_id in jobs:
+        trend = trends.loc[hospital_id]
+        lr_results[hospital_id] = {
+            'model': LinearTrend(trend['slope'], trend['intercept']),
+            'future_predictions': trend[forecast_cols].to_numpy(dtype=float),
+            'r2_score': trend['r2_score']
+        }
+
+    # hospitals whose series and model settings are unchanged reuse the
+    # cached ARIMA result; only the rest are refitted. A complete cold search
+    # is cached under the series key alone. A cold search the budget cut
+    # short is cached under a key that includes the budget, and warm-started
+    # and refit results under a key that also includes the warm-start
+    # settings, so reduced searches are never served in place of a full one
+    # or when warm start is off.
+    cache = get_forecast_cache() if use_cache else None
+    cache_params = {'arima': ARIMA_PARAMS, 'forecast': FORECAST_PARAMS}
+    budget_params = {**cache_params, 'search_budget': search_budget}
+    warm_params = {**cache_params, 'warm_start': {'search_budget': search_budget, 'max_refits': max_refits}}
+    keys = {}
+    latest = {}
+    arima_results = {}
+    to_fit = {}
+    for hospital_id, hospital_revenue in jobs.items():
+        cached = None
+        if cache is not None:
+            keys[hospital_id] = series_key(hospital_revenue, cache_params)
+            cached = cache.get(keys[hospital_id])
+            if cached is None:
+                cached = cache.get(series_key(hospital_revenue, budget_params))
+            if cached is None and warm_start:
+                cached = cache.get(series_key(hospital_revenue, warm_params))
+        if cached is None:
+            latest[hospital_id] = cache.get(latest_key(hospital_id)) if cache is not None else None
+            to_fit[hospital_id] = _plan_fit(latest[hospital_id], hospital_revenue, cache_params,
+                                            warm_start, search_budget, max_refits)
+        else:
+            # the fitted model object itself is not cached; search_mode,
+            # n_candidates and fit_seconds describe the run that produced it
+            arima_results[hospital_id] = {'model': None, **cached, 'cached': True}
+
+    # a serial fit can only be interrupted by SIGALRM on the main thread; from
+    # other threads (Streamlit script runner, forecast scheduler) a single
+    # worker process enforces the timeout instead
+    parallel = n_jobs > 1 and len(to_fit) > 1
+    if parallel or (to_fit and timeout and not _alarm_available()):
+        fitted = _fit_in_processes(to_fit, min(n_jobs, len(to_fit)) if parallel else 1, timeout)
+    else:
+        fitted = {}
+        for hospital_id, job in to_fit.items():
+            try:
+                with _time_limit(timeout):
+                    fitted[hospital_id] = _fit_arima(hospital_id, **job)
+            except TimeoutError:
+                print(f"Model fitting timed out for hospital {hospital_id} after {timeout}s, skip")
+
+    for hospital_id, arima_result in fitted.items():
+        if arima_result is not None:
+            arima_result['cached'] = False
+        arima_results[hospital_id] = arima_result
+        if cache is not None and arima_result is not None:
+            hospital_revenue = jobs[hospital_id]
+            entry = {k: v for k, v in arima_result.items() if k not in ('model', 'cached')}
+            entry['n_obs'] = len(hospital_revenue)
+            if entry['search_mode'] != 'cold':
+                key = series_key(hospital_revenue, warm_params)
+            elif entry['truncated']:
+                key = series_key(hospital_revenue, budget_params)
+            else:
+                key = keys[hospital_id]
+            try:
+                cache.put(key, entry)
+                cache.put(latest_key(hospital_id),
+                          _latest_entry(entry, latest.get(hospital_id), keys[hospital_id]))
+            except OSError as e:
+                print(f"Could not cache forecast for hospital {hospital_id}: {e}")
+
+    # keep the original hospital order
+    for hospital_id, hospital_revenue in jobs.items():
+        # store the results
+        predictions_dict[hospital_id] = {'historical_data': hospital_revenue, **lr_results[hospital_id]}
+        if arima_results.get(hospital_id) is not None:
+            arima_predictions_dict[hospital_id] = {'historical_data': hospital_revenue, **arima_results[hospital_id]}
 
-    return arima_predictions_dict, predictions_dict
\ No newline at end of file
+    return arima_predictions_dict, predictions_dict
@@ -1,8 +1,79 @@
-from .database import run_query
+from .database import run_query, read_dataframe, stream_query, get_pool
+from . import aggregates
+from .search import search_patients_ranked
+from .stats import summarize_value_counts
+from .distributions import histogram_by_gender, histogram2d_by_gender, sample_query
+from .patient_timeline import get_patient_timeline
+from .snapshots import aggregate_snapshot
+from config import KPI_CACHE_TTL, SNAPSHOT_CONFIG
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# ==================== Batch Queries ====================
+
+def run_queries(queries, max_workers=None):
+    """
+    并发执行多个相互独立的查询，一次返回全部结果
+
+    Parameters:
+    -----------
+    queries : dict
+        {名称: 查询}，查询可以是无参查询函数（如 get_hospital_avg_rating）、
+        (函数, 参数元组) 或 SQL 字符串
+    max_workers : int, optional
+        并发线程数，默认不超过连接池大小
+
+    Returns:
+    --------
+    dict {名称: 查询结果}，单个查询失败时对应值为 None
+    """
+    if not queries:
+        return {}
+
+    if max_workers is None:
+        max_workers = get_pool().pool_size
+    max_workers = max(1, min(max_workers, len(queries)))
+
+    # 让工作线程也能使用 st.error / st.cache_data
+    ctx = get_script_run_ctx()
+
+    def call(name, spec):
+        if ctx is not None:
+            add_script_run_ctx(ctx=ctx)
+        try:
+            if isinstance(spec, str):
+                return run_query(spec)
+            if isinstance(spec, tuple):
+                func, args = spec
+                return func(*args)
+            return spec()
+        except Exception as e:
+            st.error(f"Query '{name}' failed: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='run_queries') as executor:
+        futures = {name: executor.submit(call, name, spec) for name, spec in queries.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+# ==================== Hospital Analytics ====================
 
 def get_most_visited_hospitals():
     """get top 10 hospitals with most visit volumns"""
+    if aggregates.summaries_available():
+        # 从增量维护的汇总表读取（只读，由 python -m utils.aggregates refresh 刷新，见 utils/aggregates.py）
+        query = """
+        SELECT h.hospital_name,
+            COALESCE(v.visit_count, 0) as visit_count
+        FROM hospitals h
+        LEFT JOIN agg_hospital_visits v ON h.hospital_id = v.hospital_id
+        ORDER BY visit_count DESC
+        LIMIT 10
+        """
+        return run_query(query)
+
     query = """
     SELECT h.hospital_name,
         COUNT(DISTINCT a.appointment_id) as visit_count
@@ -18,6 +89,19 @@ def get_most_visited_hospitals():
 
 def get_most_visited_departments():
     """get top 10 departments with most visit volumns"""
+    if aggregates.summaries_available():
+        query = """
+            SELECT dp.department_name, h.hospital_name, v.visit_count as frequency
+            FROM agg_department_visits v
+            LEFT JOIN departments dp
+            ON v.department_id = dp.department_id
+            LEFT JOIN hospitals h
+            ON dp.hospital_id = h.hospital_id
+            ORDER BY frequency DESC
+            LIMIT 10
+        """
+        return run_query(query)
+
     query = """
         SELECT dp.department_name, h.hospital_name, count(*) as frequency
         FROM appointments a
@@ -47,8 +131,47 @@ def get_department_patient_doctor_ratio():
     """
     return run_query(query)
 
+def _from_snapshot(name, func):
+    """SNAPSHOT_CONFIG['serve_analytics'] 开启且快照已导出时返回 func(快照数据集)（每个快照版本只计算一次），否则返回 None（调用方改查 MySQL）"""
+    if not SNAPSHOT_CONFIG['serve_analytics']:
+        return None
+    try:
+        return aggregate_snapshot(name, func)
+    except Exception as e:
+        print(f"Reading snapshot {name} failed, querying MySQL: {e}")
+        return None
+
+def _snapshot_monthly_trend(dataset):
+    """快照版 get_monthly_appointment_trend，在 Arrow 中分组计数（与 MySQL 一样保留 NULL 月份一行）"""
+    import pyarrow.compute as pc
+
+    dates = dataset.to_table(columns=['appointment_date'])['appointment_date']
+    counts = pc.value_counts(pc.month(dates))
+    df = pd.DataFrame({
+        'month': counts.field('values').to_pandas(),
+        'appointment_num': counts.field('counts').to_pandas()
+    })
+    # ORDER BY 把 NULL 排在最前
+    return df.sort_values('month', na_position='first').reset_index(drop=True)
+
+def _snapshot_status_ratio(dataset):
+    """快照版 get_appointment_status_ratio，在 Arrow 中计数"""
+    import pyarrow.compute as pc
+
+    status = dataset.to_table(columns=['status'])['status']
+    total = len(status)
+    ratios = {}
+    for name in ('Scheduled', 'Cancelled', 'Completed'):
+        matches = pc.sum(pc.equal(status, name)).as_py() or 0
+        ratios[name.lower()] = [matches / total if total else None]
+    return pd.DataFrame(ratios)
+
 def get_monthly_appointment_trend():
     """get monthly appointment trend in the data"""
+    df = _from_snapshot('appointments', _snapshot_monthly_trend)
+    if df is not None:
+        return df
+
     query = """
         SELECT MONTH(appointment_date) as 'month', count(*) as appointment_num
         FROM appointments
@@ -59,6 +182,10 @@ def get_monthly_appointment_trend():
 
 def get_appointment_status_ratio():
     """get appointment status summary """
+    df = _from_snapshot('appointments', _snapshot_status_ratio)
+    if df is not None:
+        return df
+
     query = """
         SELECT sum(if(status = 'Scheduled', 1, 0)) / count(*) as scheduled, sum(if(status = 'Cancelled', 1, 0)) / count(*) as cancelled,
         sum(if(status = 'Completed', 1, 0)) / count(*) as completed
@@ -119,8 +246,8 @@ def get_hospital_avg_rating():
     """
     return run_query(query)
 
-def get_patient_age_by_hospital_for_boxplot():
-    """get patient age distribution for each hospital """
+def get_patient_age_by_hospital_for_boxplot(chunksize=None):
+    """get patient age distribution for each hospital (streams DataFrame chunks when chunksize is set, see stream_query)"""
     query = """
     SELECT
         h.hospital_name,
@@ -132,12 +259,43 @@ def get_patient_age_by_hospital_for_boxplot():
     WHERE h.hospital_name IS NOT NULL
     ORDER BY h.hospital_name, age
     """
+    if chunksize is not None:
+        return stream_query(query, chunksize=chunksize)
     return run_query(query)
 
+def get_patient_age_counts_by_hospital():
+    """get number of appointments per (hospital, patient age) - one row per distinct age instead of per appointment"""
+    query = """
+    SELECT
+        h.hospital_name,
+        YEAR(CURDATE()) - YEAR(p.date_of_birth) as age,
+        COUNT(*) as n
+    FROM patients p
+    JOIN appointments a ON p.patient_id = a.patient_id
+    JOIN doctors d ON a.doctor_id = d.doctor_id
+    JOIN hospitals h ON d.hospital_id = h.hospital_id
+    WHERE h.hospital_name IS NOT NULL AND p.date_of_birth IS NOT NULL
+    GROUP BY h.hospital_name, age
+    ORDER BY h.hospital_name, age
+    """
+    return run_query(query)
+
+def get_patient_age_stats_by_hospital():
+    """
+    get per-hospital age count/mean/std/min/quartiles/max and box-plot whiskers
+
+    Computed exactly from get_patient_age_counts_by_hospital, see
+    utils.stats.summarize_value_counts; draw with plotting.boxplot_from_stats.
+    """
+    counts = get_patient_age_counts_by_hospital()
+    if counts is None:
+        return None
+    return summarize_value_counts(counts, 'hospital_name', 'age', 'n')
+
 # ==================== Vital Signs Analytics ====================
 
-def get_weight_height_by_gender():
-    """按性别获取体重和身高数据"""
+def get_weight_height_by_gender(chunksize=None, sample=None):
+    """按性别获取体重和身高数据（chunksize 不为 None 时分块流式返回，见 stream_query；sample 为 N 时返回最多 N 行的随机抽样，供散点图使用）"""
     query = """
     SELECT 
         p.gender,
@@ -147,10 +305,14 @@ def get_weight_height_by_gender():
     JOIN patients p ON pv.patient_id = p.patient_id
     WHERE pv.weight IS NOT NULL AND pv.height IS NOT NULL
     """
+    if sample is not None:
+        return sample_query(query, sample)
+    if chunksize is not None:
+        return stream_query(query, chunksize=chunksize)
     return run_query(query)
 
-def get_bmi_by_gender():
-    """计算并获取 BMI 数据"""
+def get_bmi_by_gender(chunksize=None, sample=None):
+    """计算并获取 BMI 数据（chunksize 不为 None 时分块流式返回，见 stream_query；sample 为 N 时返回最多 N 行的随机抽样，供散点图使用）"""
     query = """
     SELECT 
         p.gender,
@@ -161,12 +323,24 @@ def get_bmi_by_gender():
       AND pv.height IS NOT NULL
       AND pv.height > 0
     """
+    if sample is not None:
+        return sample_query(query, sample)
+    if chunksize is not None:
+        return stream_query(query, chunksize=chunksize)
     return run_query(query)
 
+def get_bmi_histogram_by_gender(edges=None):
+    """按性别统计 BMI 分箱人数（在数据库中分箱，edges 为分箱边界或分箱个数，默认见 DISTRIBUTION_CONFIG）"""
+    return histogram_by_gender('bmi', edges)
+
+def get_weight_height_histogram_by_gender(weight_edges=None, height_edges=None):
+    """按性别统计体重 × 身高二维分箱人数（只返回非空格子）"""
+    return histogram2d_by_gender('weight', 'height', weight_edges, height_edges)
+
 # ==================== Laboratory Analytics ====================
 
-def get_hormone_distribution_by_gender():
-    """按性别获取激素分布"""
+def get_hormone_distribution_by_gender(chunksize=None, sample=None):
+    """按性别获取激素分布（chunksize 不为 None 时分块流式返回，见 stream_query；sample 为 N 时返回最多 N 行的随机抽样，供散点图使用）"""
     query = """
     SELECT 
         p.gender,
@@ -179,96 +353,57 @@ def get_hormone_distribution_by_gender():
        OR pl.t3 IS NOT NULL 
        OR pl.hemoglobin IS NOT NULL
     """
+    if sample is not None:
+        return sample_query(query, sample)
+    if chunksize is not None:
+        return stream_query(query, chunksize=chunksize)
     return run_query(query)
 
+def get_hormone_histograms_by_gender(edges=None):
+    """
+    按性别统计 TSH、T3、血红蛋白的分箱人数
+
+    Parameters:
+    -----------
+    edges : dict, optional
+        {指标: 分箱边界或分箱个数}，未给出的指标使用默认分箱
+
+    Returns:
+    --------
+    dict {'tsh' | 't3' | 'hemoglobin': DataFrame(gender, bin_left, bin_right, count)}
+    """
+    edges = edges or {}
+    return {measure: histogram_by_gender(measure, edges.get(measure))
+            for measure in ('tsh', 't3', 'hemoglobin')}
+
 # ==================== Individual Patient Tracking ====================
 
 def search_patients(search_term):
     """
-    搜索患者（支持模糊搜索，不区分大小写）
+    搜索患者（按名、姓或邮箱前缀匹配，不区分大小写，按相关度排序）
     
     Parameters:
     -----------
     search_term : str
-        搜索关键词（可以是名、姓、全名或邮箱的一部分）
+        搜索关键词（名、姓、全名的词首或邮箱开头，如 "jo smi"）
     
     Returns:
     --------
     pandas.DataFrame with patient information
     """
-    query = """
-    SELECT 
-        patient_id,
-        CONCAT(first_name, ' ', last_name) as 'full_name',
-        first_name,
-        last_name,
-        gender,
-        DATE_FORMAT(date_of_birth, '%Y-%m-%d') as 'date_of_birth',
-        contact_number,
-        email
-    FROM patients
-    WHERE LOWER(first_name) LIKE LOWER(%s)
-       OR LOWER(last_name) LIKE LOWER(%s)
-       OR LOWER(email) LIKE LOWER(%s)
-       OR LOWER(CONCAT(first_name, ' ', last_name)) LIKE LOWER(%s)
-    ORDER BY last_name, first_name
-    LIMIT 20
-    """
-    # 在搜索词前后添加通配符 %
-    search_pattern = f"%{search_term}%"
-    return run_query(query, params=(search_pattern, search_pattern, search_pattern, search_pattern))
+    # 走 FULLTEXT / 前缀索引，见 utils/search.py
+    return search_patients_ranked(search_term)
 
 
 def get_patient_blood_chemistry(patient_id):
-    """获取患者血液化学指标时间序列"""
-    query = """
-    SELECT 
-        date_of_visit,
-        total_cholesterol,
-        ldl,
-        hdl,
-        triglycerides,
-        hemoglobin,
-        wbc,
-        rbc,
-        platelets
-    FROM patient_labs
-    WHERE patient_id = %s
-    ORDER BY date_of_visit
-    """
-    df = run_query(query, params=(patient_id,))
-
-    if df is not None and not df.empty:
-        numeric_cols = ['total_cholesterol', 'ldl', 'hdl', 'triglycerides', 
-                        'hemoglobin', 'wbc', 'rbc', 'platelets']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    return df
+    """获取患者血液化学指标时间序列（来自按患者缓存的时间线，见 utils/patient_timeline.py）"""
+    timeline = get_patient_timeline(patient_id)
+    return timeline.blood_chemistry() if timeline is not None else None
 
 def get_patient_vitamin_levels(patient_id):
-    """获取患者维生素水平时间序列"""
-    query = """
-    SELECT 
-        date_of_visit,
-        vitamin_d2,
-        vitamin_d3,
-        vitamin_d_total
-    FROM patient_labs
-    WHERE patient_id = %s
-    ORDER BY date_of_visit
-    """
-
-    df = run_query(query, params=(patient_id,))
-    
-    if df is not None and not df.empty:
-        numeric_cols = ['vitamin_d2', 'vitamin_d3', 'vitamin_d_total']
-        for col in numeric_cols:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    return df
+    """获取患者维生素水平时间序列（来自按患者缓存的时间线）"""
+    timeline = get_patient_timeline(patient_id)
+    return timeline.vitamin_levels() if timeline is not None else None
 
 
 # ==================== Dashboard KPIs ====================
@@ -296,15 +431,56 @@ def get_today_appointments():
     query = """
     SELECT COUNT(*) as count 
     FROM appointments 
-    WHERE DATE(appointment_date) = CURDATE()
+    WHERE appointment_date >= CURDATE()
+      AND appointment_date < CURDATE() + INTERVAL 1 DAY
     """
     result = run_query(query)
     return result['count'][0] if result is not None and len(result) > 0 else 0
 
+@dataclass(frozen=True)
+class KpiSnapshot:
+    """首页关键指标快照"""
+    total_patients: int
+    total_doctors: int
+    total_appointments: int
+    today_appointments: int
+    scheduled: int
+    cancelled: int
+    completed: int
+
+    def status_counts(self):
+        """预约状态分布 {状态: 数量}"""
+        return {
+            'Scheduled': self.scheduled,
+            'Cancelled': self.cancelled,
+            'Completed': self.completed
+        }
+
+def get_kpi_snapshot():
+    """一条语句取回全部首页计数和预约状态分布，返回 KpiSnapshot（失败时为 None）"""
+    query = """
+    SELECT
+        (SELECT COUNT(*) FROM patients) AS total_patients,
+        (SELECT COUNT(*) FROM doctors) AS total_doctors,
+        COUNT(*) AS total_appointments,
+        COALESCE(SUM(appointment_date >= CURDATE()
+                     AND appointment_date < CURDATE() + INTERVAL 1 DAY), 0) AS today_appointments,
+        COALESCE(SUM(status = 'Scheduled'), 0) AS scheduled,
+        COALESCE(SUM(status = 'Cancelled'), 0) AS cancelled,
+        COALESCE(SUM(status = 'Completed'), 0) AS completed
+    FROM appointments
+    """
+    result = run_query(query, ttl=KPI_CACHE_TTL)
+    if result is None or result.empty:
+        return None
+
+    row = result.iloc[0]
+    return KpiSnapshot(**{field: int(row[field]) for field in KpiSnapshot.__dataclass_fields__})
+
 # ==================== Prediction ====================
 
-def get_hospital_revenue_history():
-    """获取医院收入历史数据用于预测"""
+def get_hospital_revenue_history(fresh=False):
+    """获取医院收入历史数据用于预测（fresh=True 时绕过查询缓存，查询失败时抛出异常而不是回退到缓存结果）"""
     query = """
     SELECT 
         d.hospital_id,
@@ -318,4 +494,20 @@ def get_hospital_revenue_history():
     GROUP BY d.hospital_id, DATE_FORMAT(b.bill_date, '%Y-%m')
     ORDER BY d.hospital_id, DATE_FORMAT(b.bill_date, '%Y-%m')
     """
-    return run_query(query)
\ No newline at end of file
+    if fresh:
+        return read_dataframe(query, raise_errors=True)
+    return run_query(query)
+
+def get_billing_data_version():
+    """已付账单的 (最新月份, 行数)，用于判断是否有新的收入数据（查询失败时抛出异常）"""
+    query = """
+    SELECT
+        DATE_FORMAT(MAX(bill_date), '%Y-%m') AS latest_month,
+        COUNT(*) AS paid_bills
+    FROM billing
+    WHERE payment_status = 'Paid'
+    """
+    result = read_dataframe(query, raise_errors=True)
+    if result.empty:
+        return None
+    return result['latest_month'][0], int(result['paid_bills'][0])
\ No newline at end of file
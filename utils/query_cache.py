@@ -0,0 +1,439 @@
+# utils/query_cache.py
+#
+# Result cache behind database.run_query.
+#
+# Results are pickled and stored in a pluggable backend:
+#
+#   memory  process-local LRU bounded by entry count and total bytes
+#   file    one file per entry in a directory (mtime is the LRU clock), so
+#           processes on one host or a test can share it; point it at
+#           /dev/shm for a shared-memory cache
+#   redis   shared by every app replica (needs the redis package); size
+#           bounds are left to the server's maxmemory-policy
+#
+# Every entry has its own TTL and is tagged with the tables its SQL reads.
+# Each table has a version token stored in the same backend; an entry
+# remembers the versions it was loaded under and is discarded once any of
+# them changes. Writes through database.execute_query / transaction() bump
+# the versions of the tables they touch, so writing to appointments drops
+# only the results that read appointments, on every replica sharing the
+# backend.
+
+import hashlib
+import os
+import pickle
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import streamlit as st
+
+from config import QUERY_CACHE_CONFIG
+
+SUFFIX = '.pkl'
+TAG_PREFIX = 'tag-'
+
+# FROM / JOIN targets; only counted where FROM starts a clause of a query
+# (top level or a subquery), not inside calls such as EXTRACT(YEAR FROM col)
+CLAUSE_TABLES = re.compile(r'\b(?:FROM|JOIN)\s+`?(\w+)`?', re.IGNORECASE)
+
+SUBQUERY = re.compile(r'\s*(?:SELECT|WITH)\b', re.IGNORECASE)
+
+LITERALS = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+
+# neither names a written table
+NOT_WRITES = re.compile(r'\bON\s+DUPLICATE\s+KEY\s+UPDATE\b|\bFOR\s+UPDATE\b', re.IGNORECASE)
+
+# targets of data-changing statements
+WRITE_TABLES = re.compile(
+    r'\b(?:INSERT(?:\s+(?:LOW_PRIORITY|DELAYED|HIGH_PRIORITY|IGNORE))*\s+INTO|REPLACE(?:\s+(?:LOW_PRIORITY|DELAYED))*\s+INTO'
+    r'|DELETE(?:\s+(?:LOW_PRIORITY|QUICK|IGNORE))*\s+FROM|TRUNCATE(?:\s+TABLE)?|ALTER\s+TABLE'
+    r'|DROP\s+TABLE(?:\s+IF\s+EXISTS)?)\s+`?(\w+)`?',
+    re.IGNORECASE
+)
+
+UPDATE_STATEMENT = re.compile(r'\s*UPDATE(?:\s+(?:LOW_PRIORITY|IGNORE))*\s+`?(\w+)`?', re.IGNORECASE)
+
+# DELETE t1[, t2] FROM ... (multi-table form)
+MULTI_TABLE_DELETE = re.compile(r'\s*DELETE(?:\s+(?:LOW_PRIORITY|QUICK|IGNORE))*\s+(?!FROM\b)\w', re.IGNORECASE)
+
+
+def _strip_literals(sql):
+    """Blank out string literals (keeping offsets) so their contents are never parsed as SQL."""
+    return LITERALS.sub(lambda m: ' ' * len(m.group()), sql)
+
+
+def _clause_tables(sql):
+    """FROM / JOIN tables of sql (literals already stripped), skipping FROM inside function calls."""
+    # for every open parenthesis: does it start a subquery?
+    stack = []
+    tables = set()
+    pos = 0
+    for match in CLAUSE_TABLES.finditer(sql):
+        for i in range(pos, match.start()):
+            if sql[i] == '(':
+                stack.append(bool(SUBQUERY.match(sql, i + 1)))
+            elif sql[i] == ')' and stack:
+                stack.pop()
+        pos = match.start()
+        if not stack or stack[-1]:
+            tables.add(match.group(1).lower())
+    return tables
+
+
+def read_tables(query):
+    """Tables a query reads from, lower-cased."""
+    return frozenset(_clause_tables(_strip_literals(query)))
+
+
+def written_tables(statement):
+    """Tables an INSERT / UPDATE / DELETE / ... statement may change, lower-cased."""
+    sql = NOT_WRITES.sub(lambda m: ' ' * len(m.group()), _strip_literals(statement))
+    tables = {name.lower() for name in WRITE_TABLES.findall(sql)}
+
+    update = UPDATE_STATEMENT.match(sql)
+    if update:
+        # UPDATE a JOIN b ... SET: any joined table may be the one updated
+        tables.add(update.group(1).lower())
+        set_clause = re.search(r'\bSET\b', sql, re.IGNORECASE)
+        tables |= _clause_tables(sql[:set_clause.start()] if set_clause else sql)
+    elif MULTI_TABLE_DELETE.match(sql):
+        # DELETE t1 FROM t1 JOIN t2 ...: the targets are aliases, so every
+        # table the statement references is treated as written
+        tables |= _clause_tables(sql)
+    return frozenset(tables)
+
+
+def query_key(query, params=None):
+    return hashlib.sha256(f"{query}\x1f{params!r}".encode()).hexdigest()
+
+
+def _new_version():
+    return uuid.uuid4().hex.encode()
+
+
+class MemoryBackend:
+    """Process-local LRU of byte strings."""
+
+    def __init__(self, max_entries=1000, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= len(entry[1])
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and time.time() >= expires_at:
+                self._drop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        if len(value) > self.max_bytes:
+            return
+        expires_at = time.time() + ttl if ttl else None
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (expires_at, value)
+            self._bytes += len(value)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes}
+
+
+class FileBackend:
+    """One pickled (expires_at, value) file per key, evicted least-recently-used."""
+
+    def __init__(self, directory, max_entries=1000, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                expires_at, value = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            self.delete(key)
+            return None
+        if expires_at is not None and time.time() >= expires_at:
+            self.delete(key)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return value
+
+    def get_many(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.time() + ttl if ttl else None
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((expires_at, value), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+        self._evict()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def _entries(self):
+        """[(mtime, size, key)] for every entry file, oldest first."""
+        entries = []
+        with os.scandir(self.directory) as it:
+            for item in it:
+                if not item.name.endswith(SUFFIX):
+                    continue
+                try:
+                    stat = item.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, item.name[:-len(SUFFIX)]))
+        entries.sort()
+        return entries
+
+    def _evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        count = len(entries)
+        for _, size, key in entries:
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self.delete(key)
+            count -= 1
+            total -= size
+
+    def clear(self):
+        for _, _, key in self._entries():
+            self.delete(key)
+
+    def stats(self):
+        entries = self._entries()
+        return {'entries': len(entries), 'bytes': sum(size for _, size, _ in entries)}
+
+
+class RedisBackend:
+    """Keys under a prefix in a Redis database shared by all replicas."""
+
+    def __init__(self, url, prefix='hospital:query:'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        return self._client.get(self.prefix + key)
+
+    def get_many(self, keys):
+        # one MGET round trip
+        return self._client.mget([self.prefix + key for key in keys])
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self.prefix + key, value, px=int(ttl * 1000) if ttl else None)
+
+    def delete(self, key):
+        self._client.delete(self.prefix + key)
+
+    def _keys(self):
+        return self._client.scan_iter(match=self.prefix + '*', count=1000)
+
+    def clear(self):
+        batch = []
+        for key in self._keys():
+            batch.append(key)
+            if len(batch) >= 1000:
+                self._client.delete(*batch)
+                batch = []
+        if batch:
+            self._client.delete(*batch)
+
+    def stats(self):
+        return {'entries': sum(1 for _ in self._keys())}
+
+
+class QueryCache:
+    """Query results with per-entry TTLs, invalidated by table version tags."""
+
+    def __init__(self, backend, ttl=300):
+        self.backend = backend
+        self.ttl = ttl
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'errors': 0, 'invalidations': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, key, amount=1):
+        with self._lock:
+            self._stats[key] += amount
+
+    def _lookup(self, tags, key):
+        """
+        Current version token of each tag and the stored payload for key,
+        fetched in one backend call; missing tag versions are created.
+        """
+        tags = sorted(tags)
+        *stored, payload = self.backend.get_many([TAG_PREFIX + tag for tag in tags] + [key])
+        versions = {}
+        for tag, version in zip(tags, stored):
+            if version is None:
+                # a missing (never set or evicted) version must not match old entries
+                version = _new_version()
+                self.backend.set(TAG_PREFIX + tag, version)
+            versions[tag] = version
+        return versions, payload
+
+    def get_or_load(self, query, params, load, ttl=None, tags=None):
+        """
+        Cached result of load(query, params), loading and storing it on a miss.
+
+        Parameters:
+        -----------
+        query : str
+        params : tuple, optional
+        load : callable
+            load(query, params) runs the query; a None result is not cached
+        ttl : float, optional
+            seconds to keep the result, defaults to the cache's ttl
+        tags : iterable of str, optional
+            tables the result depends on, defaults to the tables the SQL reads
+        """
+        tags = read_tables(query) if tags is None else frozenset(tag.lower() for tag in tags)
+        key = query_key(query, params)
+        try:
+            # read the versions before running the query so a write that lands
+            # while it runs leaves the stored entry already stale
+            versions, payload = self._lookup(tags, key)
+        except Exception as e:
+            st.error(f"Query cache unavailable, running uncached: {e}")
+            self._count('errors')
+            return load(query, params)
+
+        if payload is not None:
+            try:
+                stored_versions, value = pickle.loads(payload)
+            except Exception:
+                stored_versions, value = None, None
+            if stored_versions == versions:
+                self._count('hits')
+                return value
+            self._count('stale')
+        else:
+            self._count('misses')
+
+        value = load(query, params)
+        if value is not None:
+            try:
+                payload = pickle.dumps((versions, value), protocol=pickle.HIGHEST_PROTOCOL)
+                self.backend.set(key, payload, self.ttl if ttl is None else ttl)
+            except Exception as e:
+                st.error(f"Could not cache query result: {e}")
+                self._count('errors')
+        return value
+
+    def invalidate(self, tables):
+        """Drop every cached result that reads any of tables."""
+        for table in tables:
+            self.backend.set(TAG_PREFIX + table.lower(), _new_version())
+            self._count('invalidations')
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            snapshot = dict(self._stats)
+        try:
+            snapshot.update(self.backend.stats())
+        except Exception:
+            pass
+        return snapshot
+
+
+def make_backend(config=QUERY_CACHE_CONFIG):
+    """Backend named by config['backend']: 'memory', 'file' or 'redis'."""
+    name = config['backend']
+    if name == 'memory':
+        return MemoryBackend(config['max_entries'], config['max_bytes'])
+    if name == 'file':
+        return FileBackend(config['dir'], config['max_entries'], config['max_bytes'])
+    if name == 'redis':
+        return RedisBackend(config['redis_url'], config['prefix'])
+    raise ValueError(f"Unknown query cache backend {name!r}, expected 'memory', 'file' or 'redis'")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_query_cache():
+    """Process-wide QueryCache built from QUERY_CACHE_CONFIG."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = QueryCache(make_backend(), ttl=QUERY_CACHE_CONFIG['ttl'])
+    return _cache
+
+
+def invalidate_tables(*tables):
+    """Drop cached results that read any of tables (called after writes)."""
+    if not tables:
+        return
+    try:
+        get_query_cache().invalidate(tables)
+    except Exception as e:
+        st.error(f"Could not invalidate cached queries for {', '.join(tables)}: {e}")
+
+
+def clear_query_cache():
+    get_query_cache().clear()
+
+
+def get_query_cache_stats():
+    return get_query_cache().stats()
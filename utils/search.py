@@ -0,0 +1,304 @@
+# utils/search.py
+#
+# Index-backed patient search.
+#
+# Name searches go through the FULLTEXT index created by
+# sql/002_patient_search.sql, using boolean-mode prefix terms ("+jo* +smi*")
+# so every word the user typed must match the start of a name or email token,
+# ranked by relevance. E-mail searches (anything containing "@") use a plain
+# prefix range on the email index. If the FULLTEXT index has not been created
+# yet, name searches fall back to prefix LIKE on the B-tree name indexes.
+#
+# Results can be browsed page by page with keyset pagination
+# (search_patients_page): each page continues from the sort key of the last
+# row shown instead of using OFFSET.
+#
+# Results are kept in the shared query cache (utils/query_cache.py) tagged
+# with the patients table, so writes to patients and clear_query_cache()
+# drop them like every other cached read.
+
+import re
+
+import mysql.connector
+import pandas as pd
+import streamlit as st
+
+from config import SEARCH_CONFIG
+from .database import get_pool
+from .query_cache import get_query_cache
+
+PATIENT_COLUMNS = """
+    patient_id,
+    CONCAT(first_name, ' ', last_name) as 'full_name',
+    first_name,
+    last_name,
+    gender,
+    DATE_FORMAT(date_of_birth, '%Y-%m-%d') as 'date_of_birth',
+    contact_number,
+    email
+"""
+
+MATCH_EXPR = "MATCH(first_name, last_name, email) AGAINST (%s IN BOOLEAN MODE)"
+
+# InnoDB's default FULLTEXT stopwords are never indexed, so requiring them
+# with "+" would make every search containing one return nothing
+FULLTEXT_STOPWORDS = {
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en',
+    'for', 'from', 'how', 'i', 'in', 'is', 'it', 'la', 'of', 'on', 'or',
+    'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who',
+    'will', 'with', 'und', 'www'
+}
+
+# MySQL error raised when no FULLTEXT index matches the MATCH() column list
+ER_FT_MATCHING_KEY_NOT_FOUND = 1191
+
+# tables whose writes invalidate cached search results
+SEARCH_TABLES = ('patients',)
+
+_fulltext_available = True
+
+
+def normalize_search_term(search_term):
+    """Trim and lowercase a search term and collapse inner whitespace."""
+    return ' '.join((search_term or '').lower().split())
+
+
+def tokenize(search_term):
+    """Split a search term into the word tokens FULLTEXT indexes."""
+    return [token for token in re.split(r'[^\w]+', normalize_search_term(search_term)) if token]
+
+
+def boolean_query(tokens):
+    """Build a boolean-mode prefix query: every non-stopword token is required."""
+    return ' '.join(
+        f'{token}*' if token in FULLTEXT_STOPWORDS else f'+{token}*'
+        for token in tokens
+    )
+
+
+def _like_prefix(token):
+    """Escape LIKE wildcards and append a trailing %."""
+    return re.sub(r'([\\%_])', r'\\\1', token) + '%'
+
+
+def _email_search(term, limit, after=None):
+    # keyset: (email, patient_id) of the last row of the previous page
+    keyset = "AND (email, patient_id) > (%s, %s)" if after else ""
+    query = f"""
+    SELECT {PATIENT_COLUMNS}, 1.0 AS score
+    FROM patients
+    WHERE email LIKE %s {keyset}
+    ORDER BY email, patient_id
+    LIMIT %s
+    """
+    return query, (_like_prefix(term), *(after or ()), limit)
+
+
+def _fulltext_search(tokens, limit, after=None):
+    terms = boolean_query(tokens)
+    # relevance is rounded so the page cursor compares equal on the next query
+    score = f"ROUND({MATCH_EXPR}, 6)"
+    keyset = ""
+    keyset_params = ()
+    if after:
+        # keyset: (score, last_name, first_name, patient_id) of the last row, score descending
+        keyset = f"AND ({score} < %s OR ({score} = %s AND (last_name, first_name, patient_id) > (%s, %s, %s)))"
+        last_score, *last_key = after
+        keyset_params = (terms, last_score, terms, last_score, *last_key)
+    query = f"""
+    SELECT {PATIENT_COLUMNS}, {score} AS score
+    FROM patients
+    WHERE {MATCH_EXPR} {keyset}
+    ORDER BY score DESC, last_name, first_name, patient_id
+    LIMIT %s
+    """
+    return query, (terms, terms, *keyset_params, limit)
+
+
+def _prefix_search(tokens, limit, after=None):
+    # every token has to be the start of the first name, last name or email
+    conditions = []
+    params = []
+    for token in tokens:
+        conditions.append("(first_name LIKE %s OR last_name LIKE %s OR email LIKE %s)")
+        params.extend([_like_prefix(token)] * 3)
+    if after:
+        # keyset: (last_name, first_name, patient_id) of the last row of the previous page
+        conditions.append("(last_name, first_name, patient_id) > (%s, %s, %s)")
+        params.extend(after)
+
+    query = f"""
+    SELECT {PATIENT_COLUMNS}, 1.0 AS score
+    FROM patients
+    WHERE {' AND '.join(conditions)}
+    ORDER BY last_name, first_name, patient_id
+    LIMIT %s
+    """
+    return query, (*params, limit)
+
+
+def _cursor(mode, row):
+    """Keyset cursor (mode, sort key of row) pointing just after row."""
+    if mode == 'email':
+        key = (row['email'], int(row['patient_id']))
+    elif mode == 'fulltext':
+        key = (float(row['score']), row['last_name'], row['first_name'], int(row['patient_id']))
+    else:
+        key = (row['last_name'], row['first_name'], int(row['patient_id']))
+    return mode, key
+
+
+def _search(search_term, limit, cursor=None):
+    """Run one page of a search; returns (DataFrame or None, mode used)."""
+    global _fulltext_available
+
+    term = normalize_search_term(search_term)
+    tokens = tokenize(term)
+    if not tokens:
+        return pd.DataFrame(), None
+
+    if cursor is not None:
+        mode, after = cursor
+    else:
+        mode = 'email' if '@' in term else 'fulltext' if _fulltext_available else 'prefix'
+        after = None
+
+    def build(mode):
+        if mode == 'email':
+            return _email_search(term, limit, after)
+        if mode == 'fulltext':
+            return _fulltext_search(tokens, limit, after)
+        return _prefix_search(tokens, limit, after)
+
+    try:
+        with get_pool().connection() as conn:
+            try:
+                query, params = build(mode)
+                return pd.read_sql(query, conn, params=params), mode
+            except mysql.connector.Error as e:
+                if e.errno != ER_FT_MATCHING_KEY_NOT_FOUND or mode != 'fulltext' or after is not None:
+                    raise
+                # sql/002_patient_search.sql has not been applied yet
+                _fulltext_available = False
+                mode = 'prefix'
+                query, params = build(mode)
+                return pd.read_sql(query, conn, params=params), mode
+    except Exception as e:
+        st.error(f"Patient search failed: {e}")
+        return None, mode
+
+
+def _cached(name, args, load):
+    """load() cached in the query cache under (name, args); None results are not cached."""
+    return get_query_cache().get_or_load(
+        f"-- utils.search.{name}", args, lambda query, params: load(),
+        ttl=SEARCH_CONFIG['cache_ttl'], tags=SEARCH_TABLES
+    )
+
+
+def search_patients_ranked(search_term, limit=None):
+    """
+    Ranked patient search by name or e-mail prefix.
+
+    Parameters:
+    -----------
+    search_term : str
+        one or more name prefixes ("jo smi") or the start of an e-mail
+    limit : int, optional
+        maximum number of matches, defaults to SEARCH_CONFIG['limit']
+
+    Returns:
+    --------
+    pandas.DataFrame with patient information and a relevance 'score',
+    best matches first; None if the query failed
+    """
+    term = normalize_search_term(search_term)
+    limit = limit or SEARCH_CONFIG['limit']
+    return _cached('search_patients_ranked', (term, limit), lambda: _search(term, limit)[0])
+
+
+def search_patients_page(search_term, cursor=None, page_size=None):
+    """
+    One page of search_patients_ranked's results, using keyset pagination.
+
+    Each page continues from the sort key of the previous page's last row,
+    so later pages cost the same as the first one (no OFFSET scan).
+
+    Parameters:
+    -----------
+    search_term : str
+    cursor : tuple, optional
+        the next_cursor returned with the previous page; None for the first page
+    page_size : int, optional
+        defaults to SEARCH_CONFIG['limit']
+
+    Returns:
+    --------
+    (DataFrame or None, next_cursor) -- next_cursor is None on the last page
+    """
+    term = normalize_search_term(search_term)
+    page_size = page_size or SEARCH_CONFIG['limit']
+
+    def load():
+        # one extra row tells whether another page exists
+        df, mode = _search(term, page_size + 1, cursor)
+        if df is None:
+            return None
+        if len(df) <= page_size:
+            return df, None
+        df = df.iloc[:page_size]
+        return df, _cursor(mode, df.iloc[-1])
+
+    page = _cached('search_patients_page', (term, cursor, page_size), load)
+    return (None, None) if page is None else page
+
+
+class PatientSearchResults:
+    """
+    Patients matching one search term, indexed by patient_id.
+
+    Built once per search term and kept in session state, so widgets can look
+    patients up by id (and label select options) without scanning a
+    DataFrame on every rerun. Further pages are appended by load_more().
+    """
+
+    def __init__(self, search_term, page_size=None):
+        self.search_term = search_term
+        self.page_size = page_size or SEARCH_CONFIG['limit']
+        self.records = {}  # patient_id -> row dict, in rank order
+        self.next_cursor = None
+        self.failed = False
+        self._load(None)
+
+    def _load(self, cursor):
+        df, self.next_cursor = search_patients_page(self.search_term, cursor, self.page_size)
+        if df is None:
+            self.failed = True
+            return
+        for record in df.to_dict('records'):
+            self.records.setdefault(int(record['patient_id']), record)
+
+    def load_more(self):
+        """Append the next page of matches, if any."""
+        if self.next_cursor is not None:
+            self._load(self.next_cursor)
+
+    @property
+    def has_more(self):
+        return self.next_cursor is not None
+
+    @property
+    def ids(self):
+        return list(self.records)
+
+    def label(self, patient_id):
+        return self.records[patient_id]['full_name']
+
+    def __getitem__(self, patient_id):
+        return self.records[patient_id]
+
+    def __contains__(self, patient_id):
+        return patient_id in self.records
+
+    def __len__(self):
+        return len(self.records)
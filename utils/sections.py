@@ -0,0 +1,79 @@
+# utils/sections.py
+#
+# Lazily loaded page sections.
+#
+# st.expander always runs its body, even while collapsed, so a collapsed
+# section still pays for its queries and charts. lazy_section wraps a section
+# in an expander with an explicit "Load" toggle and only calls the section's
+# render function once the toggle is on. Each section runs as an st.fragment,
+# so loading one section (or using a widget inside it) reruns that section
+# alone, not the whole page. Every load is timed per stage and the timing is
+# shown inside the fragment, under the section it measures, so it updates
+# with the section instead of waiting for the next full-page rerun.
+
+import time
+from collections import OrderedDict
+
+import streamlit as st
+
+
+class SectionTimer:
+    """Wall-clock time of the stages of one section load."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.stages = OrderedDict()
+        self.total = None
+
+    def mark(self, stage):
+        """Attribute the time since the previous mark (or the start) to stage."""
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self._last
+        self._last = now
+
+    def finish(self, stage='render'):
+        self.mark(stage)
+        self.total = self._last - self.started
+
+    def summary(self):
+        parts = [f"{stage} {seconds * 1000:.0f} ms" for stage, seconds in self.stages.items()]
+        if self.total is not None:
+            parts.append(f"total {self.total * 1000:.0f} ms")
+        return " · ".join(parts)
+
+
+def lazy_section(title, render, key=None, expanded=False, autoload=False):
+    """
+    Show a section whose queries and charts only run once the user loads it.
+
+    Parameters:
+    -----------
+    title : str
+        expander label
+    render : callable
+        render(timer) draws the section; it may call timer.mark('queries')
+        etc. to split the timing into stages, the rest counts as 'render'
+    key : str, optional
+        session-state key of the section, defaults to the title
+    expanded : bool
+        whether the expander starts open
+    autoload : bool
+        load without waiting for the toggle (for sections shown by default)
+    """
+    key = key or title
+
+    @st.fragment
+    def section():
+        with st.expander(title, expanded=expanded):
+            loaded = st.toggle("Load section", value=autoload, key=f"section_loaded_{key}")
+            if not loaded:
+                st.caption("This section's queries and charts run only after it is loaded.")
+                return
+
+            timer = SectionTimer()
+            render(timer)
+            timer.finish()
+            st.caption(f"⏱ {timer.summary()}")
+
+    section()
@@ -0,0 +1,395 @@
+# utils/snapshots.py
+#
+# Columnar Parquet snapshots of the heavy analytics tables.
+#
+# The exporter streams each snapshot query with stream_query and writes the
+# chunks as a hive-partitioned Parquet dataset (e.g. appointments/year=2023/),
+# so only one chunk is in memory at a time. Each export goes to a new version
+# directory and is published by atomically replacing a CURRENT pointer;
+# readers that still have the previous version open are not disturbed, and
+# the oldest versions beyond SNAPSHOT_CONFIG['keep'] are removed.
+#
+# Snapshots are read back as pyarrow datasets over a memory-mapped local
+# filesystem, with column projection and partition pruning, and handed to
+# DuckDB as Arrow data without copying. Dashboards can scan them without
+# touching MySQL; the data is as fresh as the last export.
+#
+# pyarrow is required, duckdb only for snapshot_query. Usage:
+#     python -m utils.snapshots export [names...]          # export once
+#     python -m utils.snapshots export --watch             # every SNAPSHOT_CONFIG['interval'] s
+#     python -m utils.snapshots info
+#     python -m utils.snapshots query "SELECT status, COUNT(*) FROM appointments GROUP BY status"
+
+import argparse
+import functools
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from config import SNAPSHOT_CONFIG
+from .database import decimal_columns, stream_query, to_float
+from .patient_timeline import LAB_COLUMNS
+
+POINTER = 'CURRENT'
+MANIFEST = '_manifest.json'
+COMMON_METADATA = '_common_metadata'
+
+# snapshot name -> (query, partition columns); NULL dates land in year 0
+SNAPSHOTS = {
+    'appointments': ("""
+        SELECT
+            a.appointment_id,
+            a.patient_id,
+            a.doctor_id,
+            d.department_id,
+            d.hospital_id,
+            a.appointment_date,
+            a.status,
+            COALESCE(YEAR(a.appointment_date), 0) AS year
+        FROM appointments a
+        LEFT JOIN doctors d ON a.doctor_id = d.doctor_id
+    """, ['year']),
+    'billing': ("""
+        SELECT
+            b.treatment_id,
+            d.hospital_id,
+            b.bill_date,
+            b.amount,
+            b.payment_status,
+            COALESCE(YEAR(b.bill_date), 0) AS year
+        FROM billing b
+        LEFT JOIN treatments t ON b.treatment_id = t.treatment_id
+        LEFT JOIN appointments a ON t.appointment_id = a.appointment_id
+        LEFT JOIN doctors d ON a.doctor_id = d.doctor_id
+    """, ['year']),
+    'patient_vitals': ("""
+        SELECT
+            pv.patient_id,
+            p.gender,
+            pv.weight,
+            pv.height
+        FROM patient_vitals pv
+        JOIN patients p ON pv.patient_id = p.patient_id
+    """, ['gender']),
+    'patient_labs': (f"""
+        SELECT
+            pl.patient_id,
+            p.gender,
+            pl.date_of_visit,
+            pl.tsh,
+            pl.t3,
+            {', '.join(f'pl.{col}' for col in LAB_COLUMNS)},
+            COALESCE(YEAR(pl.date_of_visit), 0) AS year
+        FROM patient_labs pl
+        JOIN patients p ON pl.patient_id = p.patient_id
+    """, ['year'])
+}
+
+
+def _snapshot(name):
+    try:
+        return SNAPSHOTS[name]
+    except KeyError:
+        raise ValueError(f"Unknown snapshot {name!r}, expected one of {sorted(SNAPSHOTS)}") from None
+
+
+def _table_dir(name):
+    return os.path.join(SNAPSHOT_CONFIG['dir'], name)
+
+
+def snapshot_path(name):
+    """Directory of the current version of a snapshot, or None if it was never exported."""
+    _snapshot(name)
+    try:
+        with open(os.path.join(_table_dir(name), POINTER)) as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        return None
+    path = os.path.join(_table_dir(name), version)
+    return path if os.path.isdir(path) else None
+
+
+def _publish(name, version):
+    """Point CURRENT at version atomically."""
+    fd, tmp_path = tempfile.mkstemp(dir=_table_dir(name), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(_table_dir(name), POINTER))
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def _prune(name, keep):
+    """Remove all but the newest keep versions (and leftovers of failed exports)."""
+    current = os.path.basename(snapshot_path(name) or '')
+    versions = sorted(
+        entry for entry in os.listdir(_table_dir(name))
+        if entry.startswith('v') and os.path.isdir(os.path.join(_table_dir(name), entry))
+    )
+    complete = [v for v in versions if os.path.exists(os.path.join(_table_dir(name), v, MANIFEST))]
+    kept = set(complete[-keep:]) | {current}
+    for version in versions:
+        if version not in kept:
+            shutil.rmtree(os.path.join(_table_dir(name), version), ignore_errors=True)
+
+
+def _write_chunks(chunks, directory, partition_cols, compression):
+    """Write DataFrame chunks as one hive-partitioned Parquet dataset; return (schema, rows)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    file_format = ds.ParquetFileFormat()
+    write_options = file_format.make_write_options(compression=compression)
+    schema = None
+    rows = 0
+    for i, chunk in enumerate(chunks):
+        # DECIMAL columns arrive as decimal.Decimal objects
+        chunk = to_float(chunk, decimal_columns(chunk))
+        table = pa.Table.from_pandas(chunk, preserve_index=False).replace_schema_metadata(None)
+        # a column that is all NULL in one chunk has type null there
+        schema = table.schema if schema is None else pa.unify_schemas(
+            [schema, table.schema], promote_options='permissive')
+        ds.write_dataset(
+            table, directory,
+            format=file_format,
+            file_options=write_options,
+            partitioning=partition_cols,
+            partitioning_flavor='hive',
+            basename_template=f'part-{i:05d}-{{i}}.parquet',
+            existing_data_behavior='overwrite_or_ignore'
+        )
+        rows += table.num_rows
+    return schema, rows
+
+
+def export_snapshot(name, chunksize=None):
+    """
+    Export one snapshot from MySQL and publish it as the current version.
+
+    Returns:
+    --------
+    dict with the snapshot's name, version, rows, bytes and seconds
+    """
+    import pyarrow.parquet as pq
+
+    query, partition_cols = _snapshot(name)
+    chunksize = chunksize or SNAPSHOT_CONFIG['chunksize']
+    started = time.perf_counter()
+    exported_at = datetime.now()
+    version = f"v{exported_at:%Y%m%d%H%M%S%f}-{uuid.uuid4().hex[:8]}"
+    directory = os.path.join(_table_dir(name), version)
+    os.makedirs(directory)
+
+    try:
+        schema, rows = _write_chunks(stream_query(query, chunksize=chunksize), directory,
+                                     partition_cols, SNAPSHOT_CONFIG['compression'])
+        if schema is not None:
+            pq.write_metadata(schema, os.path.join(directory, COMMON_METADATA))
+        manifest = {
+            'name': name,
+            'version': version,
+            'rows': rows,
+            'partitioning': partition_cols,
+            'exported_at': exported_at.isoformat(timespec='seconds'),
+            'seconds': round(time.perf_counter() - started, 3)
+        }
+        with open(os.path.join(directory, MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+    except BaseException:
+        shutil.rmtree(directory, ignore_errors=True)
+        raise
+
+    _publish(name, version)
+    _prune(name, SNAPSHOT_CONFIG['keep'])
+    manifest['bytes'] = sum(
+        os.path.getsize(os.path.join(root, file))
+        for root, _, files in os.walk(directory) for file in files
+    )
+    return manifest
+
+
+def export_all(names=None, chunksize=None):
+    """Export the named snapshots (default: all); a failing table does not stop the others."""
+    results = []
+    for name in names or SNAPSHOTS:
+        try:
+            results.append(export_snapshot(name, chunksize))
+        except Exception as e:
+            print(f"Snapshot export of {name} failed: {e}")
+    return results
+
+
+def snapshot_info():
+    """DataFrame with the manifest of the current version of every exported snapshot."""
+    rows = []
+    for name in SNAPSHOTS:
+        path = snapshot_path(name)
+        if path is None:
+            continue
+        with open(os.path.join(path, MANIFEST)) as f:
+            rows.append(json.load(f))
+    return pd.DataFrame(rows)
+
+
+@functools.lru_cache(maxsize=16)
+def _dataset(path, partition_cols):
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+
+    metadata_path = os.path.join(path, COMMON_METADATA)
+    if not os.path.exists(metadata_path):
+        # the export returned no rows
+        return None
+    schema = pq.read_schema(metadata_path)
+    partitioning = ds.partitioning(pa.schema([schema.field(col) for col in partition_cols]), flavor='hive')
+    return ds.dataset(
+        path,
+        schema=schema,
+        format='parquet',
+        partitioning=partitioning,
+        filesystem=pafs.LocalFileSystem(use_mmap=True),
+        exclude_invalid_files=False
+    )
+
+
+def open_snapshot(name):
+    """
+    Current version of a snapshot as a pyarrow.dataset.Dataset over memory-mapped files.
+
+    Returns None if the snapshot was never exported or is empty.
+    """
+    path = snapshot_path(name)
+    if path is None:
+        return None
+    return _dataset(path, tuple(_snapshot(name)[1]))
+
+
+def read_snapshot(name, columns=None, filter=None):
+    """
+    Read (part of) a snapshot into a pyarrow.Table.
+
+    Parameters:
+    -----------
+    name : str
+    columns : list of str, optional
+        only these columns are read
+    filter : pyarrow.compute.Expression, optional
+        e.g. pc.field('year') >= 2020; conditions on partition columns skip
+        whole directories
+
+    Returns:
+    --------
+    pyarrow.Table, or None if the snapshot is not available
+    """
+    dataset = open_snapshot(name)
+    if dataset is None:
+        return None
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+@functools.lru_cache(maxsize=64)
+def _aggregate(path, partition_cols, func):
+    dataset = _dataset(path, partition_cols)
+    return None if dataset is None else func(dataset)
+
+
+def aggregate_snapshot(name, func):
+    """
+    func(dataset) over the current version of a snapshot, computed once per version.
+
+    The result is cached until the next export publishes a new version, so
+    dashboards rerunning the same aggregate do not rescan the files. func
+    must be hashable (a module-level function) and should return a small
+    result; DataFrames are copied before they are returned.
+
+    Returns None if the snapshot is not available.
+    """
+    path = snapshot_path(name)
+    if path is None:
+        return None
+    result = _aggregate(path, tuple(_snapshot(name)[1]), func)
+    return result.copy() if isinstance(result, pd.DataFrame) else result
+
+
+def read_snapshot_frame(name, columns=None, filter=None):
+    """read_snapshot as a pandas DataFrame (None if the snapshot is not available)."""
+    table = read_snapshot(name, columns, filter)
+    return None if table is None else table.to_pandas()
+
+
+def snapshot_query(sql, names=None):
+    """
+    Run DuckDB SQL over the snapshots, each registered as a view under its name.
+
+    DuckDB scans the Arrow datasets directly (projection and filters are
+    pushed down), so nothing is copied into DuckDB first.
+
+    Returns:
+    --------
+    pandas DataFrame
+    """
+    try:
+        import duckdb
+    except ImportError:
+        raise ImportError("snapshot_query needs duckdb (pip install duckdb); "
+                          "read_snapshot works with pyarrow alone") from None
+
+    con = duckdb.connect()
+    try:
+        for name in names or SNAPSHOTS:
+            dataset = open_snapshot(name)
+            if dataset is not None:
+                con.register(name, dataset)
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and query Parquet snapshots of the analytics tables")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    export = commands.add_parser('export', help="export snapshots from MySQL")
+    export.add_argument('names', nargs='*', metavar='name',
+                        help=f"snapshots to export (default: all of {', '.join(SNAPSHOTS)})")
+    export.add_argument('--watch', action='store_true', help="keep exporting every --interval seconds")
+    export.add_argument('--interval', type=float, default=SNAPSHOT_CONFIG['interval'])
+    export.add_argument('--chunksize', type=int, default=None)
+
+    commands.add_parser('info', help="show the current version of every snapshot")
+
+    query = commands.add_parser('query', help="run DuckDB SQL over the snapshots")
+    query.add_argument('sql')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        while True:
+            for manifest in export_all(args.names or None, args.chunksize):
+                print(f"{manifest['name']}: {manifest['rows']} rows, "
+                      f"{manifest['bytes'] / 1e6:.1f} MB in {manifest['seconds']:.1f}s ({manifest['version']})")
+            if not args.watch:
+                break
+            time.sleep(args.interval)
+    elif args.command == 'info':
+        info = snapshot_info()
+        print(info.to_string(index=False) if not info.empty else "No snapshots exported yet")
+    else:
+        print(snapshot_query(args.sql).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
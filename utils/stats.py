@@ -0,0 +1,101 @@
+# utils/stats.py
+#
+# Five-number summaries computed from (group, value, count) rows.
+#
+# Queries that only need box-plot statistics GROUP BY the value in SQL and
+# ship one row per distinct value instead of one row per record. For
+# discrete values such as ages in years these counts are an exact, mergeable
+# summary: counts from several streamed chunks (or shards) can simply be
+# added together, and the quantiles below match pandas' default linear
+# interpolation on the expanded data.
+
+import numpy as np
+import pandas as pd
+
+STAT_COLUMNS = ['count', 'mean', 'std', 'min', 'q1', 'median', 'q3', 'max',
+                'whislo', 'whishi', 'fliers']
+
+
+def merge_value_counts(chunks, group_col, value_col, count_col='n'):
+    """
+    Add up (group, value, count) rows, or raw (group, value) rows, from many chunks.
+
+    Chunks without a count column count one per row, so this also works on
+    the raw chunks of stream_query / a query's chunksize=... iterator.
+    """
+    partials = []
+    for chunk in chunks:
+        if count_col in chunk.columns:
+            part = chunk.groupby([group_col, value_col])[count_col].sum()
+        else:
+            part = chunk.groupby([group_col, value_col]).size()
+        partials.append(part)
+
+    if not partials:
+        return pd.DataFrame(columns=[group_col, value_col, count_col])
+    merged = pd.concat(partials).groupby(level=[0, 1]).sum()
+    return merged.rename(count_col).reset_index()
+
+
+def _weighted_quantile(values, cumulative, total, q):
+    """Linear-interpolated quantile of sorted values repeated by their counts."""
+    position = (total - 1) * q
+    lower = int(np.floor(position))
+    upper = int(np.ceil(position))
+    # index of the distinct value holding the k-th (0-based) expanded element
+    lo_value = values[np.searchsorted(cumulative, lower, side='right')]
+    hi_value = values[np.searchsorted(cumulative, upper, side='right')]
+    return lo_value + (hi_value - lo_value) * (position - lower)
+
+
+def summarize_value_counts(counts, group_col, value_col, count_col='n', whisker=1.5):
+    """
+    Per-group count/mean/std/min/quartiles/max and box-plot whiskers.
+
+    Parameters:
+    -----------
+    counts : pandas.DataFrame
+        one row per (group, value) with its number of occurrences
+    whisker : float
+        whisker reach in IQRs, as in matplotlib's boxplot
+
+    Returns:
+    --------
+    pandas.DataFrame indexed by group with STAT_COLUMNS; std is the sample
+    standard deviation (ddof=1) and fliers lists the distinct values beyond
+    the whiskers
+    """
+    rows = {}
+    for group, part in counts.groupby(group_col, sort=True):
+        part = part[part[count_col] > 0].sort_values(value_col)
+        values = part[value_col].to_numpy(dtype=float)
+        weights = part[count_col].to_numpy(dtype=float)
+        if len(values) == 0:
+            continue
+
+        total = weights.sum()
+        cumulative = np.cumsum(weights)
+        mean = np.dot(values, weights) / total
+        variance = np.dot(weights, (values - mean) ** 2) / (total - 1) if total > 1 else np.nan
+
+        q1, median, q3 = (_weighted_quantile(values, cumulative, total, q) for q in (0.25, 0.5, 0.75))
+        iqr = q3 - q1
+        inside = values[(values >= q1 - whisker * iqr) & (values <= q3 + whisker * iqr)]
+
+        rows[group] = {
+            'count': int(total),
+            'mean': mean,
+            'std': np.sqrt(variance),
+            'min': values[0],
+            'q1': q1,
+            'median': median,
+            'q3': q3,
+            'max': values[-1],
+            'whislo': inside.min() if len(inside) else q1,
+            'whishi': inside.max() if len(inside) else q3,
+            'fliers': values[(values < q1 - whisker * iqr) | (values > q3 + whisker * iqr)].tolist()
+        }
+
+    stats = pd.DataFrame.from_dict(rows, orient='index', columns=STAT_COLUMNS)
+    stats.index.name = group_col
+    return stats